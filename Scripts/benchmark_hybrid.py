@@ -0,0 +1,173 @@
+"""
+Measure recall and latency of dense-only versus hybrid (BM25 + FAISS, RRF) retrieval.
+
+Queries are built from the last --queries events of live_location_events.csv
+the way the service builds them. Each event has known-relevant chunks that
+can be named by id: the detected store's stores.csv row and the customer's
+customers.csv row (exactly the id- and name-heavy text MiniLM matches
+poorly). For every depth k the script reports how many of them appear in
+the top k for dense search and for hybrid search, plus the per-query cost of
+each, and the smallest hybrid depth that matches dense recall at
+Settings.retrieval_k, i.e. how far retrieval_k / rerank_k can be cut.
+
+Examples:
+    python benchmark_hybrid.py --queries 500
+    python benchmark_hybrid.py --depths 4 8 12 20 50 --output hybrid.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from benchmark_replay import load_events  # noqa: E402
+
+from groundtruth.config import Settings  # noqa: E402
+from groundtruth.models import RetrievedChunk  # noqa: E402
+from groundtruth.services import (  # noqa: E402
+    CustomerSummaryService,
+    FaissRetriever,
+    PinnedEvidence,
+    QueryBuilder,
+    open_bm25_index,
+    open_chunk_store,
+    reciprocal_rank_fusion,
+)
+from groundtruth.services.embedding_cache import EmbeddingCache  # noqa: E402
+
+PERCENTILES = (50, 95)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", type=Path, default=None, help="dataset directory (default: Settings.data_dir)")
+    parser.add_argument("--queries", type=int, default=200, help="held-out events taken from the end of the file")
+    parser.add_argument("--depths", type=int, nargs="+", default=[4, 8, 12, 20, 30, 50],
+                        help="retrieval depths k to compare")
+    parser.add_argument("--sparse-k", type=int, default=None, help="BM25 hits fused (default: Settings.sparse_k)")
+    parser.add_argument("--rrf-k", type=int, default=None, help="fusion constant (default: Settings.rrf_k)")
+    parser.add_argument("--output", type=Path, default=None, help="write the report JSON here")
+    return parser.parse_args(argv)
+
+
+def percentiles(samples_ms):
+    values = np.asarray(samples_ms, dtype=np.float64)
+    stats = {"mean_ms": float(values.mean())}
+    for pct, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        stats[f"p{pct}_ms"] = float(value)
+    return stats
+
+
+def recall(hits, targets) -> float:
+    return len(targets & {hit.chunk.chunk_id for hit in hits}) / len(targets)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    settings = Settings(data_dir=args.data_dir) if args.data_dir is not None else Settings()
+    sparse_k = args.sparse_k or settings.sparse_k
+    rrf_k = args.rrf_k or settings.rrf_k
+    depths = sorted(set(args.depths))
+
+    chunk_store = open_chunk_store(settings.chunks_meta_path, settings.chunk_store_dir)
+    start = time.perf_counter()
+    sparse = open_bm25_index(chunk_store, settings.sparse_index_dir)
+    print(f"BM25 index over {len(sparse)} chunks ready in {(time.perf_counter() - start) * 1000:.0f} ms")
+    # One encode per query; later depths reuse the cached embedding so only FAISS is timed.
+    retriever = FaissRetriever(
+        index_path=settings.faiss_index_path,
+        chunk_store=chunk_store,
+        model_name=settings.embedding_model_name,
+        embedding_cache=EmbeddingCache(max_entries=args.queries + 1, ttl_s=0.0),
+    )
+    summaries = CustomerSummaryService(settings.data_dir)
+    builder = QueryBuilder()
+    targets_for = PinnedEvidence(chunk_store, store_k=1, profile_k=1, orders_k=0)
+
+    events = load_events(settings.data_dir / "live_location_events.csv")[-args.queries:]
+    encode_ms = []
+    dense_ms = {k: [] for k in depths}
+    hybrid_ms = {k: [] for k in depths}
+    dense_recall = {k: [] for k in depths}
+    hybrid_recall = {k: [] for k in depths}
+    try:
+        for position, event in enumerate(events):
+            targets = {
+                hit.chunk.chunk_id
+                for hit in targets_for.resolve(event.detected_store_id, event.customer_id)
+            }
+            if not targets:
+                continue
+            summary = summaries.summarize(event.customer_id)
+            query = builder.build(event, summary)
+            cache_key = f"benchmark-{position}"
+            start = time.perf_counter()
+            retriever.embed(query, cache_key=cache_key)
+            encode_ms.append((time.perf_counter() - start) * 1000.0)
+
+            start = time.perf_counter()
+            rows, _ = sparse.search(builder.lexical(event, summary), sparse_k)
+            lexical = [
+                RetrievedChunk(chunk=chunk_store[int(row)], score=0.0, rank=rank)
+                for rank, row in enumerate(rows, start=1)
+            ]
+            lexical_ms = (time.perf_counter() - start) * 1000.0
+
+            for k in depths:
+                start = time.perf_counter()
+                dense = retriever.search(query, k, cache_key=cache_key)
+                elapsed = (time.perf_counter() - start) * 1000.0
+                dense_ms[k].append(elapsed)
+                dense_recall[k].append(recall(dense, targets))
+
+                start = time.perf_counter()
+                fused = reciprocal_rank_fusion([dense, lexical], limit=k, k=rrf_k)
+                hybrid_ms[k].append(elapsed + lexical_ms + (time.perf_counter() - start) * 1000.0)
+                hybrid_recall[k].append(recall(fused, targets))
+    finally:
+        retriever.close()
+
+    if not encode_ms:
+        raise SystemExit("No events with a known store or customer chunk to score.")
+    print(f"{len(encode_ms)} queries, BM25 top-{sparse_k}, rrf_k={rrf_k}; "
+          f"encode p50 {percentiles(encode_ms)['p50_ms']:.2f} ms (shared by both modes)")
+    print(f"\n{'k':>4}{'dense R@k':>11}{'hybrid R@k':>12}{'dense p50':>11}{'dense p95':>11}"
+          f"{'hyb p50':>9}{'hyb p95':>9}")
+    report = {"queries": len(encode_ms), "sparse_k": sparse_k, "rrf_k": rrf_k,
+              "encode": percentiles(encode_ms), "depths": {}}
+    for k in depths:
+        row = {
+            "dense_recall": float(np.mean(dense_recall[k])),
+            "hybrid_recall": float(np.mean(hybrid_recall[k])),
+            "dense": percentiles(dense_ms[k]),
+            "hybrid": percentiles(hybrid_ms[k]),
+        }
+        report["depths"][str(k)] = row
+        print(f"{k:>4}{row['dense_recall']:>11.3f}{row['hybrid_recall']:>12.3f}"
+              f"{row['dense']['p50_ms']:>11.2f}{row['dense']['p95_ms']:>11.2f}"
+              f"{row['hybrid']['p50_ms']:>9.2f}{row['hybrid']['p95_ms']:>9.2f}")
+
+    reference_k = max((k for k in depths if k <= settings.retrieval_k), default=depths[-1])
+    reference = report["depths"][str(reference_k)]["dense_recall"]
+    matching = [k for k in depths if report["depths"][str(k)]["hybrid_recall"] >= reference]
+    report["dense_reference_k"] = reference_k
+    report["hybrid_k_matching_dense"] = matching[0] if matching else None
+    if matching:
+        print(f"\nHybrid reaches dense recall@{reference_k} ({reference:.3f}) at k={matching[0]}.")
+    else:
+        print(f"\nHybrid does not reach dense recall@{reference_k} ({reference:.3f}) at the tested depths.")
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print("\nSaved report to", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Replay Dataset/live_location_events.csv through RecommendationService and
+report per-stage latency percentiles and throughput.
+
+The LLM is replaced by the deterministic stub backend, so runs are
+reproducible and need no API key. Every concurrency level replays the same
+events, so the response, query-embedding and rerank-score caches are off
+unless --response-cache / --warm-caches keep them; otherwise later levels
+would measure cache warmth rather than concurrency. Results are written as
+JSON; pass --baseline to compare against a previous run and exit non-zero on
+regressions.
+
+Examples:
+    python benchmark_replay.py --concurrency 1 4 16 --output bench.json
+    python benchmark_replay.py --baseline bench.json --tolerance 0.2
+"""
+
+import argparse
+import csv
+import json
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from groundtruth.config import Settings  # noqa: E402
+from groundtruth.models import LiveEvent  # noqa: E402
+from groundtruth.services import RecommendationService, StageTimings, collect_timings  # noqa: E402
+
+STAGES = (
+    "summary", "locate", "response_cache", "query_build", "encode", "faiss",
+    "boost", "rerank", "select", "prompt", "llm", "validate",
+)
+PERCENTILES = (50, 95, 99)
+TIMESTAMP_FORMAT = "%d-%m-%Y %H:%M"
+
+# The events carry no utterance; pick one deterministically from the context.
+MESSAGES = {
+    "rainy": "It's pouring, what warm drink can I grab nearby?",
+    "cold": "I'm freezing, anything hot close to me?",
+    "hot": "It's so hot today, something cold please.",
+    "sunny": "Nice sunny day, what should I try?",
+}
+DEFAULT_MESSAGE = "I'm nearby, what do you recommend?"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline replay benchmark for the recommendation pipeline.")
+    parser.add_argument("--events", type=Path, default=None,
+                        help="events CSV (default: <data-dir>/live_location_events.csv)")
+    parser.add_argument("--data-dir", type=Path, default=None, help="dataset directory (default: Settings.data_dir)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="concurrent in-flight requests; one run per level")
+    parser.add_argument("--limit", type=int, default=None, help="replay only the first N events")
+    parser.add_argument("--warmup", type=int, default=20, help="events replayed before measuring")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated latency of the stub LLM")
+    parser.add_argument("--response-cache", action="store_true",
+                        help="keep the semantic response cache on (off by default so every run hits the full pipeline)")
+    parser.add_argument("--warm-caches", action="store_true",
+                        help="keep the query-embedding and rerank-score caches on (warm after the first level)")
+    parser.add_argument("--rerank-policy", choices=("always", "adaptive"), default=None,
+                        help="override Settings.rerank_policy")
+    parser.add_argument("--rerank-shadow-rate", type=float, default=None,
+                        help="fraction of adaptive shortcuts also fully reranked to measure evidence overlap")
+    parser.add_argument("--pinned-evidence", action="store_true",
+                        help="inject store/customer chunks by exact id (Settings.pinned_evidence)")
+    parser.add_argument("--hybrid-retrieval", action="store_true",
+                        help="fuse BM25 with FAISS hits (Settings.hybrid_retrieval)")
+    parser.add_argument("--retrieval-k", type=int, default=None, help="override Settings.retrieval_k")
+    parser.add_argument("--rerank-k", type=int, default=None, help="override Settings.rerank_k")
+    parser.add_argument("--output", type=Path, default=None, help="write results JSON here")
+    parser.add_argument("--baseline", type=Path, default=None, help="previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed relative p95 increase over the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="ignore regressions smaller than this (timer noise)")
+    return parser.parse_args(argv)
+
+
+def load_events(path: Path, limit=None):
+    events = []
+    with path.open("r", encoding="utf-8") as handle:
+        for row in csv.DictReader(handle):
+            weather = row.get("weather") or None
+            store_id = row.get("detected_store_id")
+            events.append(LiveEvent(
+                customer_id=int(row["customer_id"]),
+                message=MESSAGES.get((weather or "").lower(), DEFAULT_MESSAGE),
+                latitude=float(row["lat"]),
+                longitude=float(row["lon"]),
+                detected_store_id=int(store_id) if store_id else None,
+                weather=weather,
+                timestamp=datetime.strptime(row["timestamp"], TIMESTAMP_FORMAT),
+            ))
+            if limit is not None and len(events) >= limit:
+                break
+    return events
+
+
+def replay_one(service: RecommendationService, event: LiveEvent):
+    timings = StageTimings()
+    start = time.perf_counter()
+    error = None
+    with collect_timings(timings):
+        try:
+            service.recommend(event)
+        except Exception as exc:  # keep replaying; errors are counted
+            error = f"{type(exc).__name__}: {exc}"
+    return (time.perf_counter() - start) * 1000.0, timings.as_dict(), error
+
+
+def summarize(samples_ms, wall_s: float):
+    values = np.asarray(samples_ms, dtype=np.float64)
+    if not values.size:
+        return {"count": 0}
+    summary = {"count": int(values.size), "mean_ms": float(values.mean())}
+    for pct, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{pct}_ms"] = float(value)
+    summary["throughput_rps"] = values.size / wall_s if wall_s else 0.0
+    return summary
+
+
+def run_level(service: RecommendationService, events, concurrency: int):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda event: replay_one(service, event), events))
+        wall_s = time.perf_counter() - start
+
+    per_stage = {name: [] for name in STAGES}
+    errors = [error for _, _, error in results if error]
+    for _, stages, error in results:
+        if error:
+            continue
+        for name, elapsed in stages.items():
+            per_stage.setdefault(name, []).append(elapsed)
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "wall_s": wall_s,
+        "end_to_end": summarize([total for total, _, error in results if not error], wall_s),
+        "stages": {name: summarize(samples, wall_s) for name, samples in per_stage.items()},
+    }
+
+
+def keyed_runs(runs):
+    """Runs keyed by ``(concurrency, repeat)``, so a level listed twice keeps both runs."""
+    seen = {}
+    keyed = {}
+    for run in runs:
+        repeat = seen.get(run["concurrency"], 0)
+        seen[run["concurrency"]] = repeat + 1
+        keyed[(run["concurrency"], repeat)] = run
+    return keyed
+
+
+def compare(results, baseline, tolerance: float, min_delta_ms: float):
+    """Return human-readable p95 regressions relative to ``baseline``."""
+    previous = keyed_runs(baseline.get("runs", []))
+    regressions = []
+    for (concurrency, repeat), run in keyed_runs(results["runs"]).items():
+        base = previous.get((concurrency, repeat))
+        if base is None:
+            continue
+        label = f"c={concurrency}" + (f"#{repeat + 1}" if repeat else "")
+        pairs = [("end_to_end", run["end_to_end"], base["end_to_end"])]
+        pairs += [
+            (name, stats, base["stages"].get(name, {}))
+            for name, stats in run["stages"].items()
+        ]
+        for name, current, old in pairs:
+            now, before = current.get("p95_ms"), old.get("p95_ms")
+            if now is None or before is None:
+                continue
+            if now > before * (1.0 + tolerance) and now - before > min_delta_ms:
+                regressions.append(
+                    f"{label} {name}: p95 {before:.2f} -> {now:.2f} ms "
+                    f"(+{(now / before - 1.0) * 100 if before else float('inf'):.0f}%)"
+                )
+    return regressions
+
+
+def print_run(run) -> None:
+    e2e = run["end_to_end"]
+    print(f"\nconcurrency={run['concurrency']} requests={run['requests']} errors={run['errors']} "
+          f"throughput={e2e.get('throughput_rps', 0.0):.1f} req/s")
+    print(f"  {'stage':<16}{'p50':>10}{'p95':>10}{'p99':>10}{'mean':>10}")
+    for name, stats in [("end_to_end", e2e), *run["stages"].items()]:
+        if not stats.get("count"):
+            continue
+        print(f"  {name:<16}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+              f"{stats['p99_ms']:>10.2f}{stats['mean_ms']:>10.2f}")
+
+
+def print_rerank(stats) -> None:
+    paths = {name[len("path_"):]: int(count) for name, count in stats.items() if name.startswith("path_")}
+    print("\nrerank paths: " + ", ".join(f"{name}={count}" for name, count in paths.items() if count))
+    print(f"cross-encoder pairs scored={int(stats['pairs_scored'])} cached={int(stats['pairs_cached'])} "
+          f"skipped={int(stats['pairs_skipped'])} "
+          f"({stats['pairs_saved_ratio']:.0%} saved)")
+    if stats.get("shadow_runs"):
+        print(f"shadow evidence overlap {stats['shadow_overlap']:.3f} over {int(stats['shadow_runs'])} checks"
+              f" ({int(stats['shadow_dropped'])} dropped, {int(stats['pairs_shadow'])} extra pairs scored)")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    overrides = {"llm_backend": "stub", "stub_llm_latency_ms": args.llm_latency_ms}
+    if not args.response_cache:
+        overrides["response_cache_size"] = 0
+    if not args.warm_caches:
+        overrides["query_cache_size"] = 0
+        overrides["rerank_cache_size"] = 0
+    if args.data_dir is not None:
+        overrides["data_dir"] = args.data_dir
+    if args.rerank_policy is not None:
+        overrides["rerank_policy"] = args.rerank_policy
+    if args.rerank_shadow_rate is not None:
+        overrides["rerank_shadow_rate"] = args.rerank_shadow_rate
+    if args.pinned_evidence:
+        overrides["pinned_evidence"] = True
+    if args.hybrid_retrieval:
+        overrides["hybrid_retrieval"] = True
+    if args.retrieval_k is not None:
+        overrides["retrieval_k"] = args.retrieval_k
+    if args.rerank_k is not None:
+        overrides["rerank_k"] = args.rerank_k
+    settings = Settings(**overrides)
+    events = load_events(args.events or settings.data_dir / "live_location_events.csv", args.limit)
+    if not events:
+        raise SystemExit("No events to replay.")
+
+    print(f"Loading pipeline from {settings.data_dir} ...")
+    service = RecommendationService(settings)
+    try:
+        for event in events[: args.warmup]:
+            replay_one(service, event)
+        # Batch, cache and rerank figures then cover the measured runs only.
+        service.reset_stats()
+        runs = []
+        for concurrency in args.concurrency:
+            run = run_level(service, events, max(concurrency, 1))
+            print_run(run)
+            runs.append(run)
+        batching = service.batching_stats()
+        caches = service.cache_stats()
+    finally:
+        service.close()
+
+    # Read after close so queued shadow checks have finished.
+    rerank = service.rerank_stats()
+    print_rerank(rerank)
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "events": len(events),
+        "settings": {
+            "faiss_index_path": str(settings.faiss_index_path),
+            "partitioned_retrieval": settings.partitioned_retrieval,
+            "embedding_batch_max_size": settings.embedding_batch_max_size,
+            "rerank_batch_max_pairs": settings.rerank_batch_max_pairs,
+            "retrieval_k": settings.retrieval_k,
+            "rerank_k": settings.rerank_k,
+            "stub_llm_latency_ms": settings.stub_llm_latency_ms,
+            "response_cache_size": settings.response_cache_size,
+            "query_cache_size": settings.query_cache_size,
+            "rerank_cache_size": settings.rerank_cache_size,
+            "rerank_policy": settings.rerank_policy,
+            "pinned_evidence": settings.pinned_evidence,
+            "hybrid_retrieval": settings.hybrid_retrieval,
+        },
+        "caches": caches,
+        "rerank": rerank,
+        "batching": batching,
+        "runs": runs,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print("\nSaved results to", args.output)
+
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print(f"\nNo p95 regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
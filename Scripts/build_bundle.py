@@ -0,0 +1,73 @@
+"""
+Package the prepared dataset into one versioned serving bundle.
+Output:
+ - Dataset/bundle/   (faiss.index, chunk_store/, order_history/, customers.csv,
+                      stores.csv and manifest.json with checksums and row counts)
+
+Chunks are taken from chunks.jsonl + metas.jsonl, the files the index was built
+from, and the build fails if any row is unreadable or the counts disagree. The
+service serves from the bundle automatically when it exists
+(Settings.bundle_dir) and refuses to start if it does not match its manifest.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from groundtruth.services.order_history import OrderHistoryStore
+from groundtruth.services.serving_bundle import (
+    BundleMismatchError,
+    ServingBundle,
+    build_serving_bundle,
+    iter_aligned_chunks,
+)
+
+DATASET = SCRIPT_DIR.parent / "Dataset"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", type=Path, default=DATASET,
+                        help="directory with the build_embeddings.py outputs and the CSVs")
+    parser.add_argument("--index", type=Path, default=None, help="FAISS index (default: <data-dir>/faiss_index.index)")
+    parser.add_argument("--output", type=Path, default=None, help="bundle directory (default: <data-dir>/bundle)")
+    parser.add_argument("--embedding-model", default=None,
+                        help="model the index was embedded with (default: from embed_manifest.json)")
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir
+    output = args.output or data_dir / "bundle"
+    embedding_model = args.embedding_model
+    embed_manifest = data_dir / "embed_manifest.json"
+    if embedding_model is None and embed_manifest.exists():
+        embedding_model = json.loads(embed_manifest.read_text(encoding="utf-8")).get("embedding_model")
+
+    start = time.perf_counter()
+    try:
+        bundle = build_serving_bundle(
+            output,
+            index_path=args.index or data_dir / "faiss_index.index",
+            chunks=iter_aligned_chunks(data_dir / "chunks.jsonl", data_dir / "metas.jsonl"),
+            history=OrderHistoryStore.from_csv(data_dir / "customer_history.csv"),
+            customers_path=data_dir / "customers.csv",
+            stores_path=data_dir / "stores.csv",
+            embedding_model=embedding_model,
+        )
+    except BundleMismatchError as exc:
+        raise SystemExit(f"Bundle not built: {exc}")
+    print(f"Built bundle {bundle.bundle_id} in {output} in {time.perf_counter() - start:.2f}s")
+    for name, count in bundle.rows.items():
+        print(f"  {name:<10}{count:>10}")
+
+    start = time.perf_counter()
+    ServingBundle(output)
+    print(f"Re-opened bundle (size check) in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,30 @@ Build documents, chunk them, mask PII, and compute embeddings.
 Outputs:
  - Dataset/chunks.jsonl   (one JSON per chunk: {"text":..., "chunk_id":..., "meta":{...}})
  - Dataset/metas.jsonl
+ - Dataset/chunks_meta.jsonl (chunk + meta, the file the service loads)
  - Dataset/embeddings.npy
+ - Dataset/embed_manifest.json (doc hash + chunk ids per source document)
+
+Chunk ids are content hashes, so rebuilding unchanged data yields the same ids.
+With --incremental only new or changed documents are re-embedded; rows of
+removed/changed documents are dropped and new rows appended.
+
+Ingestion is streamed: PDF extraction and CSV row formatting run on a process
+pool, chunks are embedded in fixed-size batches, and embeddings are written
+straight into a pre-sized memory-mapped .npy, so peak memory does not grow
+with the corpus.
 """
 
+import argparse
+import hashlib
 import os
 import json
 import re
-import uuid
+import sys
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 from tqdm import tqdm
 import numpy as np
@@ -24,13 +41,24 @@ OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"  # replace if you prefer anoth
 CHUNK_SIZE_CHARS = 1600   # approx chunk size (~200-400 tokens depending on text)
 CHUNK_OVERLAP_CHARS = 300
 
+# Streaming params
+CSV_BLOCK_ROWS = 2000     # rows formatted per worker task
+EMBED_BATCH = 256         # chunks embedded per encoder call
+
 # Use absolute paths based on script location
 SCRIPT_DIR = Path(__file__).parent.resolve()
 BASE = SCRIPT_DIR / "Dataset"
 OUT_DIR = BASE
 CHUNKS_FILE = OUT_DIR / "chunks.jsonl"
 METAS_FILE = OUT_DIR / "metas.jsonl"
+CHUNKS_META_FILE = OUT_DIR / "chunks_meta.jsonl"
 EMB_FILE = OUT_DIR / "embeddings.npy"
+INDEX_FILE = OUT_DIR / "faiss_index.index"
+MANIFEST_FILE = OUT_DIR / "embed_manifest.json"
+MANIFEST_VERSION = 1
+
+# Make the groundtruth package importable when run as a script
+sys.path.insert(0, str(SCRIPT_DIR.parent))
 
 # Utility: mask PII (phone numbers & emails)
 PHONE_RE = re.compile(r'(\+?\d{1,3}[\s-]?)?(\d{4}[\d\-\s]{4,}\d+)')  # loose
@@ -41,8 +69,35 @@ def mask_pii(text: str) -> str:
     text = PHONE_RE.sub(lambda m: "[phone_masked]" + (m.group(2)[-4:] if m.group(2) else ""), text)
     return text
 
+# Content addressing: stable document keys, document hashes and chunk ids
+DOC_KEY_FIELDS = {
+    "customers.csv": "customer_id",
+    "stores.csv": "store_id",
+    "customer_history.csv": "order_id",
+}
+
+def doc_key(meta: dict) -> str:
+    source = meta.get("source", "")
+    field = DOC_KEY_FIELDS.get(source)
+    if field and meta.get(field) is not None:
+        return f"{source}:{meta[field]}"
+    return f"{source}/{meta.get('filename', '')}"
+
+def content_hash(*parts) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def doc_hash(text: str, meta: dict) -> str:
+    return content_hash(text, json.dumps(meta, sort_keys=True, default=str))
+
+def make_chunk_id(key: str, ordinal: int, text: str) -> str:
+    return content_hash(key, ordinal, text)[:32]
+
 # Read CSV rows and convert to searchable text documents
-def csv_row_to_text(row: pd.Series, source_name: str) -> tuple[str, dict]:
+def csv_row_to_text(row: dict, source_name: str) -> tuple[str, dict]:
     # Customize per CSV schema
     if source_name.endswith("customers.csv"):
         text = (
@@ -72,7 +127,7 @@ def csv_row_to_text(row: pd.Series, source_name: str) -> tuple[str, dict]:
         return text, meta
 
     # Fallback
-    text = json.dumps(row.to_dict())
+    text = json.dumps(dict(row), default=str)
     return text, {"source": source_name}
 
 # Extract text from PDFs using PyPDF2 (simple)
@@ -105,47 +160,68 @@ def chunk_text(text: str, chunk_size=CHUNK_SIZE_CHARS, overlap=CHUNK_OVERLAP_CHA
         yield chunk
         start += step
 
-# Create docs list (text + meta)
-def build_documents(base_path: Path):
-    docs = []  # each item: (text, meta)
-    # CSVs
+# Worker tasks (module level so the process pool can pickle them)
+def format_csv_block(records, source_name: str):
+    docs = []
+    for row in records:
+        text, meta = csv_row_to_text(row, source_name)
+        docs.append((mask_pii(text), meta))
+    return docs
+
+def load_file_document(path: Path):
+    if path.suffix.lower() == ".txt":
+        raw = path.read_text(encoding="utf-8", errors="ignore")
+    else:
+        raw = extract_text_from_pdf(path)
+    raw = raw.strip()
+    if not raw:
+        return None
+    raw = mask_pii(raw)
+    # metadata: try to infer IDs from filename
+    meta = {"source": str(path.parent.name), "filename": path.name}
+    return raw, meta
+
+def bounded_map(pool, fn, items, max_in_flight: int):
+    """Ordered pool.map that keeps at most max_in_flight tasks queued."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+# Stream docs (text + meta) from the dataset
+def iter_documents(base_path: Path, pool, max_in_flight: int):
+    # CSVs: read in blocks, format rows on the pool
     for csv_name in ["customers.csv", "stores.csv", "customer_history.csv"]:
         path = base_path / csv_name
         if not path.exists():
             continue
-        df = pd.read_csv(path)
-        for _, row in df.iterrows():
-            text, meta = csv_row_to_text(row, csv_name)
-            text = mask_pii(text)
-            docs.append((text, meta))
+        blocks = (
+            block.to_dict("records")
+            for block in pd.read_csv(path, chunksize=CSV_BLOCK_ROWS)
+        )
+        fn = partial(format_csv_block, source_name=csv_name)
+        for docs in bounded_map(pool, fn, blocks, max_in_flight):
+            yield from docs
 
-    # PDFs: both store_pdfs and customer_pdfs
+    # PDFs: both store_pdfs and customer_pdfs, extracted on the pool
     pdf_dirs = [base_path / "store_pdfs", base_path / "customer_pdfs"]
     for pd_dir in pdf_dirs:
         if not pd_dir.exists():
             continue
-        for p in pd_dir.iterdir():
-            if p.suffix.lower() not in [".pdf", ".txt"]:
-                continue
-            if p.suffix.lower() == ".txt":
-                raw = p.read_text(encoding="utf-8", errors="ignore")
-            else:
-                raw = extract_text_from_pdf(p)
-            raw = raw.strip()
-            if not raw:
-                continue
-            raw = mask_pii(raw)
-            # metadata: try to infer IDs from filename
-            meta = {"source": str(p.parent.name), "filename": p.name}
-            docs.append((raw, meta))
-
-    return docs
+        paths = (p for p in sorted(pd_dir.iterdir()) if p.suffix.lower() in [".pdf", ".txt"])
+        for doc in bounded_map(pool, load_file_document, paths, max_in_flight):
+            if doc is not None:
+                yield doc
 
 # Embedding functions
-def embed_with_sentence_transformers(texts, model_name=SENT_TRANSFORMER_MODEL):
-    from sentence_transformers import SentenceTransformer
-    model = SentenceTransformer(model_name)
-    embs = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
+def embed_with_sentence_transformers(texts, model_name=SENT_TRANSFORMER_MODEL, model=None):
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+    embs = model.encode(texts, batch_size=min(len(texts), 64) or 1, show_progress_bar=False, convert_to_numpy=True)
     # normalize for cosine similarity if desired
     norms = np.linalg.norm(embs, axis=1, keepdims=True)
     norms[norms==0] = 1.0
@@ -161,7 +237,7 @@ def embed_with_openai(texts, model_name=OPENAI_EMBEDDING_MODEL):
     openai.api_key = key
     embs = []
     BATCH = 32
-    for i in tqdm(range(0, len(texts), BATCH), desc="OpenAI embed"):
+    for i in range(0, len(texts), BATCH):
         batch = texts[i:i+BATCH]
         resp = openai.Embeddings.create(model=model_name, input=batch)
         vecs = [r["embedding"] for r in resp["data"]]
@@ -173,61 +249,295 @@ def embed_with_openai(texts, model_name=OPENAI_EMBEDDING_MODEL):
     embs = embs / norms
     return embs
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build chunks, embeddings and the FAISS index.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="re-embed only documents that are new or changed since the last manifest")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes used for PDF extraction and row formatting")
+    parser.add_argument("--embed-batch", type=int, default=EMBED_BATCH,
+                        help="chunks embedded per encoder call")
+    add_index_arguments(parser)
+    return parser.parse_args(argv)
+
+def add_index_arguments(parser: argparse.ArgumentParser) -> None:
+    """FAISS index options shared with check_embeddings.py."""
+    parser.add_argument("--index-type", default="flat",
+                        choices=["flat", "ivf_flat", "ivf_pq", "hnsw"],
+                        help="flat = exhaustive scan; IVF/HNSW trade recall for latency at scale")
+    parser.add_argument("--nlist", type=int, default=1024, help="IVF coarse clusters (clamped for small corpora)")
+    parser.add_argument("--pq-m", type=int, default=16, help="IVF-PQ sub-quantizers (must divide the dimension)")
+    parser.add_argument("--pq-nbits", type=int, default=8, help="IVF-PQ bits per sub-quantizer code")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW graph neighbours per node")
+    parser.add_argument("--ef-construction", type=int, default=200, help="HNSW build-time candidate list size")
+    parser.add_argument("--train-sample", type=int, default=100_000, help="Max vectors used to train IVF indexes")
+
+def write_faiss_index(embs: np.ndarray, args, path: Path = INDEX_FILE) -> None:
+    from groundtruth.services.faiss_index import build_index, describe
+    import faiss
+
+    index = build_index(
+        embs,
+        index_type=args.index_type,
+        nlist=args.nlist,
+        pq_m=args.pq_m,
+        pq_nbits=args.pq_nbits,
+        hnsw_m=args.hnsw_m,
+        ef_construction=args.ef_construction,
+        train_sample=args.train_sample,
+    )
+    faiss.write_index(index, str(path))
+    print("FAISS index created at", path, "->", describe(index))
+
+def make_embedder():
+    """Load the embedding backend once; returns a function embedding one batch."""
+    if EMBEDDING_BACKEND == "sentence-transformers":
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(SENT_TRANSFORMER_MODEL)
+        return partial(embed_with_sentence_transformers, model=model)
+    if EMBEDDING_BACKEND == "openai":
+        return embed_with_openai
+    raise ValueError("Unknown EMBEDDING_BACKEND")
+
+def embedding_model_name() -> str:
+    if EMBEDDING_BACKEND == "sentence-transformers":
+        return SENT_TRANSFORMER_MODEL
+    if EMBEDDING_BACKEND == "openai":
+        return OPENAI_EMBEDDING_MODEL
+    raise ValueError("Unknown EMBEDDING_BACKEND")
+
+def chunk_document(text: str, meta: dict):
+    """Split one document into (chunk_id, text, meta) with content-hash ids."""
+    key = doc_key(meta)
+    for ordinal, c in enumerate(chunk_text(text)):
+        chunk_id = make_chunk_id(key, ordinal, c)
+        chunk_meta = dict(meta)  # copy
+        chunk_meta["doc_key"] = key
+        chunk_meta["chunk_id"] = chunk_id
+        chunk_meta["char_length"] = len(c)
+        yield chunk_id, c, chunk_meta
+
+def load_manifest():
+    if not MANIFEST_FILE.exists():
+        return None
+    manifest = json.loads(MANIFEST_FILE.read_text(encoding="utf-8"))
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def iter_jsonl(path: Path):
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+
+def batched(items, size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class ChunkWriter:
+    """Streams chunk rows to the three JSONL outputs (via temp files)."""
+
+    def __init__(self):
+        self.count = 0
+        self._targets = [CHUNKS_FILE, METAS_FILE, CHUNKS_META_FILE]
+        self._tmp = [path.with_name(path.name + ".tmp") for path in self._targets]
+        self._handles = [open(path, "w", encoding="utf-8") for path in self._tmp]
+
+    def write(self, chunk_id: str, text: str, meta: dict) -> None:
+        fch, fmeta, fcm = self._handles
+        fch.write(json.dumps({"chunk_id": chunk_id, "text": text}, ensure_ascii=False) + "\n")
+        fmeta.write(json.dumps(meta, ensure_ascii=False) + "\n")
+        fcm.write(json.dumps({"chunk_id": chunk_id, "text": text, "meta": meta}, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def commit(self) -> None:
+        for handle in self._handles:
+            handle.close()
+        for tmp, target in zip(self._tmp, self._targets):
+            os.replace(tmp, target)
+
+    def abort(self) -> None:
+        """Close and delete the temp files; the previous outputs stay untouched."""
+        for handle in self._handles:
+            handle.close()
+        for tmp in self._tmp:
+            tmp.unlink(missing_ok=True)
+
+class EmbeddingSink:
+    """Pre-sized float32 .npy written through a memory map."""
+
+    def __init__(self, path: Path, rows: int):
+        self._path = path
+        self._tmp = path.with_name(path.name + ".tmp.npy")
+        self._rows = rows
+        self._array = None
+        self.filled = 0
+
+    def write(self, vectors: np.ndarray) -> None:
+        if self._array is None:
+            self._array = np.lib.format.open_memmap(
+                self._tmp, mode="w+", dtype=np.float32, shape=(self._rows, vectors.shape[1])
+            )
+        self._array[self.filled:self.filled + len(vectors)] = vectors
+        self.filled += len(vectors)
+
+    def commit(self) -> np.ndarray:
+        if self._array is None:
+            np.save(self._path, np.empty((0, 0), dtype=np.float32))
+        else:
+            self._array.flush()
+            del self._array
+            os.replace(self._tmp, self._path)
+        return np.load(self._path, mmap_mode="r")
+
+    def abort(self) -> None:
+        """Drop the memory map and delete the temp .npy."""
+        self._array = None
+        self._tmp.unlink(missing_ok=True)
+
+def update_faiss_index(removed_rows, new_embs, all_embs, previous_count, args) -> None:
+    """Patch a flat index in place (remove + append); other index types are rebuilt."""
+    import faiss
+
+    if INDEX_FILE.exists() and args.index_type == "flat":
+        index = faiss.read_index(str(INDEX_FILE))
+        if isinstance(index, faiss.IndexFlat) and index.ntotal == previous_count:
+            if removed_rows:
+                # Flat removal compacts ids, matching the compacted JSONL rows.
+                index.remove_ids(np.asarray(removed_rows, dtype=np.int64))
+            for start in range(0, len(new_embs), 65_536):
+                index.add(np.ascontiguousarray(new_embs[start:start + 65_536], dtype=np.float32))
+            faiss.write_index(index, str(INDEX_FILE))
+            print(f"FAISS index patched in place: -{len(removed_rows)} +{len(new_embs)} -> {index.ntotal}")
+            return
+    write_faiss_index(all_embs, args)
+
+def main(argv=None):
+    args = parse_args(argv)
     # Check if Dataset directory exists
     if not BASE.exists():
         raise FileNotFoundError(f"Dataset directory not found at: {BASE}")
-    
-    print("Building docs from dataset...")
-    docs = build_documents(BASE)
-    print(f"Total raw docs found: {len(docs)}")
-
-    # Expand docs into chunks
-    chunks = []
-    metas = []
-    for text, meta in tqdm(docs, desc="Chunking docs"):
-        # some docs are short single-line CSV rows; some are long PDFs
-        for c in chunk_text(text):
-            chunk_id = str(uuid.uuid4())
-            chunk_meta = dict(meta)  # copy
-            chunk_meta["chunk_id"] = chunk_id
-            chunk_meta["char_length"] = len(c)
-            chunks.append({"chunk_id": chunk_id, "text": c})
-            metas.append(chunk_meta)
-
-    print(f"Total chunks produced: {len(chunks)}")
-
-    # Save chunks and metas (jsonl)
-    with open(CHUNKS_FILE, "w", encoding="utf-8") as fch, open(METAS_FILE, "w", encoding="utf-8") as fmeta:
-        for ch, m in zip(chunks, metas):
-            fch.write(json.dumps({"chunk_id": ch["chunk_id"], "text": ch["text"]}, ensure_ascii=False) + "\n")
-            fmeta.write(json.dumps(m, ensure_ascii=False) + "\n")
-
-    # Prepare text list for embedding
-    texts = [c["text"] for c in chunks]
-    print("Computing embeddings using:", EMBEDDING_BACKEND)
 
-    if EMBEDDING_BACKEND == "sentence-transformers":
-        embs = embed_with_sentence_transformers(texts)
-    elif EMBEDDING_BACKEND == "openai":
-        embs = embed_with_openai(texts)
-    else:
-        raise ValueError("Unknown EMBEDDING_BACKEND")
+    model_name = embedding_model_name()
+    manifest = load_manifest() if args.incremental else None
+    if manifest and manifest.get("embedding_model") != model_name:
+        print("Embedding model changed since the last build; running a full rebuild.")
+        manifest = None
+    previous_docs = manifest["docs"] if manifest else {}
+
+    # Pass 1: stream documents; unchanged ones are only recorded, chunks of
+    # new/changed ones are spooled to a temp file for embedding.
+    unchanged_keys = set()
+    manifest_docs = {}
+    docs_seen = 0
+    new_count = 0
+    writer = sink = None
+    completed = False
+    spool = tempfile.NamedTemporaryFile("w+", encoding="utf-8", suffix=".jsonl", dir=OUT_DIR, delete=False)
+    try:
+        print(f"Streaming docs from dataset with {args.workers} workers...")
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            docs = iter_documents(BASE, pool, max_in_flight=args.workers * 2)
+            for text, meta in tqdm(docs, desc="Chunking docs"):
+                docs_seen += 1
+                key = doc_key(meta)
+                digest = doc_hash(text, meta)
+                old = previous_docs.get(key)
+                if old and old["hash"] == digest:
+                    unchanged_keys.add(key)
+                    manifest_docs[key] = old
+                    continue
+                # some docs are short single-line CSV rows; some are long PDFs
+                chunk_ids = []
+                for chunk_id, c, chunk_meta in chunk_document(text, meta):
+                    spool.write(json.dumps([chunk_id, c, chunk_meta], ensure_ascii=False) + "\n")
+                    chunk_ids.append(chunk_id)
+                new_count += len(chunk_ids)
+                manifest_docs[key] = {"hash": digest, "chunk_ids": chunk_ids}
+        spool.flush()
+        print(f"Total raw docs found: {docs_seen}")
+
+        retained_count = sum(len(manifest_docs[key]["chunk_ids"]) for key in unchanged_keys)
+        total = retained_count + new_count
+        writer = ChunkWriter()
+        sink = EmbeddingSink(EMB_FILE, total)
+
+        # Pass 2a: carry over rows of unchanged documents in their previous order
+        removed_rows = []
+        previous_count = 0
+        if manifest and retained_count:
+            old_embs = np.load(EMB_FILE, mmap_mode="r")
+            keep = []
+            for row, record in enumerate(iter_jsonl(CHUNKS_META_FILE)):
+                previous_count += 1
+                if record["meta"].get("doc_key") in unchanged_keys:
+                    writer.write(record["chunk_id"], record["text"], record["meta"])
+                    keep.append(row)
+                else:
+                    removed_rows.append(row)
+                if len(keep) >= args.embed_batch:
+                    sink.write(np.asarray(old_embs[keep], dtype=np.float32))
+                    keep = []
+            if keep:
+                sink.write(np.asarray(old_embs[keep], dtype=np.float32))
+            del old_embs
+        elif manifest and CHUNKS_META_FILE.exists():
+            previous_count = sum(1 for _ in iter_jsonl(CHUNKS_META_FILE))
+            removed_rows = list(range(previous_count))
+        if sink.filled != retained_count:
+            raise RuntimeError("Previous build is inconsistent with its manifest; rerun without --incremental.")
+        print(f"Chunks reused: {retained_count}, removed: {len(removed_rows)}, to embed: {new_count}")
+
+        # Pass 2b: embed spooled chunks in fixed-size batches
+        print("Computing embeddings using:", EMBEDDING_BACKEND)
+        if new_count:
+            embed = make_embedder()
+            spool.seek(0)
+            rows = (json.loads(line) for line in spool)
+            with tqdm(total=new_count, desc="Embedding") as progress:
+                for batch in batched(rows, args.embed_batch):
+                    for chunk_id, c, chunk_meta in batch:
+                        writer.write(chunk_id, c, chunk_meta)
+                    sink.write(embed([c for _, c, _ in batch]).astype(np.float32))
+                    progress.update(len(batch))
+        completed = True
+    finally:
+        spool.close()
+        os.unlink(spool.name)
+        if not completed:
+            # Failed or interrupted: leave no *.tmp outputs behind.
+            for output in (writer, sink):
+                if output is not None:
+                    output.abort()
 
-    # Save embeddings numpy array (rows aligned with chunks.jsonl & metas.jsonl)
-    np.save(EMB_FILE, embs.astype(np.float32))
+    # Save chunks, metas and embeddings (rows aligned across all outputs)
+    print(f"Total chunks produced: {writer.count}")
+    writer.commit()
+    embs = sink.commit()
+    MANIFEST_FILE.write_text(json.dumps({
+        "version": MANIFEST_VERSION,
+        "embedding_model": model_name,
+        "chunk_count": writer.count,
+        "docs": manifest_docs,
+    }), encoding="utf-8")
     print("Saved embeddings to:", EMB_FILE)
     print("Saved chunks to:", CHUNKS_FILE)
     print("Saved metas to:", METAS_FILE)
+    print("Saved manifest to:", MANIFEST_FILE)
 
-    # Optional: create a FAISS index (uncomment if faiss-cpu is installed)
+    # Optional: create a FAISS index (requires faiss-cpu)
     try:
-        import faiss
-        dim = embs.shape[1]
-        index = faiss.IndexFlatIP(dim)  # inner product on normalized vectors ~ cosine
-        index.add(embs.astype(np.float32))
-        faiss.write_index(index, str(OUT_DIR / "faiss_index.index"))
-        print("FAISS index created at", OUT_DIR / "faiss_index.index")
+        if manifest:
+            update_faiss_index(removed_rows, embs[retained_count:], embs, previous_count, args)
+        else:
+            write_faiss_index(embs, args)
     except Exception as e:
         print("Skipping FAISS index creation (faiss not available or error):", e)
 
@@ -1,8 +1,15 @@
 # recompute_embeddings_faiss.py
+import argparse
 import json, numpy as np
 from pathlib import Path
 from tqdm import tqdm
 
+from build_embeddings import add_index_arguments, write_faiss_index
+
+parser = argparse.ArgumentParser(description="Recompute embeddings and the FAISS index from chunks.jsonl.")
+add_index_arguments(parser)
+args = parser.parse_args()
+
 # Use absolute path based on script location
 SCRIPT_DIR = Path(__file__).parent.resolve()
 BASE = SCRIPT_DIR / "Dataset"
@@ -42,12 +49,7 @@ print("Saved embeddings to", EMB_OUT)
 
 # Optional: build FAISS index
 try:
-    import faiss
-    dim = embs.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(embs.astype(np.float32))
-    faiss.write_index(index, str(BASE/"faiss_index.index"))
-    print("FAISS index written to", BASE/"faiss_index.index")
+    write_faiss_index(embs, args, BASE/"faiss_index.index")
 except Exception as e:
     print("Faiss not available or error building index:", e)
     print("You still have embeddings.npy and chunks_meta.jsonl to use with other vector DBs.")
@@ -0,0 +1,43 @@
+"""
+Convert Dataset/chunks_meta.jsonl into the memory-mapped chunk store layout.
+Output:
+ - Dataset/chunk_store/   (manifest.json, text/chunk_id/meta blobs + offsets, id columns)
+
+The service picks the directory up automatically (Settings.chunk_store_dir).
+Rows keep the JSONL order, so they stay aligned with the FAISS index.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from groundtruth.services.chunk_store import ChunkStore
+from groundtruth.services.mapped_chunk_store import MappedChunkStore, write_mapped_chunk_store
+
+DATASET = SCRIPT_DIR.parent / "Dataset"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", type=Path, default=DATASET / "chunks_meta.jsonl")
+    parser.add_argument("--output", type=Path, default=DATASET / "chunk_store")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    source = ChunkStore(args.input)
+    rows = write_mapped_chunk_store(source.iter(), args.output)
+    print(f"Wrote {rows} chunks to {args.output} in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    mapped = MappedChunkStore(args.output)
+    print(f"Re-opened mapped store ({len(mapped)} rows) in {(time.perf_counter() - start) * 1000:.1f} ms")
+    if len(mapped) != len(source) or mapped[len(mapped) - 1] != source[len(source) - 1]:
+        raise SystemExit("Round-trip check failed: mapped store does not match the JSONL input.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Convert Dataset/customer_history.csv into the columnar order history layout.
+Output:
+ - Dataset/order_history/   (manifest.json, one .npy per column + store row permutation)
+
+The service picks the directory up automatically (Settings.order_history_dir).
+Re-run it whenever customer_history.csv changes.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from groundtruth.services.order_history import OrderHistoryStore, write_order_history
+
+DATASET = SCRIPT_DIR.parent / "Dataset"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", type=Path, default=DATASET / "customer_history.csv")
+    parser.add_argument("--output", type=Path, default=DATASET / "order_history")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    source = OrderHistoryStore.from_csv(args.input)
+    rows = write_order_history(source, args.output)
+    print(f"Wrote {rows} orders ({len(source.customers())} customers) to {args.output} "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    mapped = OrderHistoryStore.open(args.output)
+    print(f"Re-opened mapped store ({len(mapped)} rows) in {(time.perf_counter() - start) * 1000:.1f} ms")
+    customer = int(source.customers()[-1]) if len(source) else None
+    if len(mapped) != len(source) or (
+        customer is not None and mapped.recent_items(customer) != source.recent_items(customer)
+    ):
+        raise SystemExit("Round-trip check failed: mapped store does not match the CSV input.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Build the BM25 postings used by hybrid retrieval from the chunk store.
+Output:
+ - Dataset/sparse_index/   (manifest.json, terms.json, indptr/rows/impacts arrays)
+
+The service picks the directory up automatically (Settings.sparse_index_dir)
+when hybrid_retrieval is on; without it the index is built at startup.
+Rows follow the chunk store, so they stay aligned with the FAISS index; the
+manifest records a digest of the store's chunk ids and the service rebuilds
+in memory instead of using postings written for a different store.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from groundtruth.services.mapped_chunk_store import open_chunk_store
+from groundtruth.services.sparse_index import BM25Index, write_bm25_index
+
+DATASET = SCRIPT_DIR.parent / "Dataset"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", type=Path, default=DATASET / "chunks_meta.jsonl")
+    parser.add_argument("--chunk-store", type=Path, default=DATASET / "chunk_store",
+                        help="mapped chunk store to read instead of the JSONL, when present")
+    parser.add_argument("--output", type=Path, default=DATASET / "sparse_index")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    chunks = open_chunk_store(args.input, args.chunk_store)
+    index = BM25Index.build(chunk.text for chunk in chunks.iter())
+    postings = write_bm25_index(index, args.output, chunk_ids_digest=chunks.chunk_ids_digest())
+    print(f"Indexed {len(index)} chunks ({postings} postings) into {args.output} "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    mapped = BM25Index.open(args.output)
+    print(f"Re-opened index ({len(mapped)} rows) in {(time.perf_counter() - start) * 1000:.1f} ms")
+    probe = chunks[len(chunks) - 1].text if len(chunks) else ""
+    if (
+        len(mapped) != len(chunks)
+        or mapped.chunk_ids_digest != chunks.chunk_ids_digest()
+        or not all((a == b).all() for a, b in zip(mapped.search(probe, 5), index.search(probe, 5)))
+    ):
+        raise SystemExit("Round-trip check failed: mapped index does not match the built one.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Compare encoder / cross-encoder backends against PyTorch fp32 on held-out queries.
+
+Queries are built from the last --queries events of live_location_events.csv
+(the same way the service builds them). For every backend the script reports
+encode and rerank latency percentiles, how many of the fp32 top-k retrieval
+hits it reproduces, and how well its reranked order agrees with fp32 reranking
+of the same candidates. Exits non-zero if a backend falls below --min-overlap.
+
+Examples:
+    python evaluate_model_backends.py --backends torch torch_int8 onnx onnx_int8
+    python evaluate_model_backends.py --queries 500 --output backends.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from benchmark_replay import load_events  # noqa: E402
+
+from groundtruth.config import Settings  # noqa: E402
+from groundtruth.services import (  # noqa: E402
+    CrossEncoderReranker,
+    CustomerSummaryService,
+    FaissRetriever,
+    QueryBuilder,
+    StageTimings,
+    collect_timings,
+    open_chunk_store,
+)
+from groundtruth.services.model_backends import MODEL_BACKENDS  # noqa: E402
+
+BASELINE = "torch"
+PERCENTILES = (50, 95)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", nargs="+", choices=MODEL_BACKENDS, default=list(MODEL_BACKENDS))
+    parser.add_argument("--data-dir", type=Path, default=None, help="dataset directory (default: Settings.data_dir)")
+    parser.add_argument("--queries", type=int, default=200, help="held-out events taken from the end of the file")
+    parser.add_argument("--top-k", type=int, default=None, help="retrieval depth (default: Settings.rerank_k)")
+    parser.add_argument("--evidence-k", type=int, default=None,
+                        help="reranked positions compared (default: Settings.evidence_top_k)")
+    parser.add_argument("--min-overlap", type=float, default=0.9,
+                        help="minimum mean top-k overlap with fp32 for retrieval and rerank")
+    parser.add_argument("--output", type=Path, default=None, help="write the report JSON here")
+    return parser.parse_args(argv)
+
+
+def build_queries(settings: Settings, count: int):
+    events = load_events(settings.data_dir / "live_location_events.csv")[-count:]
+    summaries = CustomerSummaryService(settings.data_dir)
+    builder = QueryBuilder()
+    return [builder.build(event, summaries.summarize(event.customer_id)) for event in events]
+
+
+def percentiles(samples_ms):
+    values = np.asarray(samples_ms, dtype=np.float64)
+    stats = {"mean_ms": float(values.mean())}
+    for pct, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        stats[f"p{pct}_ms"] = float(value)
+    return stats
+
+
+def overlap(ids, reference, k: int) -> float:
+    return len(set(ids[:k]) & set(reference[:k])) / max(min(k, len(reference)), 1)
+
+
+def run_backend(backend: str, settings: Settings, chunk_store, queries, candidates, top_k: int, evidence_k: int):
+    """Retrieval and rerank for every query.
+
+    The reranker scores ``candidates`` (the fp32 retrieval hits) when given, so
+    rerank order is compared on identical inputs; the baseline passes ``None``
+    and reranks its own hits, which become the candidates for the others.
+    """
+
+    retriever = FaissRetriever(
+        index_path=settings.faiss_index_path,
+        chunk_store=chunk_store,
+        model_name=settings.embedding_model_name,
+        model_backend=backend,
+        model_export_dir=settings.model_export_dir,
+        model_quantization=settings.onnx_quantization,
+    )
+    reranker = CrossEncoderReranker(
+        settings.cross_encoder_model_name,
+        model_backend=backend,
+        model_export_dir=settings.model_export_dir,
+        model_quantization=settings.onnx_quantization,
+    )
+    try:
+        retrieved, reranked, encode_ms, rerank_ms, hits_per_query = [], [], [], [], []
+        for position, query in enumerate(queries):
+            timings = StageTimings()
+            with collect_timings(timings):
+                hits = retriever.search(query, top_k)
+            encode_ms.append(timings.as_dict().get("encode", 0.0))
+            retrieved.append([hit.chunk.chunk_id for hit in hits])
+            hits_per_query.append(hits)
+
+            pool = candidates[position] if candidates is not None else hits
+            start = time.perf_counter()
+            ranked = reranker.rerank(query, pool, evidence_k)
+            rerank_ms.append((time.perf_counter() - start) * 1000.0)
+            reranked.append([hit.chunk.chunk_id for hit in ranked])
+        return retrieved, reranked, encode_ms, rerank_ms, hits_per_query
+    finally:
+        retriever.close()
+        reranker.close()
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    settings = Settings(data_dir=args.data_dir) if args.data_dir is not None else Settings()
+    top_k = args.top_k or settings.rerank_k
+    evidence_k = args.evidence_k or settings.evidence_top_k
+    chunk_store = open_chunk_store(settings.chunks_meta_path, settings.chunk_store_dir)
+    queries = build_queries(settings, args.queries)
+    print(f"{len(queries)} held-out queries, retrieval top-{top_k}, rerank top-{evidence_k}")
+
+    results = {}
+    reference = candidates = None
+    # The fp32 baseline always runs first; its retrieval hits are the rerank candidates.
+    for backend in [BASELINE] + [name for name in args.backends if name != BASELINE]:
+        print(f"Running {backend} ...")
+        retrieved, reranked, encode_ms, rerank_ms, hits = run_backend(
+            backend, settings, chunk_store, queries, candidates, top_k, evidence_k
+        )
+        if reference is None:
+            reference, candidates = (retrieved, reranked), hits
+        results[backend] = {
+            "encode": percentiles(encode_ms),
+            "rerank": percentiles(rerank_ms),
+            "retrieval_overlap": float(np.mean([
+                overlap(ids, ref, top_k) for ids, ref in zip(retrieved, reference[0])
+            ])),
+            "rerank_overlap": float(np.mean([
+                overlap(ids, ref, evidence_k) for ids, ref in zip(reranked, reference[1])
+            ])),
+            "rerank_top1_agreement": float(np.mean([
+                bool(ids) and bool(ref) and ids[0] == ref[0] for ids, ref in zip(reranked, reference[1])
+            ])),
+        }
+
+    base = results[BASELINE]
+    print(f"\n{'backend':<12}{'enc p50':>9}{'enc p95':>9}{'rr p50':>9}{'rr p95':>9}"
+          f"{'speedup':>9}{'ret@k':>8}{'rr@k':>8}{'top1':>7}")
+    failures = []
+    for backend, stats in results.items():
+        total = stats["encode"]["p50_ms"] + stats["rerank"]["p50_ms"]
+        base_total = base["encode"]["p50_ms"] + base["rerank"]["p50_ms"]
+        stats["speedup_p50"] = base_total / total if total else 0.0
+        print(f"{backend:<12}{stats['encode']['p50_ms']:>9.2f}{stats['encode']['p95_ms']:>9.2f}"
+              f"{stats['rerank']['p50_ms']:>9.2f}{stats['rerank']['p95_ms']:>9.2f}"
+              f"{stats['speedup_p50']:>8.2f}x{stats['retrieval_overlap']:>8.3f}"
+              f"{stats['rerank_overlap']:>8.3f}{stats['rerank_top1_agreement']:>7.2f}")
+        for key in ("retrieval_overlap", "rerank_overlap"):
+            if stats[key] < args.min_overlap:
+                failures.append(f"{backend}: {key} {stats[key]:.3f} < {args.min_overlap}")
+
+    if args.output is not None:
+        report = {"queries": len(queries), "top_k": top_k, "evidence_k": evidence_k, "backends": results}
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print("\nSaved report to", args.output)
+    if failures:
+        print("\nBelow the accuracy floor:")
+        for line in failures:
+            print("  " + line)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Export the query encoder and the cross-encoder to ONNX and quantize them to int8.
+Output:
+ - Dataset/models/encoder/<model>/onnx/model.onnx, model_qint8_<config>.onnx
+ - Dataset/models/cross_encoder/<model>/onnx/model.onnx, model_qint8_<config>.onnx
+
+Select the runtime with Settings.encoder_backend / Settings.cross_encoder_backend
+("onnx" or "onnx_int8"; "torch_int8" quantizes in memory and needs no export).
+onnx_int8 loads exactly model_qint8_<Settings.onnx_quantization>.onnx, so export
+with the same --quantization (it defaults to that setting).
+Check the accuracy/latency trade-off with evaluate_model_backends.py before
+switching production to int8. Needs the ONNX extra:
+    pip install "sentence-transformers[onnx]"
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from sentence_transformers import CrossEncoder, SentenceTransformer, export_dynamic_quantized_onnx_model
+
+from groundtruth.config import Settings
+from groundtruth.services.model_backends import (
+    CROSS_ENCODER_DIR,
+    ENCODER_DIR,
+    QUANTIZATION_CONFIGS,
+    exported_model_dir,
+)
+
+
+def export(factory, model_name: str, target: Path, quantization: str, quantize: bool) -> None:
+    start = time.perf_counter()
+    model = factory(model_name, backend="onnx")
+    model.save_pretrained(str(target))
+    print(f"Exported {model_name} to {target / 'onnx'} in {time.perf_counter() - start:.1f}s")
+    if quantize:
+        start = time.perf_counter()
+        export_dynamic_quantized_onnx_model(
+            model, quantization_config=quantization, model_name_or_path=str(target)
+        )
+        print(f"Quantized {model_name} ({quantization}) in {time.perf_counter() - start:.1f}s")
+
+
+def main(argv=None):
+    settings = Settings()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--encoder", default=settings.embedding_model_name)
+    parser.add_argument("--cross-encoder", default=settings.cross_encoder_model_name)
+    parser.add_argument("--output", type=Path, default=settings.model_export_dir)
+    parser.add_argument("--quantization", choices=QUANTIZATION_CONFIGS, default=settings.onnx_quantization,
+                        help="int8 kernel set of the serving CPUs (default: Settings.onnx_quantization)")
+    parser.add_argument("--skip-quantize", action="store_true", help="export the fp32 graphs only")
+    parser.add_argument("--only", choices=("encoder", "cross_encoder"), default=None)
+    args = parser.parse_args(argv)
+
+    jobs = [
+        (ENCODER_DIR, SentenceTransformer, args.encoder),
+        (CROSS_ENCODER_DIR, CrossEncoder, args.cross_encoder),
+    ]
+    for kind, factory, model_name in jobs:
+        if args.only and args.only != kind:
+            continue
+        target = exported_model_dir(args.output, kind, model_name)
+        export(factory, model_name, target, args.quantization, not args.skip_quantize)
+
+
+if __name__ == "__main__":
+    main()
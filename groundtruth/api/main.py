@@ -1,32 +1,245 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
 
 from ..config import get_settings
-from ..models import RecommendationRequest, RecommendationResponse
+from ..models import (
+    RecommendationBatchRequest,
+    RecommendationRequest,
+    RecommendationResponse,
+)
 from ..services import RecommendationService
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _Runtime:
+    """Startup state shared by the handlers; ``service`` is set once loading finishes."""
+
+    status: str = "loading"  # loading | ready | failed
+    service: Optional[RecommendationService] = None
+    error: Optional[str] = None
+    load_ms: Dict[str, float] = field(default_factory=dict)
+
+
+settings = get_settings()
+runtime = _Runtime()
+
+
+def _load() -> RecommendationService:
+    # Published from the loader thread itself, so shutdown can close a service
+    # whose load finished after startup was cancelled. Handlers still wait
+    # for status "ready".
+    runtime.service = RecommendationService(settings)
+    return runtime.service
+
+
+async def _in_thread(func, *args):
+    """``asyncio.to_thread`` that, when cancelled, still waits for the thread.
+
+    A worker thread cannot be interrupted; without this, shutdown would leak
+    a service still being built or close one while warmup is running on it.
+    """
+
+    worker = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(worker)
+    except asyncio.CancelledError:
+        await asyncio.wait({worker})
+        raise
+
+
+async def _start() -> None:
+    """Load the pipeline off the event loop, warm it up, then flip to ready."""
+
+    started = time.perf_counter()
+    try:
+        service = await _in_thread(_load)
+        load_ms = dict(service.load_timings_ms)
+        if settings.warmup_rounds > 0:
+            load_ms["warmup"] = await _in_thread(service.warmup, settings.warmup_rounds)
+        load_ms["total"] = (time.perf_counter() - started) * 1000.0
+        runtime.load_ms = load_ms
+        runtime.status = "ready"
+        logger.info("Service ready in %.0f ms", load_ms["total"])
+    except asyncio.CancelledError:
+        raise
+    except Exception as exc:
+        logger.exception("Service startup failed")
+        runtime.error = f"{type(exc).__name__}: {exc}"
+        runtime.status = "failed"
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    # Load in the background so the server binds immediately and /health and
+    # /ready can answer while the index and models come up.
+    startup = asyncio.create_task(_start())
+    try:
+        yield
+    finally:
+        startup.cancel()
+        # Returns once an in-flight load or warmup thread has finished.
+        await asyncio.gather(startup, return_exceptions=True)
+        service, runtime.service = runtime.service, None
+        runtime.status = "loading"
+        if service is not None:
+            await asyncio.to_thread(service.close)
+
+
 app = FastAPI(
     title="GroundTruth Intelligent Customer Experience Agent",
     version="0.1.0",
     description="RAG-powered backend for hyper-personalized customer recommendations.",
+    lifespan=lifespan,
 )
 
-settings = get_settings()
-service = RecommendationService(settings=settings)
-
 
 @app.get("/health")
-async def health() -> dict[str, str]:
-    return {"status": "ok"}
+async def health() -> JSONResponse:
+    """Liveness: fails only when startup has failed, not while still loading."""
+
+    status_code = 500 if runtime.status == "failed" else 200
+    return JSONResponse({"status": "ok" if status_code == 200 else "failed"}, status_code=status_code)
 
 
-@app.post("/recommend", response_model=RecommendationResponse)
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    """Readiness: passes once every component is loaded and warmed up."""
+
+    if runtime.status == "ready":
+        return JSONResponse({"status": "ready", "load_ms": runtime.load_ms})
+    body: Dict[str, Any] = {"status": runtime.status}
+    if runtime.error:
+        body["error"] = runtime.error
+    return JSONResponse(body, status_code=503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Prometheus text exposition of stage latencies and pipeline counters."""
+
+    service = runtime.service
+    return PlainTextResponse(
+        service.metrics.render() if service is not None else "",
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@app.post(
+    "/recommend",
+    response_model=RecommendationResponse,
+    response_model_exclude_none=True,
+)
 async def recommend(payload: RecommendationRequest) -> RecommendationResponse:
+    service = _service()
     try:
-        return service.recommend(payload)
+        return await service.arecommend(payload, debug=payload.debug)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except asyncio.TimeoutError as exc:
+        raise HTTPException(status_code=504, detail="LLM generation timed out.") from exc
     except Exception as exc:  # pragma: no cover - defensive path
         raise HTTPException(status_code=500, detail="Recommendation failed.") from exc
 
+
+@app.post("/recommend/stream")
+async def recommend_stream(payload: RecommendationRequest) -> StreamingResponse:
+    """Server-Sent Events variant of ``/recommend``.
+
+    Emits ``evidence``, then ``message`` deltas as the LLM writes them, then
+    ``done`` with the validated response, or ``error`` if anything fails.
+    """
+
+    service = _service()
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for name, data in service.astream_recommend(payload, debug=payload.debug):
+                yield _sse(name, data)
+        except Exception as exc:
+            yield _sse("error", _error_payload(exc))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/recommend/batch")
+async def recommend_batch(payload: RecommendationBatchRequest) -> StreamingResponse:
+    """Bulk recommendations streamed back as NDJSON, one line per event.
+
+    Lines arrive in completion order and carry the event's ``index`` in the
+    request, plus either ``response`` or ``error``.
+    """
+
+    service = _service()
+    if len(payload.events) > settings.batch_max_events:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.batch_max_events} events per batch.",
+        )
+
+    invalid: List[Tuple[int, Dict[str, Any]]] = []
+    events: List[RecommendationRequest] = []
+    positions: List[int] = []
+    for index, raw in enumerate(payload.events):
+        try:
+            events.append(RecommendationRequest.model_validate(raw))
+            positions.append(index)
+        except ValidationError as exc:
+            invalid.append((index, {"status": 422, "detail": exc.errors(include_url=False)}))
+
+    async def lines() -> AsyncIterator[str]:
+        for index, error in invalid:
+            yield _ndjson({"index": index, "error": error})
+        async for position, result in service.arecommend_many(events, debug=payload.debug):
+            if isinstance(result, Exception):
+                line = {"index": positions[position], "error": _error_payload(result)}
+            else:
+                line = {
+                    "index": positions[position],
+                    "response": result.model_dump(exclude_none=True),
+                }
+            yield _ndjson(line)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _service() -> RecommendationService:
+    if runtime.status != "ready" or runtime.service is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Service is starting up." if runtime.status == "loading" else "Service unavailable.",
+            headers={"Retry-After": "5"},
+        )
+    return runtime.service
+
+
+def _error_payload(exc: BaseException) -> Dict[str, Any]:
+    if isinstance(exc, ValueError):
+        return {"status": 400, "detail": str(exc)}
+    if isinstance(exc, asyncio.TimeoutError):
+        return {"status": 504, "detail": "LLM generation timed out."}
+    return {"status": 500, "detail": "Recommendation failed."}
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _ndjson(data: Dict[str, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False, default=str) + "\n"
@@ -3,6 +3,7 @@ from __future__ import annotations
 import os
 from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 
 from pydantic import BaseModel, Field
 
@@ -18,8 +19,35 @@ class Settings(BaseModel):
         default_factory=lambda: Path(__file__).resolve().parent.parent / "Dataset",
         description="Directory containing prepared dataset artifacts.",
     )
+    bundle_dir: Path = Field(
+        default=None,
+        description="Prebuilt serving bundle; when present it replaces the individual dataset files.",
+    )
+    bundle_verify_checksums: bool = Field(
+        default=False,
+        description="Hash every bundle file at startup instead of checking sizes and row counts only.",
+    )
     chunks_meta_path: Path = Field(default=None, description="Path to chunks metadata JSONL.")
-    faiss_index_path: Path = Field(default=None, description="Path to FAISS IndexFlatIP file.")
+    chunk_store_dir: Path = Field(
+        default=None,
+        description="Memory-mapped chunk store directory; used instead of the JSONL when present.",
+    )
+    order_history_dir: Path = Field(
+        default=None,
+        description="Memory-mapped order history directory; used instead of the CSV when present.",
+    )
+    faiss_index_path: Path = Field(
+        default=None,
+        description="Path to the FAISS index file (flat, IVF-Flat, IVF-PQ or HNSW).",
+    )
+    faiss_nprobe: int = Field(
+        default=16,
+        description="IVF lists probed per query; higher improves recall at the cost of latency.",
+    )
+    faiss_ef_search: int = Field(
+        default=64,
+        description="HNSW candidate list size per query; higher improves recall at the cost of latency.",
+    )
     embedding_model_name: str = Field(
         default="sentence-transformers/all-MiniLM-L6-v2",
         description="SentenceTransformer model used for query embeddings.",
@@ -28,9 +56,147 @@ class Settings(BaseModel):
         default="cross-encoder/ms-marco-MiniLM-L-6-v2",
         description="Cross-encoder model used for reranking evidence.",
     )
+    encoder_backend: str = Field(
+        default="torch",
+        description="Query encoder runtime: torch, torch_int8, onnx or onnx_int8.",
+    )
+    cross_encoder_backend: str = Field(
+        default="torch",
+        description="Cross-encoder runtime: torch, torch_int8, onnx or onnx_int8.",
+    )
+    model_export_dir: Path = Field(
+        default=None,
+        description="ONNX exports written by Scripts/export_models.py.",
+    )
+    onnx_quantization: str = Field(
+        default="avx2",
+        description="int8 config of the onnx_int8 graphs to load: arm64, avx2, avx512 or avx512_vnni.",
+    )
+    embedding_batch_max_size: int = Field(
+        default=16,
+        description="Max queries encoded together by the retriever micro-batcher (1 disables).",
+    )
+    embedding_batch_max_wait_ms: float = Field(
+        default=2.0,
+        description="Max time the retriever micro-batcher waits to fill a batch.",
+    )
+    query_cache_size: int = Field(
+        default=4096,
+        description="Max query embeddings kept in the LRU cache (0 disables).",
+    )
+    query_cache_ttl_s: float = Field(
+        default=3600.0,
+        description="Seconds a cached query embedding stays valid (0 means no expiry).",
+    )
+    query_cache_grid_deg: float = Field(
+        default=0.005,
+        description="Grid size in degrees used to snap coordinates in cache keys.",
+    )
+    query_cache_path: Optional[Path] = Field(
+        default=None,
+        description="Optional .npz file used to persist the query cache across restarts.",
+    )
+    response_cache_size: int = Field(
+        default=2048,
+        description="Max LLM responses kept in the semantic response cache (0 disables).",
+    )
+    response_cache_ttl_s: float = Field(
+        default=900.0,
+        description="Seconds a cached LLM response may be reused (0 means no expiry).",
+    )
+    response_cache_threshold: float = Field(
+        default=0.92,
+        description="Min cosine similarity between messages to reuse a cached response.",
+    )
+    rerank_cache_size: int = Field(
+        default=100_000,
+        description="Max cross-encoder scores kept per (query signature, chunk) in the LRU cache (0 disables).",
+    )
+    rerank_cache_path: Optional[Path] = Field(
+        default=None,
+        description="Optional .npz file used to persist rerank pair scores across restarts.",
+    )
+    rerank_batch_max_pairs: int = Field(
+        default=64,
+        description="Max (query, chunk) pairs merged into one cross-encoder batch (1 disables).",
+    )
+    rerank_batch_max_wait_ms: float = Field(
+        default=3.0,
+        description="Max time the cross-encoder batcher waits to merge concurrent requests.",
+    )
+    rerank_bucket_size: int = Field(
+        default=16,
+        description="Pairs per length-bucketed cross-encoder forward pass.",
+    )
     retrieval_k: int = Field(default=50, description="Number of initial FAISS hits.")
+    partitioned_retrieval: bool = Field(
+        default=False,
+        description="Retrieve per store/customer/global partition instead of one global top-k.",
+    )
+    hybrid_retrieval: bool = Field(
+        default=False,
+        description=(
+            "Fuse BM25 hits over chunk text with the FAISS hits by reciprocal rank. Fused hits keep the "
+            "fused order but take the dense score at the same position, so rerank_margin and the store "
+            "boosts keep their cosine calibration."
+        ),
+    )
+    sparse_k: int = Field(default=50, description="BM25 hits fused with the dense hits.")
+    rrf_k: int = Field(default=60, description="Reciprocal-rank fusion constant (larger flattens rank weights).")
+    sparse_index_dir: Path = Field(
+        default=None,
+        description="Prebuilt BM25 postings (Scripts/convert_sparse_index.py); built from the chunk store when absent.",
+    )
+    store_partition_k: int = Field(default=10, description="Hits taken from the detected store's chunks.")
+    customer_partition_k: int = Field(default=10, description="Hits taken from the customer's own chunks.")
+    global_partition_k: int = Field(default=10, description="Hits taken from the whole corpus.")
+    partition_exact_threshold: int = Field(
+        default=4096,
+        description="Partitions up to this size are scored exactly instead of via an ID selector.",
+    )
+    summary_recent_orders: int = Field(
+        default=5,
+        description="Most recent orders kept per customer for the precomputed summaries.",
+    )
+    prompt_popular_items: int = Field(
+        default=3,
+        description="Best-selling items of the detected store listed in the prompt (0 disables).",
+    )
     rerank_k: int = Field(default=12, description="Number of hits to rerank.")
+    rerank_policy: str = Field(
+        default="always",
+        description="'always' cross-encodes the top rerank_k; 'adaptive' applies the margin/cascade/budget rules.",
+    )
+    rerank_margin: float = Field(
+        default=0.08,
+        description=(
+            "Adaptive: skip the cross-encoder when the last kept FAISS score leads the next by this much. "
+            "Tuned on cosine scores; in hybrid mode it applies to the dense scores remapped onto the fused order."
+        ),
+    )
+    rerank_cascade_k: int = Field(
+        default=0,
+        description="Adaptive: candidates kept by the lexical first stage before the cross-encoder (0 disables).",
+    )
+    rerank_budget_ms: float = Field(
+        default=0.0,
+        description="Adaptive: cross-encoder time allowed per request, at the observed per-pair cost (0 disables).",
+    )
+    rerank_shadow_rate: float = Field(
+        default=0.0,
+        description="Adaptive: fraction of shortcut requests also fully reranked to measure evidence overlap.",
+    )
     evidence_top_k: int = Field(default=4, description="Final pieces of evidence to keep.")
+    pinned_evidence: bool = Field(
+        default=False,
+        description=(
+            "Inject the detected store's and the customer's own chunks by exact id; dense "
+            "search only fills the remaining evidence slots, so retrieval_k/rerank_k can shrink."
+        ),
+    )
+    pinned_store_k: int = Field(default=1, description="Pinned chunks of the detected store (stores.csv row first).")
+    pinned_profile_k: int = Field(default=1, description="Pinned customer profile chunks.")
+    pinned_orders_k: int = Field(default=1, description="Pinned chunks of the customer's newest orders.")
     max_prompt_tokens: int = Field(default=1800, description="Max prompt budget for evidence text.")
     gemini_model: str = Field(
         default="gemini-2.5-flash",
@@ -40,14 +206,101 @@ class Settings(BaseModel):
         default_factory=lambda: os.getenv("GEMINI_API_KEY", ""),
         description="Gemini API key sourced from environment.",
     )
+    llm_backend: str = Field(
+        default="gemini",
+        description="LLM backend: 'gemini', or 'stub' for the deterministic offline client.",
+    )
+    stub_llm_latency_ms: float = Field(
+        default=0.0,
+        description="Simulated latency per call of the stub LLM backend.",
+    )
+    llm_max_concurrency: int = Field(
+        default=16,
+        description="Max LLM calls in flight per worker; extra calls wait for a slot.",
+    )
+    llm_max_retries: int = Field(
+        default=2,
+        description="Retries after a failed LLM call, within the request deadline.",
+    )
+    llm_retry_backoff_ms: float = Field(
+        default=200.0,
+        description="Base of the jittered exponential backoff between LLM retries.",
+    )
+    llm_retry_backoff_max_ms: float = Field(
+        default=2000.0,
+        description="Upper bound of a single LLM retry backoff.",
+    )
+    llm_hedge_percentile: float = Field(
+        default=0.0,
+        description="Fire a hedged LLM request once a call exceeds this latency percentile (0 disables).",
+    )
+    llm_hedge_min_samples: int = Field(
+        default=20,
+        description="Completed LLM calls observed before hedging kicks in.",
+    )
+    geo_nearest_k: int = Field(default=3, description="Nearest open stores resolved per event.")
+    geo_max_distance_m: float = Field(
+        default=5000.0,
+        description="Stores farther than this from the customer are ignored.",
+    )
+    geo_resolve_missing_store: bool = Field(
+        default=True,
+        description="Use the nearest open store when the client sends no detected_store_id.",
+    )
+    geo_check_opening_hours: bool = Field(
+        default=False,
+        description="Also require the event time to fall within store opening hours.",
+    )
+    batch_block_size: int = Field(
+        default=64,
+        description="Events prepared together (one encode, search and rerank pass) in batch requests.",
+    )
+    batch_llm_concurrency: int = Field(
+        default=8,
+        description="LLM calls a single batch request may have in flight.",
+    )
+    batch_max_events: int = Field(
+        default=5000,
+        description="Largest number of events accepted by /recommend/batch.",
+    )
     pii_mask_token: str = Field(default="[REDACTED]", description="Token used to mask PII.")
+    max_concurrent_requests: int = Field(
+        default=32,
+        description="Maximum recommendations processed concurrently per worker.",
+    )
+    cpu_executor_workers: int = Field(
+        default=4,
+        description="Thread pool size for CPU-bound stages (encoder, FAISS, reranker).",
+    )
+    startup_load_workers: int = Field(
+        default=4,
+        description="Threads used to load the index, models and datasets concurrently at startup.",
+    )
+    warmup_rounds: int = Field(
+        default=2,
+        description="Synthetic pipeline runs before the service reports ready (0 skips warmup).",
+    )
+    llm_timeout_s: float = Field(
+        default=30.0,
+        description="Deadline in seconds for an LLM call, covering retries and hedges.",
+    )
 
     class Config:
         arbitrary_types_allowed = True
 
     def model_post_init(self, __context: dict[str, object]) -> None:
+        if self.model_export_dir is None:
+            self.model_export_dir = self.data_dir / "models"
+        if self.bundle_dir is None:
+            self.bundle_dir = self.data_dir / "bundle"
         if self.chunks_meta_path is None:
             self.chunks_meta_path = self.data_dir / "chunks_meta.jsonl"
+        if self.chunk_store_dir is None:
+            self.chunk_store_dir = self.data_dir / "chunk_store"
+        if self.sparse_index_dir is None:
+            self.sparse_index_dir = self.data_dir / "sparse_index"
+        if self.order_history_dir is None:
+            self.order_history_dir = self.data_dir / "order_history"
         if self.faiss_index_path is None:
             self.faiss_index_path = self.data_dir / "faiss_index.index"
 
@@ -2,20 +2,31 @@
 
 from .events import (
     LiveEvent,
+    RecommendationBatchRequest,
     RecommendationRequest,
     RecommendationResponse,
 )
-from .evidence import ChunkRecord, RetrievedChunk, EvidencePayload, EvidenceSelection
+from .evidence import (
+    ChunkRecord,
+    RetrievedChunk,
+    EvidencePayload,
+    EvidenceSelection,
+    RetrievalPartition,
+)
+from .geo import NearbyStore
 from .summary import CustomerSummary
 
 __all__ = [
     "LiveEvent",
     "RecommendationRequest",
+    "RecommendationBatchRequest",
     "RecommendationResponse",
     "ChunkRecord",
     "RetrievedChunk",
     "EvidencePayload",
     "EvidenceSelection",
+    "RetrievalPartition",
     "CustomerSummary",
+    "NearbyStore",
 ]
 
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field, validator
 
@@ -33,6 +33,25 @@ class LiveEvent(BaseModel):
 class RecommendationRequest(LiveEvent):
     """Request model used by the FastAPI endpoint (inherits LiveEvent)."""
 
+    debug: bool = Field(
+        default=False,
+        description="Include the per-stage latency breakdown in the response.",
+    )
+
+
+class RecommendationBatchRequest(BaseModel):
+    """Bulk request for ``/recommend/batch``.
+
+    Events are validated one by one so a malformed event becomes a per-item
+    error instead of rejecting the whole batch.
+    """
+
+    events: List[Dict[str, Any]] = Field(..., description="Events shaped like RecommendationRequest.")
+    debug: bool = Field(
+        default=False,
+        description="Include the per-stage latency breakdown in every response.",
+    )
+
 
 class RecommendationResponse(BaseModel):
     """Structured JSON response returned to the client."""
@@ -41,4 +60,12 @@ class RecommendationResponse(BaseModel):
     reason: str
     sources: list[str]
     latency_ms: int = Field(..., description="End-to-end latency in milliseconds.")
+    cached: bool = Field(
+        default=False,
+        description="True when served from the semantic response cache.",
+    )
+    timings_ms: Optional[Dict[str, float]] = Field(
+        default=None,
+        description="Per-stage latency in milliseconds; only set for debug requests.",
+    )
 
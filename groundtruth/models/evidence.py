@@ -30,6 +30,7 @@ class EvidencePayload:
     text: str
     meta: Dict[str, Any]
     score: float
+    pinned: bool = False
 
 
 @dataclass(slots=True)
@@ -39,4 +40,21 @@ class EvidenceSelection:
     items: List[EvidencePayload]
     truncated: bool = False
     notes: Optional[str] = None
+    rerank_path: Optional[str] = None
 
+
+@dataclass(slots=True)
+class RetrievalPartition:
+    """Slice of the corpus to search, restricted by chunk metadata.
+
+    A partition without any metadata constraint searches the whole index.
+    """
+
+    top_k: int
+    source: Optional[str] = None
+    store_id: Optional[int] = None
+    customer_id: Optional[int] = None
+
+    @property
+    def is_global(self) -> bool:
+        return self.source is None and self.store_id is None and self.customer_id is None
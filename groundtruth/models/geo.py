@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class NearbyStore:
+    """Store resolved from the customer's coordinates."""
+
+    store_id: int
+    name: str
+    distance_m: float
@@ -1,28 +1,69 @@
 """Service layer that powers the GroundTruth RAG backend."""
 
 from .chunk_store import ChunkStore
+from .mapped_chunk_store import MappedChunkStore, open_chunk_store, write_mapped_chunk_store
+from .order_history import OrderHistoryStore, open_order_history, write_order_history
 from .customer_summary import CustomerSummaryService
+from .serving_bundle import BundleMismatchError, ServingBundle, build_serving_bundle, open_serving_bundle
 from .query_builder import QueryBuilder
 from .retriever import FaissRetriever
+from .sparse_index import BM25Index, open_bm25_index, reciprocal_rank_fusion, write_bm25_index
+from .store_locator import StoreLocator
 from .store_priority import StorePriorityBooster
+from .pinned_evidence import PinnedEvidence
 from .reranker import CrossEncoderReranker
+from .rerank_cache import RerankScoreCache
+from .adaptive_rerank import AdaptiveReranker, RerankDecision
 from .evidence_selector import EvidenceSelector
 from .prompt_builder import PromptBuilder
-from .llm_client import GeminiClient
+from .llm_client import GeminiClient, LLMBackend, StubLLMClient
+from .resilient_llm import ResilientLLMClient
+from .response_cache import SemanticResponseCache
+from .stream_parser import IncrementalJSONParser
 from .response_validator import ResponseValidator
+from .instrumentation import StageTimings, collect_timings, stage
+from .metrics import MetricsRegistry
 from .recommendation_service import RecommendationService
 
 __all__ = [
     "ChunkStore",
+    "MappedChunkStore",
+    "open_chunk_store",
+    "write_mapped_chunk_store",
+    "OrderHistoryStore",
+    "open_order_history",
+    "write_order_history",
     "CustomerSummaryService",
+    "ServingBundle",
+    "BundleMismatchError",
+    "build_serving_bundle",
+    "open_serving_bundle",
     "QueryBuilder",
     "FaissRetriever",
+    "BM25Index",
+    "open_bm25_index",
+    "write_bm25_index",
+    "reciprocal_rank_fusion",
+    "StoreLocator",
     "StorePriorityBooster",
+    "PinnedEvidence",
     "CrossEncoderReranker",
+    "RerankScoreCache",
+    "AdaptiveReranker",
+    "RerankDecision",
     "EvidenceSelector",
     "PromptBuilder",
     "GeminiClient",
+    "StubLLMClient",
+    "LLMBackend",
+    "ResilientLLMClient",
+    "SemanticResponseCache",
+    "IncrementalJSONParser",
     "ResponseValidator",
     "RecommendationService",
+    "StageTimings",
+    "MetricsRegistry",
+    "collect_timings",
+    "stage",
 ]
 
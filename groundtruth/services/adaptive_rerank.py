@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import logging
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..models import RetrievedChunk
+from .reranker import CrossEncoderReranker
+
+logger = logging.getLogger(__name__)
+
+RERANK_POLICIES = ("always", "adaptive")
+RERANK_PATHS = ("full", "margin_skip", "cascade", "budget_trim", "budget_skip")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Budget skips never measure the cross-encoder, so every Nth one scores
+# anyway to keep the per-pair cost estimate current.
+_BUDGET_PROBE_EVERY = 32
+# Shadow checks queued beyond this are dropped rather than piling up.
+_SHADOW_MAX_PENDING = 64
+
+
+@dataclass(slots=True)
+class RerankDecision:
+    """How one request was reranked.
+
+    ``pairs`` is what the path planned to rerank out of ``full_pairs``;
+    ``model_pairs`` is the part of it that missed the score cache and
+    actually reached the cross-encoder.
+    """
+
+    path: str
+    pairs: int
+    full_pairs: int
+    model_pairs: int = 0
+
+
+class AdaptiveReranker:
+    """Spends cross-encoder compute only where it can change the evidence.
+
+    With the ``always`` policy every request reranks its top ``top_k``
+    candidates, as before. The ``adaptive`` policy applies, in order:
+
+    * **margin**: when the boosted FAISS score of the last kept candidate
+      (position ``keep_k``) beats the next one by at least ``margin``, the
+      evidence set is already clear and the cross-encoder is skipped;
+    * **cascade**: a cheap lexical first stage (query-term coverage plus the
+      FAISS score) trims the list to ``cascade_k`` before the cross-encoder;
+    * **budget**: pairs are capped to what fits in ``budget_ms`` at the
+      cross-encoder's measured per-pair model cost
+      (``CrossEncoderReranker.pair_cost_ms``); if not even ``keep_k`` pairs
+      fit, the FAISS order is used.
+
+    ``keep_k`` is the number of evidence slots the reranked list fills; a
+    request can pass its own (e.g. the slots left after pinned evidence) to
+    ``rerank`` / ``rerank_many``, and every rule above then uses it.
+
+    Every request's path is counted in ``stats()``, and its planned pairs as
+    scored by the model, served from the score cache or skipped. With
+    ``shadow_rate`` set, that fraction of non-full requests also runs the full rerank and records
+    how much of its top ``keep_k`` the cheaper path kept. Shadows run on a
+    background thread, one scoring pass per ``rerank``/``rerank_many`` call,
+    so they never add to request latency; ``close`` waits for them. They
+    bypass the score cache, so they never turn later requests' pairs into
+    cache hits, and their model pairs are reported as ``pairs_shadow``,
+    outside ``pairs_saved_ratio``.
+    """
+
+    def __init__(
+        self,
+        reranker: CrossEncoderReranker,
+        policy: str = "always",
+        keep_k: int = 4,
+        margin: float = 0.0,
+        cascade_k: int = 0,
+        budget_ms: float = 0.0,
+        lexical_weight: float = 0.1,
+        shadow_rate: float = 0.0,
+    ):
+        if policy not in RERANK_POLICIES:
+            raise ValueError(f"Unknown rerank policy '{policy}'. Expected one of {RERANK_POLICIES}.")
+        self._reranker = reranker
+        self._policy = policy
+        self._keep_k = max(keep_k, 1)
+        self._margin = margin
+        self._cascade_k = cascade_k
+        self._budget_ms = budget_ms
+        self._lexical_weight = lexical_weight
+        self._shadow_rate = shadow_rate
+        self._budget_skips = 0
+        self._lock = threading.Lock()
+        self._paths: Dict[str, int] = {path: 0 for path in RERANK_PATHS}
+        self._pairs_scored = 0
+        self._pairs_cached = 0
+        self._pairs_skipped = 0
+        self._shadow_runs = 0
+        self._shadow_overlap = 0.0
+        self._shadow_pairs = 0
+        self._shadow_pending = 0
+        self._shadow_dropped = 0
+        self._shadow_executor: Optional[ThreadPoolExecutor] = None
+        if shadow_rate > 0:
+            self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank-shadow")
+
+    def rerank(
+        self,
+        query: str,
+        candidates: List[RetrievedChunk],
+        top_k: int,
+        cache_key: Optional[str] = None,
+        keep_k: Optional[int] = None,
+    ) -> Tuple[List[RetrievedChunk], RerankDecision]:
+        keep = self._keep(keep_k)
+        plan, decision = self._plan(query, candidates, top_k, keep)
+        if plan is None:
+            result = candidates[:top_k]
+        else:
+            result, decision.model_pairs = self._reranker.rerank_counted(
+                query, plan, len(plan), cache_key=cache_key
+            )
+        self._record(decision)
+        if self._sample_shadow(decision):
+            self._submit_shadow([query], [candidates], top_k, [result], [cache_key], [keep])
+        return result, decision
+
+    def rerank_many(
+        self,
+        queries: Sequence[str],
+        candidates: Sequence[List[RetrievedChunk]],
+        top_k: int,
+        cache_keys: Optional[Sequence[Optional[str]]] = None,
+        keep_ks: Optional[Sequence[Optional[int]]] = None,
+    ) -> Tuple[List[List[RetrievedChunk]], List[RerankDecision]]:
+        """``rerank`` for a block; the cross-encoder runs once for all planned pairs."""
+
+        keys = cache_keys if cache_keys is not None else [None] * len(queries)
+        keep_ks = keep_ks if keep_ks is not None else [None] * len(queries)
+        keeps = [self._keep(keep_k) for keep_k in keep_ks]
+        plans = [
+            self._plan(query, chunks, top_k, keep)
+            for query, chunks, keep in zip(queries, candidates, keeps)
+        ]
+        scored = [pos for pos, (plan, _) in enumerate(plans) if plan is not None]
+        results: List[List[RetrievedChunk]] = [chunks[:top_k] for chunks in candidates]
+        if scored:
+            reranked, model_pairs = self._reranker.rerank_many_counted(
+                [queries[pos] for pos in scored],
+                [plans[pos][0] for pos in scored],
+                max(len(plans[pos][0]) for pos in scored),
+                cache_keys=[keys[pos] for pos in scored],
+            )
+            for pos, chunks, sent in zip(scored, reranked, model_pairs):
+                results[pos] = chunks
+                plans[pos][1].model_pairs = sent
+        decisions = [decision for _, decision in plans]
+        for decision in decisions:
+            self._record(decision)
+        shadows = [pos for pos, decision in enumerate(decisions) if self._sample_shadow(decision)]
+        if shadows:
+            self._submit_shadow(
+                [queries[pos] for pos in shadows],
+                [candidates[pos] for pos in shadows],
+                top_k,
+                [results[pos] for pos in shadows],
+                [keys[pos] for pos in shadows],
+                [keeps[pos] for pos in shadows],
+            )
+        return results, decisions
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats: Dict[str, float] = {f"path_{path}": count for path, count in self._paths.items()}
+            stats["pairs_scored"] = self._pairs_scored
+            stats["pairs_cached"] = self._pairs_cached
+            stats["pairs_skipped"] = self._pairs_skipped
+            saved = self._pairs_cached + self._pairs_skipped
+            total = self._pairs_scored + saved
+            stats["pairs_saved_ratio"] = saved / total if total else 0.0
+            stats["pairs_shadow"] = self._shadow_pairs
+            stats["pair_cost_ms"] = self._reranker.pair_cost_ms or 0.0
+            stats["shadow_runs"] = self._shadow_runs
+            stats["shadow_overlap"] = (
+                self._shadow_overlap / self._shadow_runs if self._shadow_runs else 0.0
+            )
+            stats["shadow_dropped"] = self._shadow_dropped
+        return stats
+
+    def reset_stats(self) -> None:
+        """Zero the path, pair and shadow counters; the cost estimate is kept."""
+
+        if self._shadow_executor is not None:
+            # One worker: once this no-op runs, earlier shadow checks have finished.
+            self._shadow_executor.submit(lambda: None).result()
+        with self._lock:
+            self._paths = {path: 0 for path in RERANK_PATHS}
+            self._pairs_scored = 0
+            self._pairs_cached = 0
+            self._pairs_skipped = 0
+            self._shadow_runs = 0
+            self._shadow_overlap = 0.0
+            self._shadow_pairs = 0
+            self._shadow_dropped = 0
+
+    def close(self) -> None:
+        """Wait for queued shadow checks; call before closing the cross-encoder."""
+
+        if self._shadow_executor is not None:
+            self._shadow_executor.shutdown(wait=True)
+
+    def _keep(self, keep_k: Optional[int]) -> int:
+        return max(keep_k, 1) if keep_k is not None else self._keep_k
+
+    def _plan(
+        self, query: str, candidates: List[RetrievedChunk], top_k: int, keep_k: int
+    ) -> Tuple[Optional[List[RetrievedChunk]], RerankDecision]:
+        """Candidates to send to the cross-encoder (``None`` to skip) and the decision."""
+
+        pool = candidates[: min(top_k, len(candidates))]
+        full = len(pool)
+        if self._policy == "always" or full == 0:
+            return pool, RerankDecision("full", full, full)
+
+        keep = min(keep_k, full)
+        if self._margin > 0 and full > keep:
+            # Candidates arrive sorted by boosted score.
+            if candidates[keep - 1].score - candidates[keep].score >= self._margin:
+                return None, RerankDecision("margin_skip", 0, full)
+
+        path = "full"
+        if 0 < self._cascade_k < full:
+            pool = self._first_stage(query, pool)[: max(self._cascade_k, keep)]
+            path = "cascade"
+
+        pair_ms = self._reranker.pair_cost_ms
+        if self._budget_ms > 0 and pair_ms:
+            affordable = int(self._budget_ms / pair_ms)
+            if affordable < keep:
+                with self._lock:
+                    self._budget_skips += 1
+                    probe = self._budget_skips % _BUDGET_PROBE_EVERY == 0
+                if not probe:
+                    return None, RerankDecision("budget_skip", 0, full)
+                affordable = keep
+            if affordable < len(pool):
+                pool = pool[:affordable]
+                path = "budget_trim"
+        return pool, RerankDecision(path, len(pool), full)
+
+    def _first_stage(self, query: str, candidates: List[RetrievedChunk]) -> List[RetrievedChunk]:
+        terms = set(_TOKEN.findall(query.lower()))
+        if not terms:
+            return list(candidates)
+        scores = [
+            candidate.score
+            + self._lexical_weight * len(terms & set(_TOKEN.findall(candidate.chunk.text.lower()))) / len(terms)
+            for candidate in candidates
+        ]
+        order = np.argsort(-np.asarray(scores), kind="stable")
+        return [candidates[pos] for pos in order]
+
+    def _record(self, decision: RerankDecision) -> None:
+        with self._lock:
+            self._paths[decision.path] += 1
+            self._pairs_scored += decision.model_pairs
+            self._pairs_cached += decision.pairs - decision.model_pairs
+            self._pairs_skipped += decision.full_pairs - decision.pairs
+
+    def _sample_shadow(self, decision: RerankDecision) -> bool:
+        return (
+            self._shadow_executor is not None
+            and decision.path != "full"
+            and random.random() < self._shadow_rate
+        )
+
+    def _submit_shadow(
+        self,
+        queries: List[str],
+        candidates: List[List[RetrievedChunk]],
+        top_k: int,
+        results: List[List[RetrievedChunk]],
+        cache_keys: List[Optional[str]],
+        keeps: List[int],
+    ) -> None:
+        with self._lock:
+            if self._shadow_pending >= _SHADOW_MAX_PENDING:
+                self._shadow_dropped += len(queries)
+                return
+            self._shadow_pending += 1
+        try:
+            self._shadow_executor.submit(
+                self._shadow, queries, candidates, top_k, results, cache_keys, keeps
+            )
+        except RuntimeError:  # closed while the request was in flight
+            with self._lock:
+                self._shadow_pending -= 1
+                self._shadow_dropped += len(queries)
+
+    def _shadow(
+        self,
+        queries: List[str],
+        candidates: List[List[RetrievedChunk]],
+        top_k: int,
+        results: List[List[RetrievedChunk]],
+        cache_keys: List[Optional[str]],
+        keeps: List[int],
+    ) -> None:
+        try:
+            references, model_pairs = self._reranker.rerank_many_counted(
+                queries, candidates, top_k, cache_keys=cache_keys, use_cache=False
+            )
+            overlaps = []
+            for result, reference, keep in zip(results, references, keeps):
+                reference = reference[:keep]
+                kept = {chunk.chunk.chunk_id for chunk in result[:keep]}
+                overlaps.append(
+                    len(kept & {chunk.chunk.chunk_id for chunk in reference}) / max(len(reference), 1)
+                )
+            with self._lock:
+                self._shadow_runs += len(overlaps)
+                self._shadow_overlap += sum(overlaps)
+                self._shadow_pairs += sum(model_pairs)
+        except Exception:
+            logger.exception("Shadow rerank failed")
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from .instrumentation import StageTimings, active_timings, collect_timings
+
+I = TypeVar("I")
+O = TypeVar("O")
+
+_Pending = Tuple[I, "Future[O]", float, Tuple[StageTimings, ...]]
+
+
+@dataclass(slots=True)
+class BatchStats:
+    """Running counters describing how well a batcher is filling its batches."""
+
+    batches: int = 0
+    items: int = 0
+    weight: int = 0
+    capacity: int = 0
+    queue_wait_s: float = 0.0
+    max_queue_wait_s: float = 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "weight": self.weight,
+            "mean_items_per_batch": self.items / self.batches if self.batches else 0.0,
+            "mean_occupancy": self.weight / self.capacity if self.capacity else 0.0,
+            "mean_queue_wait_ms": (
+                self.queue_wait_s * 1000.0 / self.items if self.items else 0.0
+            ),
+            "max_queue_wait_ms": self.max_queue_wait_s * 1000.0,
+        }
+
+
+class MicroBatcher(Generic[I, O]):
+    """Coalesces concurrent submissions into batches handled on a worker thread.
+
+    Callers block on ``submit(item).result()``. The worker waits at most
+    ``max_wait_ms`` after the first queued item (or until the queued items
+    reach ``max_batch_size``), then hands the whole batch to ``handler`` and
+    fans the results back out to the waiting futures in submission order.
+
+    ``weight`` measures an item's share of the batch budget; it defaults to one
+    per item, and callers submitting variable sized work (e.g. lists of
+    reranking pairs) can count the underlying units instead.
+
+    Stage timings active in the submitting context are carried over, so the
+    handler's stages are attributed to every request in the batch.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[I]], List[O]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        name: str = "micro-batcher",
+        weight: Optional[Callable[[I], int]] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        self._handler = handler
+        self._max_batch_size = max_batch_size
+        self._max_wait_s = max(max_wait_ms, 0.0) / 1000.0
+        self._weight = weight or (lambda _item: 1)
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._closed = False
+        self._stats = BatchStats()
+        self._stats_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item: I) -> "Future[O]":
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed.")
+        future: "Future[O]" = Future()
+        self._queue.put((item, future, time.perf_counter(), active_timings()))
+        return future
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return self._stats.snapshot()
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._stats = BatchStats()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch: List[_Pending] = [first]
+            batch_weight = self._weight(first[0])
+            deadline = time.perf_counter() + self._max_wait_s
+            stop = False
+            while batch_weight < self._max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    pending = (
+                        self._queue.get(timeout=remaining)
+                        if remaining > 0
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+                if pending is None:
+                    stop = True
+                    break
+                batch.append(pending)
+                batch_weight += self._weight(pending[0])
+
+            self._record(batch, batch_weight)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _record(self, batch: List[_Pending], batch_weight: int) -> None:
+        now = time.perf_counter()
+        waits = [now - enqueued_at for _, _, enqueued_at, _ in batch]
+        with self._stats_lock:
+            self._stats.batches += 1
+            self._stats.items += len(batch)
+            self._stats.weight += batch_weight
+            self._stats.capacity += max(self._max_batch_size, batch_weight)
+            self._stats.queue_wait_s += sum(waits)
+            self._stats.max_queue_wait_s = max(self._stats.max_queue_wait_s, max(waits))
+
+    def _dispatch(self, batch: List[_Pending]) -> None:
+        timings = tuple(collector for *_, collectors in batch for collector in collectors)
+        try:
+            with collect_timings(*timings):
+                results = self._handler([item for item, *_ in batch])
+        except BaseException as exc:  # propagate to every waiting caller
+            for _, future, *_ in batch:
+                future.set_exception(exc)
+            return
+
+        for (_, future, *_), result in zip(batch, results):
+            future.set_result(result)
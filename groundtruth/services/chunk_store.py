@@ -1,14 +1,62 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import re
+import threading
+from collections import defaultdict
 from pathlib import Path
-from typing import Iterable, List
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 import logging
 
+import numpy as np
+
 from ..models import ChunkRecord
 
 logger = logging.getLogger(__name__)
 
+PARTITION_FIELDS = ("source", "store_id", "customer_id")
+
+# PDF chunks only carry a filename; the owning store/customer id lives in it.
+_FILENAME_IDS = (
+    ("store_id", re.compile(r"store_info_(\d+)")),
+    ("customer_id", re.compile(r"customer_profile_(\d+)")),
+)
+
+
+def ids_digest(blob: bytes, lengths: np.ndarray) -> str:
+    """Digest of chunk ids given as their concatenated UTF-8 bytes and byte lengths."""
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(lengths, dtype="<i8").tobytes())
+    digest.update(blob)
+    return digest.hexdigest()
+
+
+def partition_values(meta: Mapping[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """Yield the (field, value) partition keys a chunk belongs to."""
+
+    source = meta.get("source")
+    if source:
+        yield "source", str(source)
+
+    found = set()
+    for field in ("store_id", "customer_id"):
+        value = meta.get(field)
+        if value is not None and value != "":
+            try:
+                yield field, int(value)
+                found.add(field)
+            except (TypeError, ValueError):
+                continue
+
+    filename = meta.get("filename")
+    if filename:
+        for field, pattern in _FILENAME_IDS:
+            match = pattern.search(str(filename))
+            if match and field not in found:
+                yield field, int(match.group(1))
+
 
 class ChunkStore:
     """In-memory store for chunk metadata backed by the prepared JSONL file."""
@@ -16,7 +64,11 @@ class ChunkStore:
     def __init__(self, path: Path):
         self._path = path
         self._chunks: List[ChunkRecord] = []
+        self._partitions: Dict[Tuple[str, Any], np.ndarray] = {}
+        self._id_rows: Optional[Dict[str, int]] = None
+        self._id_rows_lock = threading.Lock()
         self._load()
+        self._index_partitions()
 
     def _load(self) -> None:
         with self._path.open("r", encoding="utf-8") as handle:
@@ -52,6 +104,15 @@ class ChunkStore:
                     )
                     continue
 
+    def _index_partitions(self) -> None:
+        buckets: Dict[Tuple[str, Any], List[int]] = defaultdict(list)
+        for row, chunk in enumerate(self._chunks):
+            for key in partition_values(chunk.meta):
+                buckets[key].append(row)
+        self._partitions = {
+            key: np.asarray(rows, dtype=np.int64) for key, rows in buckets.items()
+        }
+
     @property
     def chunks(self) -> List[ChunkRecord]:
         return self._chunks
@@ -65,3 +126,72 @@ class ChunkStore:
     def iter(self) -> Iterable[ChunkRecord]:
         return iter(self._chunks)
 
+    def text(self, index: int) -> str:
+        return self._chunks[index].text
+
+    def rows_for(
+        self,
+        source: Optional[str] = None,
+        store_id: Optional[int] = None,
+        customer_id: Optional[int] = None,
+    ) -> Optional[np.ndarray]:
+        """Sorted row ids matching every given metadata filter.
+
+        Returns ``None`` when no filter is given, i.e. the whole store matches.
+        """
+
+        filters = [
+            (field, value)
+            for field, value in zip(PARTITION_FIELDS, (source, store_id, customer_id))
+            if value is not None
+        ]
+        if not filters:
+            return None
+
+        rows: Optional[np.ndarray] = None
+        for field, value in filters:
+            matches = self._partition_rows(field, value)
+            if matches.size == 0:
+                return matches
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+        return rows
+
+    def row_of(self, chunk_id: str) -> Optional[int]:
+        """Row holding ``chunk_id``, or ``None`` if the chunk is not in the store.
+
+        Chunk ids are content hashes, so a hit also means the text is unchanged.
+        """
+
+        return self.build_id_index().get(chunk_id)
+
+    def build_id_index(self) -> Dict[str, int]:
+        """Build the chunk id -> row map once; call at load time to keep it off the request path."""
+
+        if self._id_rows is None:
+            with self._id_rows_lock:
+                if self._id_rows is None:
+                    self._id_rows = self._index_ids()
+        return self._id_rows
+
+    def contains_all(self, chunk_ids: Iterable[str]) -> bool:
+        return all(self.row_of(chunk_id) is not None for chunk_id in chunk_ids)
+
+    def chunk_ids_digest(self) -> str:
+        """Digest of the chunk ids in row order.
+
+        Chunk ids are content hashes, so two stores with the same digest hold
+        the same texts in the same rows; row-aligned artifacts built from one
+        (e.g. BM25 postings) are valid for the other.
+        """
+
+        ids = [chunk.chunk_id.encode("utf-8") for chunk in self.iter()]
+        return ids_digest(b"".join(ids), np.array([len(id_) for id_ in ids], dtype=np.int64))
+
+    def _index_ids(self) -> Dict[str, int]:
+        return {chunk.chunk_id: row for row, chunk in enumerate(self.iter())}
+
+    def _partition_rows(self, field: str, value: Any) -> np.ndarray:
+        matches = self._partitions.get((field, value))
+        if matches is None:
+            return np.empty(0, dtype=np.int64)
+        return matches
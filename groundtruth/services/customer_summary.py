@@ -1,13 +1,22 @@
 from __future__ import annotations
 
 import csv
-from collections import Counter, defaultdict
-from dataclasses import dataclass
+import heapq
+import threading
+from collections import Counter
+from dataclasses import dataclass, fields
 from datetime import datetime
+from itertools import count
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
 from ..models import CustomerSummary
+from .order_history import OrderHistoryStore, epoch_seconds, open_order_history
+
+# (epoch seconds, -sequence, item): a min-heap keeps the newest orders on top
+# of its pop order, and the negated sequence ranks earlier rows first among
+# orders with the same timestamp, as the original stable sort did.
+_RecentOrder = Tuple[int, int, str]
 
 
 @dataclass(slots=True)
@@ -22,27 +31,44 @@ class _CustomerRow:
     reward_points: Optional[int]
 
 
-class CustomerSummaryService:
-    """Loads customer data and produces lightweight textual summaries."""
+_CUSTOMER_FIELDS = frozenset(field.name for field in fields(_CustomerRow)) - {"customer_id"}
+
 
-    def __init__(self, data_dir: Path):
+class CustomerSummaryService:
+    """Loads customer data and produces lightweight textual summaries.
+
+    Summaries are precomputed once at load time, so ``summarize`` is a dict
+    lookup. Only the ``recent_orders`` newest orders of each customer are kept
+    (in a bounded heap, seeded from the columnar ``OrderHistoryStore``), and
+    ``append_order`` / ``update_customer`` refresh just the affected
+    customer's summary.
+    """
+
+    def __init__(
+        self,
+        data_dir: Path,
+        recent_orders: int = 5,
+        history: Optional[OrderHistoryStore] = None,
+    ):
         self._customers: Dict[int, _CustomerRow] = {}
-        self._history: Dict[int, List[Dict[str, str]]] = defaultdict(list)
+        self._recent: Dict[int, List[_RecentOrder]] = {}
+        self._summaries: Dict[int, CustomerSummary] = {}
+        self._recent_limit = max(recent_orders, 1)
+        self._lock = threading.Lock()
         self._customers_path = data_dir / "customers.csv"
-        self._history_path = data_dir / "customer_history.csv"
         self._load_customers()
-        self._load_history()
+        if history is None:
+            history = open_order_history(data_dir / "customer_history.csv")
+        self._sequence = count(len(history) + 1)
+        self._load_history(history)
+        for customer_id in self._customers:
+            self._summaries[customer_id] = self._build_summary(customer_id)
 
     def _load_customers(self) -> None:
         with self._customers_path.open("r", encoding="utf-8") as handle:
             reader = csv.DictReader(handle)
             for row in reader:
                 customer_id = int(row["customer_id"])
-                preferred_drinks = [
-                    item.strip()
-                    for item in row.get("preferred_drinks", "").split("|")
-                    if item.strip()
-                ]
                 last_store_id = (
                     int(row["last_visited_store_id"])
                     if row.get("last_visited_store_id")
@@ -54,7 +80,7 @@ class CustomerSummaryService:
                 self._customers[customer_id] = _CustomerRow(
                     customer_id=customer_id,
                     name=row.get("name", ""),
-                    preferred_drinks=preferred_drinks,
+                    preferred_drinks=self._split_drinks(row.get("preferred_drinks", "")),
                     preferred_size=row.get("preferred_size"),
                     allergies=row.get("allergies") or None,
                     usual_order_time=row.get("usual_order_time"),
@@ -62,31 +88,105 @@ class CustomerSummaryService:
                     reward_points=reward_points,
                 )
 
-    def _load_history(self) -> None:
-        with self._history_path.open("r", encoding="utf-8") as handle:
-            reader = csv.DictReader(handle)
-            for row in reader:
-                customer_id = int(row["customer_id"])
-                self._history[customer_id].append(row)
-
-        for rows in self._history.values():
-            rows.sort(
-                key=lambda r: datetime.strptime(
-                    r["timestamp"], "%d-%m-%Y %H:%M"
-                ),
-                reverse=True,
-            )
+    def _load_history(self, history: OrderHistoryStore) -> None:
+        items = history.items
+        total = len(history)
+        for customer_id, codes, timestamps, positions in history.iter_recent(self._recent_limit):
+            # Later store positions hold earlier file rows among equal
+            # timestamps, so they get the smaller sequence numbers.
+            self._recent[customer_id] = heap = [
+                (int(ts), -(total - int(pos)), items[code])
+                for code, ts, pos in zip(codes, timestamps, positions)
+            ]
+            heapq.heapify(heap)
+
+    def __len__(self) -> int:
+        return len(self._customers)
 
     def summarize(self, customer_id: int) -> CustomerSummary:
-        customer = self._customers.get(customer_id)
-        if not customer:
+        summary = self._summaries.get(customer_id)
+        if summary is None:
             return CustomerSummary(
                 customer_id=customer_id,
                 overview="No profile found; rely on live context only.",
             )
+        return summary
+
+    def summarize_many(self, customer_ids: Iterable[int]) -> List[CustomerSummary]:
+        """Summaries in input order; each distinct customer is summarized once."""
+
+        ids = list(customer_ids)
+        unique = {customer_id: self.summarize(customer_id) for customer_id in dict.fromkeys(ids)}
+        return [unique[customer_id] for customer_id in ids]
+
+    def append_order(
+        self,
+        customer_id: int,
+        item: str,
+        timestamp: Union[datetime, str],
+    ) -> CustomerSummary:
+        """Record a new order and refresh that customer's summary.
+
+        Orders older than the customer's retained ``recent_orders`` fall off
+        immediately; only the summary of ``customer_id`` is rebuilt.
+        """
+
+        key = epoch_seconds(timestamp)
+        with self._lock:
+            self._push_order(customer_id, item, key)
+            return self._refresh(customer_id)
+
+    def update_customer(self, customer_id: int, **changes: Any) -> CustomerSummary:
+        """Update profile fields (creating the profile if needed) and refresh its summary.
+
+        ``preferred_drinks`` accepts either a list or the CSV's ``|``-separated form.
+        """
+
+        unknown = set(changes) - _CUSTOMER_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown customer fields: {', '.join(sorted(unknown))}")
+        if isinstance(changes.get("preferred_drinks"), str):
+            changes["preferred_drinks"] = self._split_drinks(changes["preferred_drinks"])
+
+        with self._lock:
+            customer = self._customers.get(customer_id)
+            if customer is None:
+                customer = _CustomerRow(
+                    customer_id=customer_id,
+                    name="",
+                    preferred_drinks=[],
+                    preferred_size=None,
+                    allergies=None,
+                    usual_order_time=None,
+                    last_store_id=None,
+                    reward_points=None,
+                )
+                self._customers[customer_id] = customer
+            for name, value in changes.items():
+                setattr(customer, name, value)
+            return self._refresh(customer_id)
+
+    def _push_order(self, customer_id: int, item: str, key: int) -> None:
+        heap = self._recent.setdefault(customer_id, [])
+        entry = (key, -next(self._sequence), item)
+        if len(heap) < self._recent_limit:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    def _refresh(self, customer_id: int) -> CustomerSummary:
+        summary = self._build_summary(customer_id)
+        if summary is not None:
+            self._summaries[customer_id] = summary
+        return self.summarize(customer_id)
+
+    def _build_summary(self, customer_id: int) -> Optional[CustomerSummary]:
+        customer = self._customers.get(customer_id)
+        if not customer:
+            return None
 
-        history_rows = self._history.get(customer_id, [])[:5]
-        item_counter = Counter(row["item"] for row in history_rows if row.get("item"))
+        recent = sorted(self._recent.get(customer_id, []), reverse=True)
+        item_counter = Counter(item for _, _, item in recent if item)
         top_items = ", ".join(item for item, _ in item_counter.most_common(3))
 
         preferred_items = (
@@ -122,6 +222,10 @@ class CustomerSummaryService:
             reward_points=customer.reward_points,
         )
 
+    @staticmethod
+    def _split_drinks(raw: str) -> List[str]:
+        return [item.strip() for item in raw.split("|") if item.strip()]
+
     @staticmethod
     def _loyalty_tier(points: Optional[int]) -> Optional[str]:
         if points is None:
@@ -133,4 +237,3 @@ class CustomerSummaryService:
         if points >= 400:
             return "Silver"
         return "Bronze"
-
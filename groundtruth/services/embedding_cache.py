@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache with TTL for query embeddings.
+
+    Memory is bounded by ``max_entries`` vectors. Entries carry wall-clock
+    timestamps so the TTL still applies after the cache is persisted with
+    ``save`` and restored with ``load`` across restarts. Vectors depend on
+    the encoder, so ``save`` records ``model_id`` and ``load`` ignores a file
+    written for another model or backend.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_s: float,
+        path: Optional[Path] = None,
+        model_id: str = "",
+    ):
+        self._max_entries = max_entries
+        self._ttl_s = ttl_s
+        self._model_id = model_id
+        self._path = path
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        if path is not None and path.exists():
+            self.load(path)
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            vector, stored_at = entry
+            if self._expired(stored_at):
+                del self._entries[key]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return vector
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (np.asarray(vector, dtype=np.float32), time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+
+    def save(self, path: Optional[Path] = None) -> None:
+        target = path or self._path
+        if target is None:
+            return
+        with self._lock:
+            live = [
+                (key, vector, stored_at)
+                for key, (vector, stored_at) in self._entries.items()
+                if not self._expired(stored_at)
+            ]
+        if not live:
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        keys, vectors, stored = zip(*live)
+        # np.savez appends ".npz" to bare paths, so write through a handle.
+        with target.open("wb") as handle:
+            np.savez(
+                handle,
+                version=np.array(_FORMAT_VERSION),
+                model_id=np.array(self._model_id),
+                keys=np.array(keys, dtype=str),
+                vectors=np.stack(vectors).astype(np.float32),
+                stored_at=np.array(stored, dtype=np.float64),
+            )
+
+    def load(self, path: Path) -> None:
+        try:
+            with np.load(path, allow_pickle=False) as payload:
+                version = int(payload["version"])
+                model_id = str(payload["model_id"])
+                keys = payload["keys"].tolist()
+                vectors = payload["vectors"]
+                stored = payload["stored_at"].tolist()
+        except (OSError, KeyError, ValueError) as exc:
+            logger.warning("Ignoring unreadable embedding cache %s: %s", path, exc)
+            return
+        if version != _FORMAT_VERSION or model_id != self._model_id:
+            logger.info("Ignoring embedding cache %s written for '%s'", path, model_id)
+            return
+
+        with self._lock:
+            for key, vector, stored_at in zip(keys, vectors, stored):
+                if not self._expired(stored_at):
+                    self._entries[key] = (vector, stored_at)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _expired(self, stored_at: float) -> bool:
+        return self._ttl_s > 0 and time.time() - stored_at > self._ttl_s
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Sequence
 
 from ..models import EvidencePayload, EvidenceSelection, RetrievedChunk
 
@@ -12,14 +12,25 @@ class EvidenceSelector:
         self._top_k = top_k
         self._max_chars = max_chars
 
-    def select(self, candidates: List[RetrievedChunk]) -> EvidenceSelection:
+    def select(
+        self,
+        candidates: List[RetrievedChunk],
+        pinned: Sequence[RetrievedChunk] = (),
+    ) -> EvidenceSelection:
+        """Keep ``pinned`` chunks first, then fill the remaining slots from ``candidates``."""
+
         selected: List[EvidencePayload] = []
+        seen = set()
         char_budget = 0
         truncated = False
 
-        for candidate in candidates:
+        ordered = [(candidate, True) for candidate in pinned]
+        ordered.extend((candidate, False) for candidate in candidates)
+        for candidate, is_pinned in ordered:
             if len(selected) >= self._top_k:
                 break
+            if candidate.chunk.chunk_id in seen:
+                continue
             text = candidate.chunk.text.strip()
             potential_budget = char_budget + len(text)
             if potential_budget > self._max_chars:
@@ -32,8 +43,10 @@ class EvidenceSelector:
                     text=text,
                     meta=candidate.chunk.meta,
                     score=candidate.score,
+                    pinned=is_pinned,
                 )
             )
+            seen.add(candidate.chunk.chunk_id)
             char_budget = potential_budget
 
         notes = None
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# FAISS warns below ~39 training points per centroid.
+_MIN_POINTS_PER_CENTROID = 39
+
+
+def build_index(
+    embeddings: np.ndarray,
+    index_type: str = "flat",
+    nlist: int = 1024,
+    pq_m: int = 16,
+    pq_nbits: int = 8,
+    hnsw_m: int = 32,
+    ef_construction: int = 200,
+    train_sample: int = 100_000,
+    add_batch_size: int = 65_536,
+    seed: int = 0,
+) -> faiss.Index:
+    """Build an inner-product index over L2-normalized ``embeddings``.
+
+    ``flat`` is the exhaustive baseline. ``ivf_flat`` and ``ivf_pq`` are
+    trained on a random sample of at most ``train_sample`` vectors; ``nlist``
+    is clamped for small corpora. ``hnsw`` needs no training.
+    """
+
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES}.")
+
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    count, dim = embeddings.shape
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if index_type == "flat":
+        index: faiss.Index = faiss.IndexFlatIP(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, metric)
+        index.hnsw.efConstruction = ef_construction
+    else:
+        nlist = max(1, min(nlist, count // _MIN_POINTS_PER_CENTROID))
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        else:
+            if dim % pq_m:
+                raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dim}.")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_nbits, metric)
+        index.train(_training_sample(embeddings, train_sample, seed))
+
+    for start in range(0, count, add_batch_size):
+        index.add(embeddings[start : start + add_batch_size])
+    return index
+
+
+def read_index(path, mmap: bool = False) -> faiss.Index:
+    """Read an index, memory-mapping its data when ``mmap`` is set and supported.
+
+    Mapped indexes share pages across workers and open almost instantly;
+    index types FAISS cannot map are read into memory instead.
+    """
+
+    if mmap:
+        try:
+            return faiss.read_index(str(path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as exc:
+            logger.info("Memory-mapping %s failed (%s); reading it into memory", path, exc)
+    return faiss.read_index(str(path))
+
+
+def prepare_for_serving(index: faiss.Index, nprobe: int, ef_search: int) -> faiss.Index:
+    """Apply query-time knobs and enable row reconstruction where needed."""
+
+    ivf = _as_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+        # Partitioned search reconstructs vectors by row id.
+        ivf.make_direct_map()
+    hnsw = _as_hnsw(index)
+    if hnsw is not None:
+        hnsw.hnsw.efSearch = ef_search
+    return index
+
+
+def search_parameters(
+    index: faiss.Index,
+    nprobe: int,
+    ef_search: int,
+    selector: Optional[faiss.IDSelector] = None,
+) -> faiss.SearchParameters:
+    """Per-call search parameters matching the index family."""
+
+    ivf = _as_ivf(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF()
+        params.nprobe = min(nprobe, ivf.nlist)
+    elif _as_hnsw(index) is not None:
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = ef_search
+    else:
+        params = faiss.SearchParameters()
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def describe(index: faiss.Index) -> str:
+    ivf = _as_ivf(index)
+    if ivf is not None:
+        return f"{type(index).__name__}(nlist={ivf.nlist}, nprobe={ivf.nprobe}, ntotal={index.ntotal})"
+    hnsw = _as_hnsw(index)
+    if hnsw is not None:
+        return f"{type(index).__name__}(efSearch={hnsw.hnsw.efSearch}, ntotal={index.ntotal})"
+    return f"{type(index).__name__}(ntotal={index.ntotal})"
+
+
+def _training_sample(embeddings: np.ndarray, size: int, seed: int) -> np.ndarray:
+    if len(embeddings) <= size:
+        return embeddings
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(embeddings), size=size, replace=False))
+    return embeddings[rows]
+
+
+def _as_ivf(index: faiss.Index) -> Optional[faiss.IndexIVF]:
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def _as_hnsw(index: faiss.Index) -> Optional[faiss.IndexHNSW]:
+    downcast = faiss.downcast_index(index)
+    return downcast if isinstance(downcast, faiss.IndexHNSW) else None
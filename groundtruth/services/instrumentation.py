@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Tuple
+
+# Collectors that stage timings are currently recorded into. Empty (the
+# default) means nobody is listening and ``stage`` costs one lookup.
+_ACTIVE: ContextVar[Tuple["StageTimings", ...]] = ContextVar("groundtruth_stage_timings", default=())
+
+
+@dataclass(slots=True)
+class StageTimings:
+    """Wall-clock milliseconds spent per pipeline stage for one request."""
+
+    stages: Dict[str, float] = field(default_factory=dict)
+
+    def add(self, name: str, elapsed_ms: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(self.stages)
+
+
+def active_timings() -> Tuple[StageTimings, ...]:
+    return _ACTIVE.get()
+
+
+@contextmanager
+def collect_timings(*timings: StageTimings) -> Iterator[None]:
+    """Record every ``stage`` entered in this context into ``timings``.
+
+    Shared work (e.g. a micro-batch serving several requests) activates the
+    collectors of all requests involved, so each one sees the time it waited on.
+    """
+
+    token = _ACTIVE.set(timings)
+    try:
+        yield
+    finally:
+        _ACTIVE.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    timings = _ACTIVE.get()
+    if not timings:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        for collector in timings:
+            collector.add(name, elapsed_ms)
@@ -1,10 +1,31 @@
 from __future__ import annotations
 
-from typing import Optional
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import AsyncIterator, Optional, Protocol
 
 import google.generativeai as genai
 
 
+class LLMBackend(Protocol):
+    """What the pipeline needs from a text generation backend.
+
+    ``timeout`` is the time left for the call in seconds; backends should
+    give up (raising ``asyncio.TimeoutError`` or their own error) once it
+    passes. Retries, hedging and concurrency limits live in
+    ``ResilientLLMClient``, not in the backends.
+    """
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str: ...
+
+    async def agenerate(self, prompt: str, timeout: Optional[float] = None) -> str: ...
+
+    def astream(self, prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]: ...
+
+
 class GeminiClient:
     """Thin client around the Gemini SDK."""
 
@@ -14,9 +35,104 @@ class GeminiClient:
         genai.configure(api_key=api_key)
         self._model = genai.GenerativeModel(model_name)
 
-    def generate(self, prompt: str) -> str:
-        response = self._model.generate_content(prompt)
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        request_options = {"timeout": timeout} if timeout is not None else None
+        response = self._model.generate_content(prompt, request_options=request_options)
+        return self._extract_text(response)
+
+    async def agenerate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """Awaitable variant of ``generate`` that never blocks the event loop."""
+
+        response = await asyncio.wait_for(
+            self._model.generate_content_async(prompt),
+            timeout=timeout,
+        )
+        return self._extract_text(response)
+
+    async def astream(self, prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield text fragments as Gemini generates them.
+
+        ``timeout`` bounds the whole generation, not each fragment.
+        """
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        response = await asyncio.wait_for(
+            self._model.generate_content_async(prompt, stream=True),
+            timeout=timeout,
+        )
+        chunks = response.__aiter__()
+        while True:
+            remaining = deadline - loop.time() if deadline is not None else None
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+            except StopAsyncIteration:
+                return
+            text = getattr(chunk, "text", None)
+            if text:
+                yield text
+
+    @staticmethod
+    def _extract_text(response) -> str:
         if not getattr(response, "text", None):
             raise RuntimeError("Gemini response missing text payload.")
         return response.text.strip()
 
+
+class StubLLMClient:
+    """Deterministic offline stand-in for ``GeminiClient``.
+
+    Answers with valid JSON citing the first evidence chunk ids found in the
+    prompt, after an optional fixed ``latency_ms``. Used for benchmarks and
+    local runs without an API key; the same prompt always yields the same
+    answer.
+    """
+
+    _CHUNK_ID_PATTERN = re.compile(r"chunk_id=(\S+)")
+    _MESSAGE_PATTERN = re.compile(r'- user_message: "(.*)"')
+
+    def __init__(self, latency_ms: float = 0.0, max_sources: int = 2):
+        self._latency_s = max(latency_ms, 0.0) / 1000.0
+        self._max_sources = max_sources
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        if self._latency_s:
+            if timeout is not None and self._latency_s > timeout:
+                time.sleep(max(timeout, 0.0))
+                raise asyncio.TimeoutError("Stub LLM exceeded its deadline.")
+            time.sleep(self._latency_s)
+        return self._respond(prompt)
+
+    async def agenerate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        if self._latency_s:
+            await asyncio.wait_for(asyncio.sleep(self._latency_s), timeout=timeout)
+        return self._respond(prompt)
+
+    async def astream(
+        self, prompt: str, timeout: Optional[float] = None, chunk_chars: int = 16
+    ) -> AsyncIterator[str]:
+        """Yield the same answer as ``generate`` in small fragments."""
+
+        text = self._respond(prompt)
+        pieces = [text[i : i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+        delay = self._latency_s / max(len(pieces), 1)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        for piece in pieces:
+            if delay:
+                if deadline is not None and loop.time() + delay > deadline:
+                    raise asyncio.TimeoutError("Stub LLM exceeded its deadline.")
+                await asyncio.sleep(delay)
+            yield piece
+
+    def _respond(self, prompt: str) -> str:
+        sources = self._CHUNK_ID_PATTERN.findall(prompt)[: self._max_sources]
+        match = self._MESSAGE_PATTERN.search(prompt)
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return json.dumps(
+            {
+                "message": f"Recommendation {digest} for: {match.group(1) if match else 'customer'}",
+                "reason": f"Grounded in {len(sources)} evidence chunk(s).",
+                "sources": sources,
+            }
+        )
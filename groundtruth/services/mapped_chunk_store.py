@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import json
+import mmap
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ..models import ChunkRecord
+from .chunk_store import ChunkStore, ids_digest, partition_values
+
+FORMAT_NAME = "groundtruth-chunk-store"
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+# Blob name -> offsets file. Row i occupies blob[offsets[i]:offsets[i + 1]].
+_BLOBS = ("text", "chunk_id", "meta")
+_ID_COLUMNS = ("store_id", "customer_id")
+_MISSING_ID = -1
+
+
+class MappedChunkStore(ChunkStore):
+    """Memory-mapped, columnar chunk store.
+
+    The on-disk layout (written by ``write_mapped_chunk_store``) is a
+    directory holding UTF-8 blobs plus int64 offset tables for chunk text, ids
+    and metadata, and columnar ``source``/``store_id``/``customer_id`` arrays
+    with a pre-sorted row permutation per column. Every file is memory-mapped,
+    so workers share pages through the OS cache and a ``ChunkRecord`` is only
+    decoded for the rows a search actually returns.
+    """
+
+    def __init__(self, directory: Path):
+        self._path = directory
+        manifest = json.loads((directory / MANIFEST_FILE).read_text(encoding="utf-8"))
+        if manifest.get("format") != FORMAT_NAME or manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported chunk store format in {directory}: {manifest}")
+
+        self._rows = int(manifest["rows"])
+        self._id_rows = None
+        self._id_rows_lock = threading.Lock()
+        self._sources: List[str] = list(manifest["sources"])
+        self._source_codes = {name: code for code, name in enumerate(self._sources)}
+        self._handles = []
+        self._blobs = {name: self._map_blob(directory / f"{name}.bin") for name in _BLOBS}
+        self._offsets = {
+            name: np.load(directory / f"{name}.offsets.npy", mmap_mode="r") for name in _BLOBS
+        }
+        self._columns: Dict[str, np.ndarray] = {}
+        self._sorted_rows: Dict[str, np.ndarray] = {}
+        self._sorted_values: Dict[str, np.ndarray] = {}
+        for field in ("source", *_ID_COLUMNS):
+            self._columns[field] = np.load(directory / f"{field}.npy", mmap_mode="r")
+            self._sorted_rows[field] = np.load(directory / f"{field}.rows.npy", mmap_mode="r")
+            self._sorted_values[field] = np.load(directory / f"{field}.sorted.npy", mmap_mode="r")
+
+    @classmethod
+    def is_store(cls, directory: Optional[Path]) -> bool:
+        return directory is not None and (directory / MANIFEST_FILE).is_file()
+
+    @property
+    def chunks(self) -> List[ChunkRecord]:
+        # Materializes the whole corpus; prefer indexed access on hot paths.
+        return list(self.iter())
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def __getitem__(self, index: int) -> ChunkRecord:
+        index = int(index)
+        if index < 0:
+            index += self._rows
+        if not 0 <= index < self._rows:
+            raise IndexError(index)
+        return ChunkRecord(
+            chunk_id=self._decode("chunk_id", index),
+            text=self._decode("text", index),
+            meta=json.loads(self._decode("meta", index)),
+        )
+
+    def iter(self) -> Iterable[ChunkRecord]:
+        return (self[row] for row in range(self._rows))
+
+    def text(self, index: int) -> str:
+        """Chunk text only, skipping the metadata decode."""
+
+        return self._decode("text", int(index))
+
+    def chunk_ids_digest(self) -> str:
+        # Same digest as the JSONL store, straight from the id blob.
+        return ids_digest(self._blobs["chunk_id"], np.diff(self._offsets["chunk_id"]))
+
+    def close(self) -> None:
+        for blob in self._blobs.values():
+            if isinstance(blob, mmap.mmap):
+                blob.close()
+        for handle in self._handles:
+            handle.close()
+        self._handles.clear()
+
+    def _decode(self, blob: str, index: int) -> str:
+        offsets = self._offsets[blob]
+        start, end = int(offsets[index]), int(offsets[index + 1])
+        return self._blobs[blob][start:end].decode("utf-8")
+
+    def _index_ids(self) -> Dict[str, int]:
+        # Decode only the id blob instead of whole records.
+        return {self._decode("chunk_id", row): row for row in range(self._rows)}
+
+    def _partition_rows(self, field: str, value: Any) -> np.ndarray:
+        if field == "source":
+            if value not in self._source_codes:
+                return np.empty(0, dtype=np.int64)
+            value = self._source_codes[value]
+        values = self._sorted_values[field]
+        lo = int(np.searchsorted(values, value, side="left"))
+        hi = int(np.searchsorted(values, value, side="right"))
+        # The stable sort at write time keeps rows ascending within a value.
+        return np.asarray(self._sorted_rows[field][lo:hi], dtype=np.int64)
+
+    def _map_blob(self, path: Path):
+        if path.stat().st_size == 0:
+            return b""
+        handle = path.open("rb")
+        self._handles.append(handle)
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def write_mapped_chunk_store(records: Iterable[ChunkRecord], directory: Path) -> int:
+    """Write ``records`` in the ``MappedChunkStore`` layout; returns the row count.
+
+    Text and metadata are streamed to the blobs, so only the per-row offsets
+    and id columns are held in memory while writing.
+    """
+
+    directory.mkdir(parents=True, exist_ok=True)
+    offsets: Dict[str, List[int]] = {name: [0] for name in _BLOBS}
+    columns: Dict[str, List[int]] = {field: [] for field in ("source", *_ID_COLUMNS)}
+    sources: Dict[str, int] = {}
+
+    handles = {name: (directory / f"{name}.bin").open("wb") for name in _BLOBS}
+    try:
+        for record in records:
+            payloads = {
+                "text": record.text,
+                "chunk_id": record.chunk_id,
+                "meta": json.dumps(record.meta, ensure_ascii=False),
+            }
+            for name, payload in payloads.items():
+                encoded = payload.encode("utf-8")
+                handles[name].write(encoded)
+                offsets[name].append(offsets[name][-1] + len(encoded))
+
+            keys = dict(partition_values(record.meta))
+            source = keys.get("source", "")
+            columns["source"].append(sources.setdefault(source, len(sources)))
+            for field in _ID_COLUMNS:
+                columns[field].append(keys.get(field, _MISSING_ID))
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    for name, values in offsets.items():
+        np.save(directory / f"{name}.offsets.npy", np.asarray(values, dtype=np.int64))
+    for field, values in columns.items():
+        column = np.asarray(values, dtype=np.int16 if field == "source" else np.int64)
+        order = np.argsort(column, kind="stable").astype(np.int64)
+        np.save(directory / f"{field}.npy", column)
+        np.save(directory / f"{field}.rows.npy", order)
+        np.save(directory / f"{field}.sorted.npy", column[order])
+
+    rows = len(offsets["text"]) - 1
+    manifest = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "rows": rows,
+        "sources": sorted(sources, key=sources.get),
+    }
+    (directory / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return rows
+
+
+def open_chunk_store(jsonl_path: Path, mapped_dir: Optional[Path] = None) -> ChunkStore:
+    """Prefer the memory-mapped store when it has been built, else parse JSONL."""
+
+    if MappedChunkStore.is_store(mapped_dir):
+        return MappedChunkStore(mapped_dir)
+    return ChunkStore(jsonl_path)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; spans in-process stages (sub-millisecond) up to slow LLM calls.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_Labels = Tuple[Tuple[str, str], ...]
+# Callback returning (labels, value) samples, evaluated at scrape time.
+_Sampler = Callable[[], Iterable[Tuple[Dict[str, str], float]]]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> _Labels:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: _Labels, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[_Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, labels: Optional[Dict[str, str]] = None) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format."""
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self._bounds = tuple(sorted(buckets))
+        # labels -> (per-bucket counts incl. +Inf, sum, count)
+        self._series: Dict[_Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels)
+        slot = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self._bounds) + 1), [0.0, 0.0])
+            counts, totals = series
+            counts[slot] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, (total, count)) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip((*self._bounds, float("inf")), counts):
+                    cumulative += bucket_count
+                    le = _format_labels(labels, [("le", _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {_format_value(count)}")
+        return lines
+
+
+class _SampledMetric:
+    def __init__(self, name: str, documentation: str, kind: str, sampler: _Sampler):
+        self.name = name
+        self.documentation = documentation
+        self._kind = kind
+        self._sampler = sampler
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self._kind}"]
+        for labels, value in self._sampler():
+            lines.append(f"{self.name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-local metrics rendered as Prometheus text on ``/metrics``.
+
+    Counters and histograms are updated on the request path; values that other
+    components already track (cache hits, batch occupancy) are registered as
+    samplers and read only when scraped.
+    """
+
+    def __init__(self, namespace: str = "groundtruth"):
+        self._namespace = namespace
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(self._full_name(name), documentation))
+
+    def histogram(
+        self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(self._full_name(name), documentation, buckets))
+
+    def sampled(self, name: str, documentation: str, sampler: _Sampler, kind: str = "gauge") -> None:
+        self._register(_SampledMetric(self._full_name(name), documentation, kind, sampler))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _full_name(self, name: str) -> str:
+        return f"{self._namespace}_{name}" if self._namespace else name
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} already registered with another type.")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from sentence_transformers import CrossEncoder, SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+# torch: stock PyTorch fp32. torch_int8: PyTorch with Linear layers dynamically
+# quantized to int8. onnx / onnx_int8: ONNX Runtime on the fp32 or the
+# dynamically quantized graph written by Scripts/export_models.py.
+MODEL_BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+# Dynamic quantization configs shipped with sentence-transformers; pick the
+# one matching the serving CPUs' instruction set.
+QUANTIZATION_CONFIGS = ("arm64", "avx2", "avx512", "avx512_vnni")
+
+ENCODER_DIR = "encoder"
+CROSS_ENCODER_DIR = "cross_encoder"
+
+_ONNX_FP32_FILE = "onnx/model.onnx"
+_ONNX_INT8_FILE = "onnx/model_qint8_{quantization}.onnx"
+
+
+def load_encoder(
+    model_name: str,
+    backend: str = "torch",
+    export_dir: Optional[Path] = None,
+    quantization: str = "avx2",
+) -> SentenceTransformer:
+    """Query encoder for ``backend``; ONNX variants load from ``export_dir/encoder``.
+
+    ``onnx_int8`` loads the graph quantized with the ``quantization`` config.
+    """
+
+    return _load(SentenceTransformer, model_name, backend, export_dir, ENCODER_DIR, quantization)
+
+
+def load_cross_encoder(
+    model_name: str,
+    backend: str = "torch",
+    export_dir: Optional[Path] = None,
+    quantization: str = "avx2",
+) -> CrossEncoder:
+    """Cross-encoder for ``backend``; ONNX variants load from ``export_dir/cross_encoder``.
+
+    ``onnx_int8`` loads the graph quantized with the ``quantization`` config.
+    """
+
+    return _load(CrossEncoder, model_name, backend, export_dir, CROSS_ENCODER_DIR, quantization)
+
+
+def exported_model_dir(export_dir: Path, kind: str, model_name: str) -> Path:
+    """Where ``Scripts/export_models.py`` writes the ONNX files for ``model_name``."""
+
+    return export_dir / kind / model_name.replace("/", "__")
+
+
+def _load(
+    factory,
+    model_name: str,
+    backend: str,
+    export_dir: Optional[Path],
+    kind: str,
+    quantization: str,
+) -> Union[SentenceTransformer, CrossEncoder]:
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}'. Expected one of {MODEL_BACKENDS}.")
+    if backend == "onnx_int8" and quantization not in QUANTIZATION_CONFIGS:
+        raise ValueError(
+            f"Unknown quantization config '{quantization}'. Expected one of {QUANTIZATION_CONFIGS}."
+        )
+
+    if backend in ("torch", "torch_int8"):
+        model = factory(model_name)
+        if backend == "torch_int8":
+            _quantize_torch(model)
+        return model
+
+    path, file_name = _onnx_source(model_name, backend, export_dir, kind, quantization)
+    model_kwargs: Dict[str, Any] = {"provider": "CPUExecutionProvider"}
+    if file_name:
+        model_kwargs["file_name"] = file_name
+    logger.info("Loading %s (%s) from %s", model_name, backend, path)
+    return factory(path, backend="onnx", model_kwargs=model_kwargs)
+
+
+def _onnx_source(
+    model_name: str,
+    backend: str,
+    export_dir: Optional[Path],
+    kind: str,
+    quantization: str,
+) -> Tuple[str, Optional[str]]:
+    local = exported_model_dir(export_dir, kind, model_name) if export_dir is not None else None
+    if backend == "onnx":
+        if local is not None and (local / _ONNX_FP32_FILE).is_file():
+            return str(local), _ONNX_FP32_FILE
+        # sentence-transformers exports the fp32 graph on the fly when missing.
+        return model_name, None
+
+    # Exactly the configured file: another config's kernels may not run on these CPUs.
+    file_name = _ONNX_INT8_FILE.format(quantization=quantization)
+    if local is None or not (local / file_name).is_file():
+        raise FileNotFoundError(
+            f"No '{quantization}' quantized ONNX model for '{model_name}' under {local}; "
+            f"run Scripts/export_models.py --quantization {quantization} first."
+        )
+    return str(local), file_name
+
+
+def _quantize_torch(model) -> None:
+    import torch
+
+    # Dynamic quantization swaps Linear layers for int8 kernels in place;
+    # activations stay fp32 and are quantized per batch at run time.
+    target = model if isinstance(model, torch.nn.Module) else model.model
+    target.eval()
+    torch.quantization.quantize_dynamic(target, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import calendar
+import csv
+import json
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+FORMAT_NAME = "groundtruth-order-history"
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+HISTORY_TIMESTAMP_FORMAT = "%d-%m-%Y %H:%M"
+
+# name -> dtype of every per-order column; rows are grouped by customer.
+_COLUMNS: Dict[str, str] = {
+    "customer_id": "int64",
+    "store_id": "int32",
+    "item": "int32",
+    "size": "int16",
+    "ts": "int64",
+    "amount": "float32",
+    "coupon": "bool",
+    "rating": "int8",
+}
+_MISSING = -1
+
+
+def epoch_seconds(timestamp: Union[datetime, str]) -> int:
+    """Seconds since the epoch for a naive history timestamp (read as UTC)."""
+
+    if isinstance(timestamp, str):
+        value = timestamp.strip()
+        # Fast path for the fixed "dd-mm-YYYY HH:MM" layout; strptime
+        # validates anything else (and raises on garbage).
+        if len(value) == 16 and value[2] == value[5] == "-" and value[13] == ":":
+            digits = value[6:10] + value[3:5] + value[0:2] + value[11:13] + value[14:16]
+            if digits.isdigit():
+                return calendar.timegm(
+                    (int(digits[:4]), int(digits[4:6]), int(digits[6:8]),
+                     int(digits[8:10]), int(digits[10:12]), 0)
+                )
+        timestamp = datetime.strptime(value, HISTORY_TIMESTAMP_FORMAT)
+    return calendar.timegm(timestamp.timetuple())
+
+
+class OrderHistoryStore:
+    """Columnar, optionally memory-mapped order history.
+
+    Orders are held as NumPy columns (int ids, epoch-second timestamps and
+    dictionary-encoded item/size codes) sorted by customer and time, so a
+    customer's orders are one contiguous slice located by binary search, and
+    per-store or time-of-day analytics reduce to ``bincount`` over a column.
+    Within a customer, orders sharing a timestamp keep their file order when
+    read newest-first. ``open`` maps a directory written by
+    ``write_order_history``; ``from_csv`` builds the same columns in memory.
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        items: Sequence[str],
+        sizes: Sequence[str],
+        store_rows: Optional[np.ndarray] = None,
+    ):
+        self._columns = columns
+        self._items = list(items)
+        self._item_codes = {name: code for code, name in enumerate(self._items)}
+        self._sizes = list(sizes)
+        self._rows = int(columns["customer_id"].shape[0])
+        customer_ids = np.asarray(columns["customer_id"])
+        boundaries = np.flatnonzero(np.diff(customer_ids)) + 1 if self._rows else np.empty(0, np.int64)
+        starts = np.concatenate(([0], boundaries)).astype(np.int64) if self._rows else boundaries
+        self._customer_ids = customer_ids[starts]
+        self._offsets = np.append(starts, self._rows).astype(np.int64)
+        if store_rows is None:
+            store_rows = np.argsort(columns["store_id"], kind="stable").astype(np.int64)
+        self._store_rows = store_rows
+        self._store_sorted = np.asarray(columns["store_id"])[store_rows]
+
+    @classmethod
+    def open(cls, directory: Path) -> "OrderHistoryStore":
+        manifest = json.loads((directory / MANIFEST_FILE).read_text(encoding="utf-8"))
+        if manifest.get("format") != FORMAT_NAME or manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported order history format in {directory}: {manifest}")
+        columns = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in _COLUMNS}
+        store_rows = np.load(directory / "store_id.rows.npy", mmap_mode="r")
+        return cls(columns, manifest["items"], manifest["sizes"], store_rows=store_rows)
+
+    @classmethod
+    def is_store(cls, directory: Optional[Path]) -> bool:
+        return directory is not None and (directory / MANIFEST_FILE).is_file()
+
+    @classmethod
+    def from_csv(cls, path: Path) -> "OrderHistoryStore":
+        """Parse ``customer_history.csv`` into columns without per-row dicts."""
+
+        buffers = {
+            "customer_id": array("q"),
+            "store_id": array("i"),
+            "item": array("i"),
+            "size": array("h"),
+            "ts": array("q"),
+            "amount": array("f"),
+            "coupon": array("b"),
+            "rating": array("b"),
+        }
+        items: Dict[str, int] = {}
+        sizes: Dict[str, int] = {}
+        with path.open("r", encoding="utf-8") as handle:
+            reader = csv.reader(handle)
+            header = {name: pos for pos, name in enumerate(next(reader, []))}
+
+            def cell(row: List[str], name: str) -> str:
+                pos = header.get(name)
+                return row[pos].strip() if pos is not None and pos < len(row) else ""
+
+            for row in reader:
+                if not row:
+                    continue
+                store_id = cell(row, "store_id")
+                amount = cell(row, "amount")
+                rating = cell(row, "satisfaction_rating")
+                buffers["customer_id"].append(int(cell(row, "customer_id")))
+                buffers["store_id"].append(int(store_id) if store_id else _MISSING)
+                buffers["item"].append(items.setdefault(cell(row, "item"), len(items)))
+                buffers["size"].append(sizes.setdefault(cell(row, "size"), len(sizes)))
+                buffers["ts"].append(epoch_seconds(cell(row, "timestamp")))
+                buffers["amount"].append(float(amount) if amount else float("nan"))
+                buffers["coupon"].append(cell(row, "coupon_applied").upper() in ("YES", "TRUE", "1"))
+                buffers["rating"].append(int(rating) if rating else _MISSING)
+
+        raw = {name: np.frombuffer(buffer, dtype=buffer.typecode) for name, buffer in buffers.items()}
+        # Newest-first reads walk a slice backwards, so equal timestamps are
+        # ordered by descending file row to come out in file order.
+        row_numbers = np.arange(raw["ts"].shape[0], dtype=np.int64)
+        order = np.lexsort((-row_numbers, raw["ts"], raw["customer_id"]))
+        columns = {name: raw[name][order].astype(dtype) for name, dtype in _COLUMNS.items()}
+        return cls(
+            columns,
+            sorted(items, key=items.get),
+            sorted(sizes, key=sizes.get),
+        )
+
+    def __len__(self) -> int:
+        return self._rows
+
+    @property
+    def items(self) -> List[str]:
+        return self._items
+
+    def customers(self) -> np.ndarray:
+        """Distinct customer ids, ascending."""
+
+        return self._customer_ids
+
+    def customer_rows(self, customer_id: int) -> slice:
+        pos = int(np.searchsorted(self._customer_ids, customer_id))
+        if pos >= self._customer_ids.shape[0] or self._customer_ids[pos] != customer_id:
+            return slice(0, 0)
+        return slice(int(self._offsets[pos]), int(self._offsets[pos + 1]))
+
+    def recent_items(self, customer_id: int, n: int = 5) -> List[str]:
+        """Items of the customer's ``n`` newest orders, newest first."""
+
+        rows = self.customer_rows(customer_id)
+        start = max(rows.start, rows.stop - n)
+        codes = self._columns["item"][start:rows.stop][::-1]
+        return [self._items[code] for code in codes]
+
+    def iter_recent(self, n: int) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield ``(customer_id, item_codes, timestamps, positions)`` for every customer.
+
+        Each array covers that customer's ``n`` newest orders, oldest first;
+        ``positions`` are row positions in the store. Selection is vectorized,
+        so only ``n`` rows per customer are touched.
+        """
+
+        starts, stops = self._offsets[:-1], self._offsets[1:]
+        first = np.maximum(starts, stops - n)
+        counts = stops - first
+        rows = np.repeat(first, counts) + (
+            np.arange(int(counts.sum()), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+        )
+        item_codes = np.asarray(self._columns["item"][rows])
+        timestamps = np.asarray(self._columns["ts"][rows])
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        for pos, customer_id in enumerate(self._customer_ids):
+            lo, hi = int(bounds[pos]), int(bounds[pos + 1])
+            yield int(customer_id), item_codes[lo:hi], timestamps[lo:hi], rows[lo:hi]
+
+    def store_popularity(
+        self,
+        store_id: int,
+        top: int = 5,
+        since: Optional[Union[datetime, int]] = None,
+    ) -> List[Tuple[str, int]]:
+        """Most ordered items at ``store_id`` as ``(item, count)``, optionally since a time."""
+
+        lo = int(np.searchsorted(self._store_sorted, store_id, side="left"))
+        hi = int(np.searchsorted(self._store_sorted, store_id, side="right"))
+        rows = np.sort(self._store_rows[lo:hi])
+        codes = np.asarray(self._columns["item"][rows])
+        if since is not None and codes.size:
+            cutoff = since if isinstance(since, int) else epoch_seconds(since)
+            codes = codes[np.asarray(self._columns["ts"][rows]) >= cutoff]
+        return self._top_items(codes, top)
+
+    def hour_distribution(
+        self,
+        customer_id: Optional[int] = None,
+        store_id: Optional[int] = None,
+    ) -> np.ndarray:
+        """Orders per hour of day (length 24), for a customer, a store, both or all orders."""
+
+        if customer_id is not None:
+            rows = self.customer_rows(customer_id)
+            timestamps = np.asarray(self._columns["ts"][rows])
+            if store_id is not None:
+                timestamps = timestamps[np.asarray(self._columns["store_id"][rows]) == store_id]
+        elif store_id is not None:
+            lo = int(np.searchsorted(self._store_sorted, store_id, side="left"))
+            hi = int(np.searchsorted(self._store_sorted, store_id, side="right"))
+            timestamps = np.asarray(self._columns["ts"][np.sort(self._store_rows[lo:hi])])
+        else:
+            timestamps = np.asarray(self._columns["ts"])
+        hours = (timestamps // 3600) % 24
+        return np.bincount(hours, minlength=24).astype(np.int64)
+
+    def _top_items(self, codes: np.ndarray, top: int) -> List[Tuple[str, int]]:
+        if not codes.size:
+            return []
+        counts = np.bincount(codes, minlength=len(self._items))
+        blank = self._item_codes.get("")
+        if blank is not None:
+            counts[blank] = 0
+        # Stable sort on the negated counts breaks ties by item code.
+        order = np.argsort(-counts, kind="stable")[:top]
+        return [(self._items[code], int(counts[code])) for code in order if counts[code] > 0]
+
+
+def write_order_history(store: OrderHistoryStore, directory: Path) -> int:
+    """Write ``store`` in the ``OrderHistoryStore.open`` layout; returns the row count."""
+
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in _COLUMNS:
+        np.save(directory / f"{name}.npy", np.asarray(store._columns[name]))
+    np.save(directory / "store_id.rows.npy", np.asarray(store._store_rows, dtype=np.int64))
+    manifest = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "rows": len(store),
+        "customers": int(store.customers().shape[0]),
+        "items": store._items,
+        "sizes": store._sizes,
+    }
+    (directory / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return len(store)
+
+
+def open_order_history(csv_path: Path, mapped_dir: Optional[Path] = None) -> OrderHistoryStore:
+    """Prefer the memory-mapped store when it has been built, else parse the CSV."""
+
+    if OrderHistoryStore.is_store(mapped_dir):
+        return OrderHistoryStore.open(mapped_dir)
+    return OrderHistoryStore.from_csv(csv_path)
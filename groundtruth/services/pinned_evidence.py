@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import re
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from ..models import RetrievedChunk
+from .chunk_store import ChunkStore
+from .order_history import epoch_seconds
+
+# Sources with one structured row per store/customer; they lead the pinned
+# set ahead of PDF chunks for the same id.
+TABLE_SOURCES = ("stores.csv", "customers.csv")
+HISTORY_SOURCE = "customer_history.csv"
+
+# History chunks spell the order time as "Timestamp: dd-mm-YYYY HH:MM".
+_TIMESTAMP = re.compile(r"Timestamp: (\d{2}-\d{2}-\d{4} \d{2}:\d{2})")
+# Sorts as the oldest order; "+ 1" keeps it negatable.
+_UNKNOWN_TS = np.iinfo(np.int64).min + 1
+
+
+class PinnedEvidence:
+    """Evidence fetched by exact id instead of by similarity.
+
+    The chunk store's partition index already maps ``store_id`` /
+    ``customer_id`` / ``source`` to sorted row ids. On top of it this keeps
+    two row masks, built once at load: rows from the structured tables and
+    rows from the order history, plus the order time of every history row
+    (rows follow ingestion order, not time). ``resolve`` then picks, without
+    touching FAISS, the detected store's chunks (its ``stores.csv`` row
+    first), the customer's profile chunks and the customer's newest orders by
+    timestamp, in that order. Every lookup is a dictionary or binary-search probe plus a slice
+    proportional to that store's or customer's own chunk count.
+    """
+
+    def __init__(
+        self,
+        chunk_store: ChunkStore,
+        store_k: int = 1,
+        profile_k: int = 1,
+        orders_k: int = 1,
+    ):
+        self._chunk_store = chunk_store
+        self._store_k = max(store_k, 0)
+        self._profile_k = max(profile_k, 0)
+        self._orders_k = max(orders_k, 0)
+        self._table_rows = self._mask(TABLE_SOURCES)
+        self._history_rows = self._mask((HISTORY_SOURCE,))
+        self._order_ts = self._order_times()
+
+    def resolve(self, store_id: Optional[int], customer_id: Optional[int]) -> List[RetrievedChunk]:
+        """Pinned chunks for a request, store first, then profile, then newest orders."""
+
+        rows: List[int] = []
+        if store_id and self._store_k:
+            store_rows = self._lookup(store_id=store_id)
+            store_rows = store_rows[~self._history_rows[store_rows]]
+            rows.extend(self._tables_first(store_rows)[: self._store_k])
+        if customer_id is not None and (self._profile_k or self._orders_k):
+            customer_rows = self._lookup(customer_id=customer_id)
+            history = self._history_rows[customer_rows]
+            rows.extend(self._tables_first(customer_rows[~history])[: self._profile_k])
+            if self._orders_k:
+                orders = customer_rows[history]
+                # Newest first; equal times keep file order, as in the customer summary.
+                newest = np.lexsort((orders, -self._order_ts[orders]))
+                rows.extend(orders[newest][: self._orders_k])
+        return [
+            RetrievedChunk(chunk=self._chunk_store[int(row)], score=1.0, rank=rank)
+            for rank, row in enumerate(rows, start=1)
+        ]
+
+    def _lookup(self, **filters: int) -> np.ndarray:
+        rows = self._chunk_store.rows_for(**filters)
+        return np.asarray(rows if rows is not None else (), dtype=np.int64)
+
+    def _tables_first(self, rows: np.ndarray) -> np.ndarray:
+        table = self._table_rows[rows]
+        return np.concatenate((rows[table], rows[~table]))
+
+    def _order_times(self) -> np.ndarray:
+        times = np.full(len(self._chunk_store), _UNKNOWN_TS, dtype=np.int64)
+        for row in np.flatnonzero(self._history_rows):
+            match = _TIMESTAMP.search(self._chunk_store.text(int(row)))
+            if match is None:
+                continue
+            try:
+                times[row] = epoch_seconds(match.group(1))
+            except ValueError:
+                continue
+        return times
+
+    def _mask(self, sources: Iterable[str]) -> np.ndarray:
+        mask = np.zeros(len(self._chunk_store), dtype=bool)
+        for source in sources:
+            mask[self._lookup(source=source)] = True
+        return mask
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 import re
-from typing import List
+from typing import List, Optional, Sequence
 
-from ..models import EvidenceSelection, LiveEvent
+from ..models import EvidenceSelection, LiveEvent, NearbyStore
 from ..models.summary import CustomerSummary
+from .order_history import OrderHistoryStore
 
 
 class PromptBuilder:
@@ -12,17 +13,27 @@ class PromptBuilder:
 
     _PII_REGEX = re.compile(r"\b\d{8,}\b")
 
-    def __init__(self, pii_mask_token: str = "[REDACTED]"):
+    def __init__(
+        self,
+        pii_mask_token: str = "[REDACTED]",
+        order_history: Optional[OrderHistoryStore] = None,
+        popular_items_k: int = 3,
+    ):
         self._pii_mask_token = pii_mask_token
+        self._order_history = order_history
+        self._popular_items_k = popular_items_k
 
     def build(
         self,
         event: LiveEvent,
         summary: CustomerSummary,
         evidence: EvidenceSelection,
+        nearby_stores: Optional[Sequence[NearbyStore]] = None,
     ) -> str:
         evidence_blocks = self._format_evidence(evidence)
+        nearby = self._format_nearby(nearby_stores)
         mask_message = self._mask(event.message)
+        popular = self._format_popular(event.detected_store_id)
 
         template = f"""
 You are GroundTruth's Intelligent Customer Experience Agent.
@@ -38,6 +49,7 @@ Customer Context:
 - detected_store_id: {event.detected_store_id or 'unknown'}
 - weather: {event.weather or 'unknown'}
 - geo: lat {event.latitude:.4f}, lon {event.longitude:.4f}
+- nearby_stores: {nearby}{popular}
 - user_message: "{mask_message}"
 - summary: {summary.overview}
 
@@ -70,11 +82,29 @@ Example (structure only, adapt content to the evidence):
         lines: List[str] = []
         for idx, item in enumerate(evidence.items, start=1):
             text = self._mask(item.text)
-            lines.append(f"[{idx}] chunk_id={item.chunk_id} | score={item.score:.4f}\n{text}")
+            label = "exact match" if item.pinned else f"score={item.score:.4f}"
+            lines.append(f"[{idx}] chunk_id={item.chunk_id} | {label}\n{text}")
         if evidence.notes:
             lines.append(f"Note: {evidence.notes}")
         return "\n\n".join(lines)
 
+    @staticmethod
+    def _format_nearby(nearby_stores: Optional[Sequence[NearbyStore]]) -> str:
+        if not nearby_stores:
+            return "unknown"
+        return "; ".join(
+            f"{store.name} (store {store.store_id}, {store.distance_m:.0f} m)"
+            for store in nearby_stores
+        )
+
+    def _format_popular(self, store_id: Optional[int]) -> str:
+        if self._order_history is None or store_id is None or self._popular_items_k <= 0:
+            return ""
+        popular = self._order_history.store_popularity(store_id, top=self._popular_items_k)
+        if not popular:
+            return ""
+        return "\n- popular_at_store: " + ", ".join(item for item, _ in popular)
+
     def _mask(self, value: str) -> str:
         return self._PII_REGEX.sub(self._pii_mask_token, value)
 
@@ -1,11 +1,31 @@
 from __future__ import annotations
 
+import hashlib
+import math
+import re
+from datetime import datetime
+from typing import Optional
+
 from ..models import CustomerSummary, LiveEvent
 
+_WHITESPACE = re.compile(r"\s+")
+_WEATHER_BUCKETS = (
+    ("storm", ("storm", "thunder", "lightning")),
+    ("snow", ("snow", "sleet", "blizzard")),
+    ("rain", ("rain", "drizzle", "shower", "monsoon", "wet")),
+    ("cold", ("cold", "chill", "cool", "freez", "winter")),
+    ("hot", ("hot", "heat", "warm", "humid", "summer")),
+    ("sunny", ("sun", "clear", "bright")),
+    ("cloudy", ("cloud", "overcast", "fog", "mist", "haz")),
+)
+
 
 class QueryBuilder:
     """Builds semantic search queries that blend live context with history."""
 
+    def __init__(self, location_grid_deg: float = 0.005):
+        self._location_grid_deg = location_grid_deg
+
     def build(self, event: LiveEvent, summary: CustomerSummary) -> str:
         parts: list[str] = [
             f"Customer ID {event.customer_id}",
@@ -26,3 +46,85 @@ class QueryBuilder:
 
         return " | ".join(parts)
 
+    def lexical(self, event: LiveEvent, summary: CustomerSummary) -> str:
+        """Keyword query for the BM25 index.
+
+        Keeps the words and ids chunks actually contain (message, summary,
+        loyalty tier, store and customer ids, weather) and drops the field
+        labels and coordinates of ``build``, which would only match noise.
+        """
+
+        # Ids are written the way the tabular chunks spell them ("StoreID: 2002").
+        parts = [event.message, summary.overview, f"CustomerID: {event.customer_id}"]
+        if summary.loyalty_level:
+            parts.append(summary.loyalty_level)
+        if event.detected_store_id:
+            parts.append(f"StoreID: {event.detected_store_id}")
+        if event.weather:
+            parts.append(event.weather)
+        return " ".join(parts)
+
+    def cache_key(self, event: LiveEvent, summary: CustomerSummary) -> str:
+        """Canonical form of the query used to share cached embeddings.
+
+        Requests that differ only in message casing/spacing, weather wording or
+        a few metres of GPS jitter map to the same key.
+        """
+
+        lat, lon = self._snap(event.latitude), self._snap(event.longitude)
+        overview = hashlib.sha1(summary.overview.encode("utf-8")).hexdigest()[:12]
+        parts = [
+            f"cid={event.customer_id}",
+            f"msg={self.normalize_text(event.message)}",
+            f"summary={overview}",
+            f"loyalty={summary.loyalty_level or ''}",
+            f"store={event.detected_store_id or ''}",
+            f"weather={self.normalize_weather(event.weather) or ''}",
+            f"geo={lat},{lon}",
+        ]
+        return "|".join(parts)
+
+    def response_key(self, event: LiveEvent) -> str:
+        """Exact context under which a cached LLM response may be reused."""
+
+        parts = [
+            f"cid={event.customer_id}",
+            f"store={event.detected_store_id or ''}",
+            f"weather={self.normalize_weather(event.weather) or ''}",
+            f"daypart={self.daypart(event.timestamp)}",
+        ]
+        return "|".join(parts)
+
+    @staticmethod
+    def daypart(timestamp: datetime) -> str:
+        hour = timestamp.hour
+        if 5 <= hour < 11:
+            return "morning"
+        if 11 <= hour < 16:
+            return "afternoon"
+        if 16 <= hour < 21:
+            return "evening"
+        return "night"
+
+    @staticmethod
+    def normalize_text(value: str) -> str:
+        return _WHITESPACE.sub(" ", value).strip().strip(".!?").lower()
+
+    @staticmethod
+    def normalize_weather(weather: Optional[str]) -> Optional[str]:
+        """Map free-form weather descriptions onto a small set of buckets."""
+
+        if not weather:
+            return None
+        cleaned = QueryBuilder.normalize_text(weather)
+        for bucket, keywords in _WEATHER_BUCKETS:
+            if any(keyword in cleaned for keyword in keywords):
+                return bucket
+        return cleaned or None
+
+    def _snap(self, value: float) -> str:
+        grid = self._location_grid_deg
+        if grid <= 0:
+            return f"{value:.4f}"
+        snapped = math.floor(value / grid + 0.5) * grid
+        return f"{snapped:.6f}"
@@ -1,20 +1,86 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import logging
 import time
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, contextmanager
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import numpy as np
 
 from ..config import Settings, get_settings
-from ..models import LiveEvent, RecommendationResponse
-from .chunk_store import ChunkStore
+from ..models import (
+    CustomerSummary,
+    EvidenceSelection,
+    LiveEvent,
+    NearbyStore,
+    RecommendationResponse,
+    RetrievalPartition,
+    RetrievedChunk,
+)
 from .customer_summary import CustomerSummaryService
+from .order_history import open_order_history
+from .embedding_cache import EmbeddingCache
 from .evidence_selector import EvidenceSelector
-from .llm_client import GeminiClient
+from .instrumentation import StageTimings, active_timings, collect_timings, stage
+from .llm_client import GeminiClient, LLMBackend, StubLLMClient
+from .mapped_chunk_store import open_chunk_store
+from .metrics import MetricsRegistry
+from .pinned_evidence import PinnedEvidence
 from .prompt_builder import PromptBuilder
 from .query_builder import QueryBuilder
 from .response_validator import ResponseValidator
+from .adaptive_rerank import RERANK_PATHS, AdaptiveReranker
+from .rerank_cache import RerankScoreCache
 from .reranker import CrossEncoderReranker
+from .resilient_llm import ResilientLLMClient
+from .response_cache import SemanticResponseCache
 from .retriever import FaissRetriever
+from .serving_bundle import open_serving_bundle
+from .sparse_index import open_bm25_index, reciprocal_rank_fusion
+from .store_locator import StoreLocator
 from .store_priority import StorePriorityBooster
+from .stream_parser import IncrementalJSONParser
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# (context key, message embedding, cached payload) from a response cache lookup.
+_CacheLookup = Tuple[str, np.ndarray, Optional[Dict[str, Any]]]
+
+
+@dataclass(slots=True)
+class _BatchItem:
+    """One event moving through ``recommend_many``."""
+
+    index: int
+    event: LiveEvent
+    started: float = field(default_factory=time.perf_counter)
+    timings: StageTimings = field(default_factory=StageTimings)
+    summary: Optional[CustomerSummary] = None
+    nearby: List[NearbyStore] = field(default_factory=list)
+    lookup: Optional[_CacheLookup] = None
+    cached: Optional[Dict[str, Any]] = None
+    prompt: Optional[str] = None
+    parsed: Optional[Dict[str, Any]] = None
+    error: Optional[Exception] = None
 
 
 class RecommendationService:
@@ -22,41 +88,1000 @@ class RecommendationService:
 
     def __init__(self, settings: Optional[Settings] = None):
         self._settings = settings or get_settings()
-        self._chunk_store = ChunkStore(self._settings.chunks_meta_path)
-        self._summary_service = CustomerSummaryService(self._settings.data_dir)
-        self._retriever = FaissRetriever(
-            index_path=self._settings.faiss_index_path,
-            chunk_store=self._chunk_store,
-            model_name=self._settings.embedding_model_name,
+        self.load_timings_ms: Dict[str, float] = {}
+        self._embedding_cache: Optional[EmbeddingCache] = None
+        if self._settings.query_cache_size > 0:
+            self._embedding_cache = EmbeddingCache(
+                max_entries=self._settings.query_cache_size,
+                ttl_s=self._settings.query_cache_ttl_s,
+                path=self._settings.query_cache_path,
+                model_id=f"{self._settings.embedding_model_name}:{self._settings.encoder_backend}",
+            )
+        self._rerank_cache: Optional[RerankScoreCache] = None
+        if self._settings.rerank_cache_size > 0:
+            self._rerank_cache = RerankScoreCache(
+                max_entries=self._settings.rerank_cache_size,
+                model_id=f"{self._settings.cross_encoder_model_name}:{self._settings.cross_encoder_backend}",
+                path=self._settings.rerank_cache_path,
+            )
+
+        self.bundle = open_serving_bundle(
+            self._settings.bundle_dir, verify_checksums=self._settings.bundle_verify_checksums
         )
+        if self.bundle is not None:
+            self.bundle.check_embedding_model(self._settings.embedding_model_name)
+            index_path = self.bundle.index_path
+            chunk_store_dir = self.bundle.chunk_store_dir
+            order_history_dir = self.bundle.order_history_dir
+            sparse_index_dir = self.bundle.sparse_index_dir
+            tables_dir = self.bundle.tables_dir
+        else:
+            index_path = self._settings.faiss_index_path
+            chunk_store_dir = self._settings.chunk_store_dir
+            order_history_dir = self._settings.order_history_dir
+            sparse_index_dir = self._settings.sparse_index_dir
+            tables_dir = self._settings.data_dir
+
+        # Index, models and CSVs load on a small pool. The retriever and the
+        # summaries wait on parts submitted before them, so a FIFO pool of any
+        # size cannot deadlock.
+        with ThreadPoolExecutor(
+            max_workers=max(self._settings.startup_load_workers, 1),
+            thread_name_prefix="groundtruth-load",
+        ) as pool:
+            chunk_store = pool.submit(
+                self._timed_load, "chunk_store", open_chunk_store,
+                self._settings.chunks_meta_path, chunk_store_dir,
+            )
+            order_history = pool.submit(
+                self._timed_load, "order_history", open_order_history,
+                self._settings.data_dir / "customer_history.csv", order_history_dir,
+            )
+            reranker = pool.submit(
+                self._timed_load, "reranker", CrossEncoderReranker,
+                self._settings.cross_encoder_model_name,
+                batch_max_pairs=self._settings.rerank_batch_max_pairs,
+                batch_max_wait_ms=self._settings.rerank_batch_max_wait_ms,
+                bucket_size=self._settings.rerank_bucket_size,
+                model_backend=self._settings.cross_encoder_backend,
+                model_export_dir=self._settings.model_export_dir,
+                model_quantization=self._settings.onnx_quantization,
+                score_cache=self._rerank_cache,
+            )
+            store_locator = pool.submit(
+                self._timed_load, "store_locator", StoreLocator, tables_dir / "stores.csv"
+            )
+            llm_backend = pool.submit(self._timed_load, "llm_backend", self._build_llm_backend)
+            retriever = pool.submit(
+                lambda: self._timed_load(
+                    "retriever", FaissRetriever,
+                    index_path=index_path,
+                    chunk_store=chunk_store.result(),
+                    model_name=self._settings.embedding_model_name,
+                    batch_max_size=self._settings.embedding_batch_max_size,
+                    batch_max_wait_ms=self._settings.embedding_batch_max_wait_ms,
+                    embedding_cache=self._embedding_cache,
+                    partition_exact_threshold=self._settings.partition_exact_threshold,
+                    nprobe=self._settings.faiss_nprobe,
+                    ef_search=self._settings.faiss_ef_search,
+                    mmap=self.bundle is not None,
+                    model_backend=self._settings.encoder_backend,
+                    model_export_dir=self._settings.model_export_dir,
+                    model_quantization=self._settings.onnx_quantization,
+                )
+            )
+            sparse_index = (
+                pool.submit(
+                    lambda: self._timed_load(
+                        "sparse_index", open_bm25_index,
+                        chunk_store.result(), sparse_index_dir,
+                    )
+                )
+                if self._settings.hybrid_retrieval
+                else None
+            )
+            summary_service = pool.submit(
+                lambda: self._timed_load(
+                    "customer_summary", CustomerSummaryService,
+                    tables_dir,
+                    recent_orders=self._settings.summary_recent_orders,
+                    history=order_history.result(),
+                )
+            )
+            self._chunk_store = chunk_store.result()
+            self._order_history = order_history.result()
+            self._summary_service = summary_service.result()
+            self._retriever = retriever.result()
+            self._reranker = reranker.result()
+            self._sparse_index = sparse_index.result() if sparse_index is not None else None
+            self._store_locator = store_locator.result()
+            llm_backend = llm_backend.result()
+        self._check_alignment()
+
+        self._response_cache: Optional[SemanticResponseCache] = None
+        if self._settings.response_cache_size > 0:
+            self._response_cache = SemanticResponseCache(
+                max_entries=self._settings.response_cache_size,
+                ttl_s=self._settings.response_cache_ttl_s,
+                threshold=self._settings.response_cache_threshold,
+            )
+            # Cache hits check their chunk ids against the store; index them now, not on the first hit.
+            self._chunk_store.build_id_index()
         self._booster = StorePriorityBooster()
-        self._reranker = CrossEncoderReranker(self._settings.cross_encoder_model_name)
+        self._adaptive_reranker = AdaptiveReranker(
+            self._reranker,
+            policy=self._settings.rerank_policy,
+            keep_k=self._settings.evidence_top_k,
+            margin=self._settings.rerank_margin,
+            cascade_k=self._settings.rerank_cascade_k,
+            budget_ms=self._settings.rerank_budget_ms,
+            shadow_rate=self._settings.rerank_shadow_rate,
+        )
+        self._pinned: Optional[PinnedEvidence] = None
+        if self._settings.pinned_evidence:
+            self._pinned = PinnedEvidence(
+                self._chunk_store,
+                store_k=self._settings.pinned_store_k,
+                profile_k=self._settings.pinned_profile_k,
+                orders_k=self._settings.pinned_orders_k,
+            )
         self._selector = EvidenceSelector(
             top_k=self._settings.evidence_top_k,
             max_chars=self._settings.max_prompt_tokens * 4,  # rough char/token ratio
         )
-        self._query_builder = QueryBuilder()
-        self._prompt_builder = PromptBuilder(self._settings.pii_mask_token)
-        self._llm = GeminiClient(
-            api_key=self._settings.gemini_api_key,
-            model_name=self._settings.gemini_model,
+        self._query_builder = QueryBuilder(
+            location_grid_deg=self._settings.query_cache_grid_deg
+        )
+        self._prompt_builder = PromptBuilder(
+            self._settings.pii_mask_token,
+            order_history=self._order_history,
+            popular_items_k=self._settings.prompt_popular_items,
+        )
+        self._llm = ResilientLLMClient(
+            llm_backend,
+            max_concurrency=self._settings.llm_max_concurrency,
+            deadline_s=self._settings.llm_timeout_s,
+            max_retries=self._settings.llm_max_retries,
+            backoff_base_s=self._settings.llm_retry_backoff_ms / 1000.0,
+            backoff_max_s=self._settings.llm_retry_backoff_max_ms / 1000.0,
+            hedge_percentile=self._settings.llm_hedge_percentile,
+            hedge_min_samples=self._settings.llm_hedge_min_samples,
         )
         self._validator = ResponseValidator()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._settings.cpu_executor_workers,
+            thread_name_prefix="groundtruth-cpu",
+        )
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._warming_up = False
+        self.metrics = MetricsRegistry()
+        self._register_metrics()
 
-    def recommend(self, event: LiveEvent) -> RecommendationResponse:
-        start = time.perf_counter()
+    def recommend(self, event: LiveEvent, debug: bool = False) -> RecommendationResponse:
+        """Run the pipeline for one event.
+
+        With ``debug`` the response also carries the per-stage breakdown in
+        ``timings_ms``.
+        """
+
+        with self._instrumented() as timings:
+            start = time.perf_counter()
+            with stage("summary"):
+                summary = self._summary_service.summarize(event.customer_id)
+            with stage("locate"):
+                event, nearby = self._locate(event)
+            lookup = self._lookup_response(event)
+            if lookup is not None and lookup[2] is not None:
+                latency_ms = int((time.perf_counter() - start) * 1000)
+                return self._response(latency_ms, lookup[2], timings if debug else None, cached=True)
+            evidence = self._select_evidence(event, summary, nearby)
+
+            with stage("prompt"):
+                prompt = self._prompt_builder.build(event, summary, evidence, nearby)
+            with stage("llm"):
+                llm_output = self._llm.generate(prompt, timeout=self._settings.llm_timeout_s)
+            with stage("validate"):
+                parsed = self._parse(llm_output)
+            self._store_response(lookup, parsed)
+
+            latency_ms = int((time.perf_counter() - start) * 1000)
+        return self._response(latency_ms, parsed, timings if debug else None)
+
+    async def arecommend(self, event: LiveEvent, debug: bool = False) -> RecommendationResponse:
+        """Event-loop friendly variant of ``recommend``.
+
+        CPU-bound stages run on a bounded thread pool, the LLM call is awaited
+        with a timeout, and a semaphore caps the number of in-flight requests.
+        """
+
+        async with self._request_slot():
+            with self._instrumented() as timings:
+                start = time.perf_counter()
+                with stage("summary"):
+                    summary = self._summary_service.summarize(event.customer_id)
+                with stage("locate"):
+                    event, nearby = self._locate(event)
+                lookup = await self._run_cpu(self._lookup_response, event)
+                if lookup is not None and lookup[2] is not None:
+                    latency_ms = int((time.perf_counter() - start) * 1000)
+                    return self._response(
+                        latency_ms, lookup[2], timings if debug else None, cached=True
+                    )
+                evidence = await self._run_cpu(self._select_evidence, event, summary, nearby)
+
+                with stage("prompt"):
+                    prompt = self._prompt_builder.build(event, summary, evidence, nearby)
+                with stage("llm"):
+                    llm_output = await self._llm.agenerate(
+                        prompt, timeout=self._settings.llm_timeout_s
+                    )
+                with stage("validate"):
+                    parsed = self._parse(llm_output)
+                self._store_response(lookup, parsed)
+
+                latency_ms = int((time.perf_counter() - start) * 1000)
+            return self._response(latency_ms, parsed, timings if debug else None)
+
+    async def astream_recommend(
+        self, event: LiveEvent, debug: bool = False
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Stream one recommendation as ``(event, data)`` pairs.
+
+        ``evidence`` is emitted as soon as retrieval finishes, ``message``
+        deltas follow while the LLM is still writing that field, and ``done``
+        carries the validated response once the JSON object has closed.
+        Exceptions propagate to the caller after any partial output.
+        """
+
+        async with self._request_slot():
+            timings = StageTimings()
+            collectors = (*active_timings(), timings)
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                # Stage collection must not span a ``yield``: the consumer runs
+                # in between, so only awaits happen inside collect_timings.
+                with collect_timings(*collectors):
+                    with stage("summary"):
+                        summary = self._summary_service.summarize(event.customer_id)
+                    with stage("locate"):
+                        event, nearby = self._locate(event)
+                    lookup = await self._run_cpu(self._lookup_response, event)
+                    cached = lookup[2] if lookup is not None else None
+                    if cached is None:
+                        evidence = await self._run_cpu(
+                            self._select_evidence, event, summary, nearby
+                        )
+                        with stage("prompt"):
+                            prompt = self._prompt_builder.build(event, summary, evidence, nearby)
+
+                if cached is not None:
+                    yield "message", {"delta": cached["message"]}
+                    parsed = cached
+                else:
+                    yield "evidence", {"chunk_ids": [item.chunk_id for item in evidence.items]}
+                    parser = IncrementalJSONParser(stream_field="message")
+                    llm_start = time.perf_counter()
+                    first_fragment_ms: Optional[float] = None
+                    # Closed explicitly (also on an early break or a client
+                    # disconnect) so the LLM slot and stream are released now,
+                    # not whenever the loop finalizes the generator.
+                    async with aclosing(
+                        self._llm.astream(prompt, timeout=self._settings.llm_timeout_s)
+                    ) as fragments:
+                        async for fragment in fragments:
+                            if first_fragment_ms is None:
+                                first_fragment_ms = (time.perf_counter() - llm_start) * 1000.0
+                            delta = parser.feed(fragment)
+                            if delta:
+                                yield "message", {"delta": delta}
+                            if parser.closed:
+                                break
+                    self._add_stage(collectors, "llm", (time.perf_counter() - llm_start) * 1000.0)
+                    if first_fragment_ms is not None:
+                        self._add_stage(collectors, "llm_first_token", first_fragment_ms)
+
+                    with collect_timings(*collectors):
+                        with stage("validate"):
+                            parsed = self._parse(parser.raw)
+                    self._store_response(lookup, parsed)
+
+                latency_ms = int((time.perf_counter() - start) * 1000)
+                response = self._response(
+                    latency_ms, parsed, timings if debug else None, cached=cached is not None
+                )
+                outcome = "ok"
+                yield "done", response.model_dump(exclude_none=True)
+            except BaseException as exc:
+                outcome = self._outcome(exc)
+                raise
+            finally:
+                self._record_request(timings, time.perf_counter() - start, outcome)
+
+    def recommend_many(
+        self, events: Sequence[LiveEvent], debug: bool = False
+    ) -> List[Union[RecommendationResponse, Exception]]:
+        """Batch variant of ``recommend``; results come back in input order.
+
+        A failed item is returned as its exception instead of failing the batch.
+        See ``arecommend_many`` for how the work is batched.
+        """
+
+        results: List[Union[RecommendationResponse, Exception, None]] = [None] * len(events)
+        with ThreadPoolExecutor(
+            max_workers=max(self._settings.batch_llm_concurrency, 1),
+            thread_name_prefix="groundtruth-batch-llm",
+        ) as pool:
+            futures = []
+            for items in self._batch_blocks(events):
+                for item in items:
+                    if item.prompt is None:
+                        results[item.index] = self._finish_item(item, debug)
+                    else:
+                        futures.append(pool.submit(self._complete_item, item, debug))
+            for future in futures:
+                index, result = future.result()
+                results[index] = result
+        return results  # type: ignore[return-value]
+
+    async def arecommend_many(
+        self, events: Sequence[LiveEvent], debug: bool = False
+    ) -> AsyncIterator[Tuple[int, Union[RecommendationResponse, Exception]]]:
+        """Process many events, yielding ``(index, result)`` as each one finishes.
+
+        Events are handled in blocks of ``batch_block_size``. Per block,
+        summaries, store lookups, query encoding, the FAISS search and the
+        cross-encoder each run as one batched call on the CPU pool. LLM calls
+        then fan out, at most ``batch_llm_concurrency`` at a time, while the
+        next block is prepared. ``result`` is the response, or the exception
+        that failed that item.
+        """
+
+        llm_slots = asyncio.Semaphore(max(self._settings.batch_llm_concurrency, 1))
+
+        async def complete(item: _BatchItem) -> Tuple[int, Union[RecommendationResponse, Exception]]:
+            async with llm_slots:
+                return await self._acomplete_item(item, debug)
+
+        blocks = self._batch_blocks(events)
+        pending: Set["asyncio.Future[Tuple[int, Any]]"] = set()
+        try:
+            while True:
+                items = await self._run_cpu(next, blocks, None)
+                if items is None:
+                    break
+                for item in items:
+                    if item.prompt is None:
+                        yield item.index, self._finish_item(item, debug)
+                    else:
+                        pending.add(asyncio.ensure_future(complete(item)))
+                # Hand back whatever already finished before the next block.
+                done, pending = await asyncio.wait(pending, timeout=0) if pending else (set(), pending)
+                for task in done:
+                    yield task.result()
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def warmup(self, rounds: int = 2) -> float:
+        """Exercise the CPU pipeline on a synthetic event; returns elapsed ms.
+
+        Runs summary, location, retrieval, reranking and prompt building on
+        both the single-event and batched paths so lazy allocations, kernel
+        selection and batcher threads are paid before real traffic. The LLM
+        is not called and no request metrics are recorded: truncation is not
+        counted while warming up, and cache, rerank-path and batch-fill
+        counters are zeroed afterwards (cached entries and the rerank cost
+        estimate are kept).
+        """
+
+        started = time.perf_counter()
+        self._warming_up = True
+        try:
+            self._warm(rounds)
+        finally:
+            self._warming_up = False
+            self.reset_stats()
+        return (time.perf_counter() - started) * 1000.0
+
+    def _warm(self, rounds: int) -> None:
+        store_ids = self._store_locator.store_ids()
+        store_id = int(store_ids[0]) if len(store_ids) else None
+        latitude, longitude = (
+            self._store_locator.coordinates(store_id) if store_id is not None else (0.0, 0.0)
+        )
+        event = LiveEvent(
+            customer_id=0,
+            message="What would you recommend right now?",
+            latitude=latitude,
+            longitude=longitude,
+            detected_store_id=store_id,
+        )
         summary = self._summary_service.summarize(event.customer_id)
-        query = self._query_builder.build(event, summary)
+        event, nearby = self._locate(event)
+        for _ in range(max(rounds, 1)):
+            evidence = self._select_evidence(event, summary, nearby)
+            self._prompt_builder.build(event, summary, evidence, nearby)
+        self._select_evidence_many(
+            [event] * max(rounds, 1), [summary] * max(rounds, 1), [nearby] * max(rounds, 1)
+        )
+
+    def reset_stats(self) -> None:
+        """Zero cache hit, rerank path/pair and batch-fill counters; cached entries are kept."""
+
+        # First, so queued shadow reranks have hit the score cache before it is zeroed.
+        self._adaptive_reranker.reset_stats()
+        for cache in (self._embedding_cache, self._rerank_cache, self._response_cache):
+            if cache is not None:
+                cache.reset_stats()
+        self._retriever.reset_batching_stats()
+        self._reranker.reset_batching_stats()
+
+    def close(self) -> None:
+        """Release the CPU executor and batchers; pending stages are allowed to finish."""
+
+        self._executor.shutdown(wait=True)
+        self._retriever.close()
+        self._adaptive_reranker.close()
+        self._reranker.close()
+        if self._embedding_cache is not None:
+            self._embedding_cache.save()
+        if self._rerank_cache is not None:
+            self._rerank_cache.save()
+
+    def batching_stats(self) -> Dict[str, Dict[str, float]]:
+        """Batch occupancy and queue-wait figures for the shared model batchers."""
+
+        return {
+            "retriever": self._retriever.batching_stats(),
+            "reranker": self._reranker.batching_stats(),
+        }
+
+    def rerank_stats(self) -> Dict[str, float]:
+        """Requests per rerank path and cross-encoder pairs scored versus skipped."""
+
+        return self._adaptive_reranker.stats()
+
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        stats: Dict[str, Dict[str, float]] = {}
+        if self._embedding_cache is not None:
+            stats["query_embedding"] = self._embedding_cache.stats()
+        if self._rerank_cache is not None:
+            stats["rerank_pairs"] = self._rerank_cache.stats()
+        if self._response_cache is not None:
+            stats["response"] = self._response_cache.stats()
+        return stats
+
+    def _locate(self, event: LiveEvent) -> Tuple[LiveEvent, List[NearbyStore]]:
+        """Resolve nearby open stores server-side from the event coordinates."""
+
+        nearby = self._store_locator.nearest(
+            event.latitude,
+            event.longitude,
+            k=self._settings.geo_nearest_k,
+            max_distance_m=self._settings.geo_max_distance_m,
+            at=event.timestamp if self._settings.geo_check_opening_hours else None,
+        )
+        return self._resolve_store(event, nearby), nearby
+
+    def _locate_many(self, events: Sequence[LiveEvent]) -> List[Tuple[LiveEvent, List[NearbyStore]]]:
+        if self._settings.geo_check_opening_hours:
+            return [self._locate(event) for event in events]
+        nearby_lists = self._store_locator.nearby_many(
+            [event.latitude for event in events],
+            [event.longitude for event in events],
+            k=self._settings.geo_nearest_k,
+            max_distance_m=self._settings.geo_max_distance_m,
+        )
+        return [
+            (self._resolve_store(event, nearby), nearby)
+            for event, nearby in zip(events, nearby_lists)
+        ]
 
-        retrieved = self._retriever.search(query, self._settings.retrieval_k)
-        boosted = self._booster.boost(retrieved, event.detected_store_id)
-        reranked = self._reranker.rerank(query, boosted, self._settings.rerank_k)
-        evidence = self._selector.select(reranked)
+    def _resolve_store(self, event: LiveEvent, nearby: List[NearbyStore]) -> LiveEvent:
+        if nearby and not event.detected_store_id and self._settings.geo_resolve_missing_store:
+            event = event.model_copy(update={"detected_store_id": nearby[0].store_id})
+        return event
+
+    def _lookup_response(self, event: LiveEvent) -> Optional[_CacheLookup]:
+        """Find a cached response for a near-duplicate event.
+
+        Cached answers are only reused while every chunk they cite is still in
+        the chunk store (chunk ids are content hashes, so unchanged text).
+        """
+
+        return self._lookup_responses([event])[0]
+
+    def _lookup_responses(self, events: Sequence[LiveEvent]) -> List[Optional[_CacheLookup]]:
+        if self._response_cache is None:
+            return [None] * len(events)
+        with stage("response_cache"):
+            messages = [self._query_builder.normalize_text(event.message) for event in events]
+            embeddings = self._retriever.embed_many(
+                messages, cache_keys=[f"msg={message}" for message in messages]
+            )
+            lookups: List[Optional[_CacheLookup]] = []
+            for event, embedding in zip(events, embeddings):
+                key = self._query_builder.response_key(event)
+                payload = self._response_cache.get(key, embedding, self._chunk_store.contains_all)
+                lookups.append((key, embedding, payload))
+        return lookups
+
+    def _store_response(self, lookup: Optional[_CacheLookup], parsed: Dict[str, Any]) -> None:
+        if lookup is None or self._response_cache is None:
+            return
+        key, embedding, _ = lookup
+        payload = {field: parsed[field] for field in ("message", "reason", "sources")}
+        self._response_cache.put(key, embedding, payload)
+
+    def _select_evidence(
+        self,
+        event: LiveEvent,
+        summary: CustomerSummary,
+        nearby: Optional[List[NearbyStore]] = None,
+    ) -> EvidenceSelection:
+        pinned = self._pinned_for(event)
+        if len(pinned) >= self._settings.evidence_top_k:
+            # Exact-id evidence fills every slot; dense search has nothing to add.
+            with stage("select"):
+                selection = self._selector.select([], pinned)
+            self._count_truncated([selection])
+            return selection
+
+        with stage("query_build"):
+            query = self._query_builder.build(event, summary)
+            cache_key = self._query_builder.cache_key(event, summary)
+
+        # The retriever records its own "encode" and "faiss" stages.
+        retrieved = self._fuse_lexical(self._retrieve(event, query, cache_key), event, summary)
+        with stage("boost"):
+            boosted = self._without_pinned(
+                self._booster.boost(retrieved, event.detected_store_id, nearby), pinned
+            )
+        with stage("rerank"):
+            # Pinned chunks take their slots first; rerank decisions are about the rest.
+            reranked, decision = self._adaptive_reranker.rerank(
+                query,
+                boosted,
+                self._settings.rerank_k,
+                cache_key=cache_key,
+                keep_k=self._settings.evidence_top_k - len(pinned),
+            )
+        with stage("select"):
+            selection = self._selector.select(reranked, pinned)
+        selection.rerank_path = decision.path
+        self._count_truncated([selection])
+        return selection
+
+    def _select_evidence_many(
+        self,
+        events: Sequence[LiveEvent],
+        summaries: Sequence[CustomerSummary],
+        nearby: Sequence[List[NearbyStore]],
+    ) -> List[EvidenceSelection]:
+        """``_select_evidence`` for a block of events with batched model calls."""
+
+        pinned = [self._pinned_for(event) for event in events]
+        selections: List[Optional[EvidenceSelection]] = [None] * len(events)
+        dense: List[int] = []
+        with stage("select"):
+            for pos, chunks in enumerate(pinned):
+                if len(chunks) >= self._settings.evidence_top_k:
+                    selections[pos] = self._selector.select([], chunks)
+                else:
+                    dense.append(pos)
+        if dense:
+            self._select_dense(dense, events, summaries, nearby, pinned, selections)
+        self._count_truncated(selections)
+        return selections
+
+    def _select_dense(
+        self,
+        dense: List[int],
+        events: Sequence[LiveEvent],
+        summaries: Sequence[CustomerSummary],
+        nearby: Sequence[List[NearbyStore]],
+        pinned: List[List[RetrievedChunk]],
+        selections: List[Optional[EvidenceSelection]],
+    ) -> None:
+        """Fill ``selections[pos]`` for the ``dense`` positions with batched model calls."""
+
+        events = [events[pos] for pos in dense]
+        summaries = [summaries[pos] for pos in dense]
+        nearby = [nearby[pos] for pos in dense]
+
+        with stage("query_build"):
+            queries = [self._query_builder.build(e, s) for e, s in zip(events, summaries)]
+            cache_keys = [self._query_builder.cache_key(e, s) for e, s in zip(events, summaries)]
+
+        if self._settings.partitioned_retrieval:
+            retrieved = self._retriever.search_partitioned_many(
+                queries, [self._partitions(event) for event in events], cache_keys=cache_keys
+            )
+        else:
+            retrieved = self._retriever.search_many(
+                queries, self._settings.retrieval_k, cache_keys=cache_keys
+            )
+        retrieved = [
+            self._fuse_lexical(chunks, event, summary)
+            for chunks, event, summary in zip(retrieved, events, summaries)
+        ]
+        with stage("boost"):
+            boosted = [
+                self._without_pinned(
+                    self._booster.boost(chunks, event.detected_store_id, stores), pinned[pos]
+                )
+                for chunks, event, stores, pos in zip(retrieved, events, nearby, dense)
+            ]
+        with stage("rerank"):
+            reranked, decisions = self._adaptive_reranker.rerank_many(
+                queries,
+                boosted,
+                self._settings.rerank_k,
+                cache_keys=cache_keys,
+                keep_ks=[self._settings.evidence_top_k - len(pinned[pos]) for pos in dense],
+            )
+        with stage("select"):
+            for pos, chunks, decision in zip(dense, reranked, decisions):
+                selection = self._selector.select(chunks, pinned[pos])
+                selection.rerank_path = decision.path
+                selections[pos] = selection
+
+    def _count_truncated(self, selections: Sequence[EvidenceSelection]) -> None:
+        if not self._warming_up:
+            self._evidence_truncated.inc(sum(1 for selection in selections if selection.truncated))
+
+    def _pinned_for(self, event: LiveEvent) -> List[RetrievedChunk]:
+        if self._pinned is None:
+            return []
+        with stage("pinned"):
+            return self._pinned.resolve(event.detected_store_id, event.customer_id)
+
+    @staticmethod
+    def _without_pinned(
+        candidates: List[RetrievedChunk], pinned: List[RetrievedChunk]
+    ) -> List[RetrievedChunk]:
+        """Drop dense hits that are already pinned so rerank pairs go to new chunks."""
+
+        if not pinned:
+            return candidates
+        pinned_ids = {chunk.chunk.chunk_id for chunk in pinned}
+        return [chunk for chunk in candidates if chunk.chunk.chunk_id not in pinned_ids]
+
+    def _retrieve(self, event: LiveEvent, query: str, cache_key: str) -> List[RetrievedChunk]:
+        if not self._settings.partitioned_retrieval:
+            return self._retriever.search(
+                query, self._settings.retrieval_k, cache_key=cache_key
+            )
+        return self._retriever.search_partitioned(
+            query, self._partitions(event), cache_key=cache_key
+        )
+
+    def _fuse_lexical(
+        self, dense: List[RetrievedChunk], event: LiveEvent, summary: CustomerSummary
+    ) -> List[RetrievedChunk]:
+        """Reciprocal-rank fuse the dense hits with BM25 hits when hybrid retrieval is on."""
+
+        if self._sparse_index is None:
+            return dense
+        with stage("lexical"):
+            rows, _ = self._sparse_index.search(
+                self._query_builder.lexical(event, summary), self._settings.sparse_k
+            )
+            lexical = [
+                RetrievedChunk(chunk=self._chunk_store[int(row)], score=0.0, rank=rank)
+                for rank, row in enumerate(rows, start=1)
+            ]
+            return reciprocal_rank_fusion(
+                [dense, lexical],
+                limit=max(len(dense), self._settings.retrieval_k),
+                k=self._settings.rrf_k,
+                calibrate_to=dense,
+            )
+
+    def _partitions(self, event: LiveEvent) -> List[RetrievalPartition]:
+        partitions = [
+            RetrievalPartition(top_k=self._settings.global_partition_k),
+            RetrievalPartition(
+                top_k=self._settings.customer_partition_k,
+                customer_id=event.customer_id,
+            ),
+        ]
+        if event.detected_store_id:
+            partitions.append(
+                RetrievalPartition(
+                    top_k=self._settings.store_partition_k,
+                    store_id=event.detected_store_id,
+                )
+            )
+        return partitions
+
+    def _batch_blocks(self, events: Sequence[LiveEvent]) -> Iterator[List[_BatchItem]]:
+        """Prepared blocks of batch items, computed lazily one block at a time."""
+
+        block_size = max(self._settings.batch_block_size, 1)
+        for offset in range(0, len(events), block_size):
+            items = [
+                _BatchItem(index=offset + position, event=event)
+                for position, event in enumerate(events[offset : offset + block_size])
+            ]
+            try:
+                self._prepare_block(items)
+            except Exception as exc:  # the block fails as a whole, the batch goes on
+                for item in items:
+                    item.error = exc
+                    item.prompt = None
+            yield items
+
+    def _prepare_block(self, items: List[_BatchItem]) -> None:
+        # Batched stages are attributed to every item of the block.
+        with collect_timings(*(item.timings for item in items)):
+            with stage("summary"):
+                summaries = self._summary_service.summarize_many(
+                    item.event.customer_id for item in items
+                )
+            with stage("locate"):
+                located = self._locate_many([item.event for item in items])
+            for item, summary, (event, nearby) in zip(items, summaries, located):
+                item.summary, item.event, item.nearby = summary, event, nearby
+
+            lookups = self._lookup_responses([item.event for item in items])
+            todo: List[_BatchItem] = []
+            for item, lookup in zip(items, lookups):
+                item.lookup = lookup
+                if lookup is not None and lookup[2] is not None:
+                    item.cached = lookup[2]
+                else:
+                    todo.append(item)
+            if not todo:
+                return
+
+            selections = self._select_evidence_many(
+                [item.event for item in todo],
+                [item.summary for item in todo],
+                [item.nearby for item in todo],
+            )
+            with stage("prompt"):
+                for item, evidence in zip(todo, selections):
+                    item.prompt = self._prompt_builder.build(
+                        item.event, item.summary, evidence, item.nearby
+                    )
+
+    def _complete_item(
+        self, item: _BatchItem, debug: bool
+    ) -> Tuple[int, Union[RecommendationResponse, Exception]]:
+        try:
+            with collect_timings(item.timings):
+                with stage("llm"):
+                    llm_output = self._llm.generate(item.prompt, timeout=self._settings.llm_timeout_s)
+                with stage("validate"):
+                    item.parsed = self._parse(llm_output)
+            self._store_response(item.lookup, item.parsed)
+        except Exception as exc:
+            item.error = exc
+        return item.index, self._finish_item(item, debug)
+
+    async def _acomplete_item(
+        self, item: _BatchItem, debug: bool
+    ) -> Tuple[int, Union[RecommendationResponse, Exception]]:
+        try:
+            with collect_timings(item.timings):
+                with stage("llm"):
+                    llm_output = await self._llm.agenerate(
+                        item.prompt, timeout=self._settings.llm_timeout_s
+                    )
+                with stage("validate"):
+                    item.parsed = self._parse(llm_output)
+            self._store_response(item.lookup, item.parsed)
+        except Exception as exc:
+            item.error = exc
+        return item.index, self._finish_item(item, debug)
+
+    def _finish_item(
+        self, item: _BatchItem, debug: bool
+    ) -> Union[RecommendationResponse, Exception]:
+        elapsed_s = time.perf_counter() - item.started
+        if item.error is not None:
+            self._record_request(item.timings, elapsed_s, self._outcome(item.error))
+            return item.error
+        self._record_request(item.timings, elapsed_s, "ok")
+        return self._response(
+            int(elapsed_s * 1000),
+            item.cached if item.cached is not None else item.parsed,
+            item.timings if debug else None,
+            cached=item.cached is not None,
+        )
+
+    def _check_alignment(self) -> None:
+        """Refuse to serve from a bundle whose loaded parts disagree with its manifest."""
+
+        counts = {
+            "index": len(self._retriever),
+            "chunks": len(self._chunk_store),
+            "orders": len(self._order_history),
+            "customers": len(self._summary_service),
+            "stores": len(self._store_locator),
+        }
+        if self.bundle is not None:
+            self.bundle.check_rows(**counts)
+            logger.info("Serving bundle %s (%s)", self.bundle.bundle_id, self.bundle.directory)
+        elif counts["index"] != counts["chunks"]:
+            # Loose dataset files: keep the previous behaviour but make the drift visible.
+            logger.warning(
+                "FAISS index has %d vectors but the chunk store has %d rows; "
+                "results may cite the wrong chunks. Build a serving bundle to enforce alignment.",
+                counts["index"],
+                counts["chunks"],
+            )
+
+    def _timed_load(self, name: str, factory: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        started = time.perf_counter()
+        component = factory(*args, **kwargs)
+        self.load_timings_ms[name] = (time.perf_counter() - started) * 1000.0
+        logger.info("Loaded %s in %.0f ms", name, self.load_timings_ms[name])
+        return component
+
+    def _build_llm_backend(self) -> LLMBackend:
+        backend = self._settings.llm_backend
+        if backend == "stub":
+            return StubLLMClient(latency_ms=self._settings.stub_llm_latency_ms)
+        if backend == "gemini":
+            return GeminiClient(
+                api_key=self._settings.gemini_api_key,
+                model_name=self._settings.gemini_model,
+            )
+        raise ValueError(f"Unknown llm_backend '{backend}'. Expected 'gemini' or 'stub'.")
+
+    def _register_metrics(self) -> None:
+        self._stage_seconds = self.metrics.histogram(
+            "stage_duration_seconds", "Time spent per pipeline stage."
+        )
+        self._request_seconds = self.metrics.histogram(
+            "request_duration_seconds", "End-to-end recommendation latency."
+        )
+        self._requests = self.metrics.counter(
+            "requests_total", "Recommendations handled, by outcome."
+        )
+        self._evidence_truncated = self.metrics.counter(
+            "evidence_truncated_total", "Evidence selections cut short by the prompt budget."
+        )
+        self._validation_failures = self.metrics.counter(
+            "validation_failures_total", "LLM outputs rejected by the response validator."
+        )
+        self.metrics.sampled(
+            "cache_hits_total",
+            "Cache hits, by cache.",
+            lambda: [({"cache": name}, stats["hits"]) for name, stats in self.cache_stats().items()],
+            kind="counter",
+        )
+        self.metrics.sampled(
+            "cache_misses_total",
+            "Cache misses, by cache.",
+            lambda: [({"cache": name}, stats["misses"]) for name, stats in self.cache_stats().items()],
+            kind="counter",
+        )
+        for name, documentation in (
+            ("retries", "LLM calls retried after a failure."),
+            ("hedges", "Hedged LLM requests fired."),
+            ("hedge_wins", "Hedged LLM requests that answered first."),
+            ("failures", "LLM calls that failed after retries or hit the deadline."),
+        ):
+            self.metrics.sampled(
+                f"llm_{name}_total",
+                documentation,
+                lambda name=name: [({}, self._llm.stats()[name])],
+                kind="counter",
+            )
+        self.metrics.sampled(
+            "llm_in_flight",
+            "LLM calls currently in flight.",
+            lambda: [({}, self._llm.stats()["in_flight"])],
+        )
+        self.metrics.sampled(
+            "rerank_path_total",
+            "Evidence selections by rerank path (full, margin_skip, cascade, budget_trim, budget_skip).",
+            lambda: [
+                ({"path": path}, self._adaptive_reranker.stats()[f"path_{path}"]) for path in RERANK_PATHS
+            ],
+            kind="counter",
+        )
+        self.metrics.sampled(
+            "rerank_pairs_total",
+            "Cross-encoder pairs: scored by the model, served from the score cache, skipped by the "
+            "adaptive policy, or scored by background shadow checks.",
+            lambda: [
+                ({"outcome": outcome}, self._adaptive_reranker.stats()[f"pairs_{outcome}"])
+                for outcome in ("scored", "cached", "skipped", "shadow")
+            ],
+            kind="counter",
+        )
+        self.metrics.sampled(
+            "batch_mean_occupancy",
+            "Mean fill ratio of model micro-batches, by batcher.",
+            lambda: [
+                ({"batcher": name}, stats["mean_occupancy"])
+                for name, stats in self.batching_stats().items()
+                if stats
+            ],
+        )
+
+    @contextmanager
+    def _instrumented(self) -> Iterator[StageTimings]:
+        """Collect stage timings for one request and record them on exit.
+
+        Collectors already active in the caller (e.g. the replay benchmark)
+        keep receiving the same stages.
+        """
+
+        timings = StageTimings()
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            with collect_timings(*active_timings(), timings):
+                yield timings
+        except BaseException as exc:
+            outcome = self._outcome(exc)
+            raise
+        finally:
+            self._record_request(timings, time.perf_counter() - start, outcome)
+
+    def _record_request(self, timings: StageTimings, elapsed_s: float, outcome: str) -> None:
+        self._requests.inc(labels={"outcome": outcome})
+        self._request_seconds.observe(elapsed_s)
+        for name, elapsed_ms in timings.stages.items():
+            self._stage_seconds.observe(elapsed_ms / 1000.0, labels={"stage": name})
+
+    @staticmethod
+    def _outcome(exc: BaseException) -> str:
+        if isinstance(exc, ValueError):
+            return "invalid"
+        if isinstance(exc, asyncio.TimeoutError):
+            return "timeout"
+        if isinstance(exc, (asyncio.CancelledError, GeneratorExit)):
+            return "cancelled"
+        return "error"
+
+    @staticmethod
+    def _add_stage(collectors: Sequence[StageTimings], name: str, elapsed_ms: float) -> None:
+        for collector in collectors:
+            collector.add(name, elapsed_ms)
+
+    def _parse(self, llm_output: str) -> Dict[str, Any]:
+        try:
+            return self._validator.parse(llm_output)
+        except ValueError:
+            self._validation_failures.inc()
+            raise
+
+    @staticmethod
+    def _response(
+        latency_ms: int,
+        parsed: Dict[str, Any],
+        timings: Optional[StageTimings],
+        cached: bool = False,
+    ) -> RecommendationResponse:
+        timings_ms = (
+            {name: round(elapsed, 3) for name, elapsed in timings.stages.items()}
+            if timings is not None
+            else None
+        )
+        return RecommendationResponse(
+            latency_ms=latency_ms, cached=cached, timings_ms=timings_ms, **parsed
+        )
 
-        prompt = self._prompt_builder.build(event, summary, evidence)
-        llm_output = self._llm.generate(prompt)
-        parsed = self._validator.parse(llm_output)
+    def _request_slot(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore binds to the running event loop.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._settings.max_concurrent_requests)
+        return self._semaphore
 
-        latency_ms = int((time.perf_counter() - start) * 1000)
-        return RecommendationResponse(latency_ms=latency_ms, **parsed)
+    async def _run_cpu(self, func: Callable[..., T], *args) -> T:
+        loop = asyncio.get_running_loop()
+        # run_in_executor does not propagate contextvars (stage timings) by itself.
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, context.run, func, *args)
 
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+# (query signature, chunk_id)
+_Key = Tuple[str, str]
+
+
+def query_signature(query: str, cache_key: Optional[str] = None) -> str:
+    """Short digest naming a query for the pair-score cache.
+
+    ``cache_key`` (``QueryBuilder.cache_key``) already folds casing, spacing,
+    weather wording and GPS jitter together; without it the raw query is
+    lower-cased and whitespace-collapsed.
+    """
+
+    canonical = cache_key if cache_key is not None else " ".join(query.lower().split())
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def text_fingerprint(text: str) -> int:
+    """64-bit digest of a chunk's text; a changed chunk gets a different value."""
+
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class RerankScoreCache:
+    """Thread-safe LRU cache of cross-encoder scores per (query signature, chunk).
+
+    Each entry remembers a fingerprint of the chunk text it was scored
+    against, so a chunk whose text changes (a re-ingested store PDF or an
+    edited ``stores.csv`` row) misses and is rescored rather than served a
+    stale score. Scores depend on the model, so ``save`` records
+    ``model_id`` and ``load`` ignores a file written for another model or
+    backend.
+    """
+
+    def __init__(self, max_entries: int, model_id: str = "", path: Optional[Path] = None):
+        self._max_entries = max_entries
+        self._model_id = model_id
+        self._path = path
+        self._entries: "OrderedDict[_Key, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidated = 0
+        if path is not None and path.exists():
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(
+        self, signature: str, chunk_ids: Sequence[str], texts: Sequence[str]
+    ) -> Tuple[np.ndarray, List[int]]:
+        """Cached scores for ``chunk_ids`` (NaN where missing) and the missing positions."""
+
+        scores = np.full(len(chunk_ids), np.nan, dtype=np.float32)
+        missing: List[int] = []
+        with self._lock:
+            for pos, (chunk_id, text) in enumerate(zip(chunk_ids, texts)):
+                key = (signature, chunk_id)
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] != text_fingerprint(text):
+                    del self._entries[key]
+                    self._invalidated += 1
+                    entry = None
+                if entry is None:
+                    missing.append(pos)
+                    continue
+                self._entries.move_to_end(key)
+                scores[pos] = entry[1]
+            self._hits += len(chunk_ids) - len(missing)
+            self._misses += len(missing)
+        return scores, missing
+
+    def store(
+        self,
+        signature: str,
+        chunk_ids: Sequence[str],
+        texts: Sequence[str],
+        scores: Sequence[float],
+    ) -> None:
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            for chunk_id, text, score in zip(chunk_ids, texts, scores):
+                key = (signature, chunk_id)
+                self._entries[key] = (text_fingerprint(text), float(score))
+                self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "invalidated": self._invalidated,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+            self._invalidated = 0
+
+    def save(self, path: Optional[Path] = None) -> None:
+        target = path or self._path
+        if target is None:
+            return
+        with self._lock:
+            entries = [
+                (signature, chunk_id, fingerprint, score)
+                for (signature, chunk_id), (fingerprint, score) in self._entries.items()
+            ]
+        if not entries:
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        signatures, chunk_ids, fingerprints, scores = zip(*entries)
+        # np.savez appends ".npz" to bare paths, so write through a handle.
+        with target.open("wb") as handle:
+            np.savez(
+                handle,
+                version=np.array(_FORMAT_VERSION),
+                model_id=np.array(self._model_id),
+                signatures=np.array(signatures, dtype=str),
+                chunk_ids=np.array(chunk_ids, dtype=str),
+                fingerprints=np.array(fingerprints, dtype=np.uint64),
+                scores=np.array(scores, dtype=np.float32),
+            )
+
+    def load(self, path: Path) -> None:
+        try:
+            with np.load(path, allow_pickle=False) as payload:
+                version = int(payload["version"])
+                model_id = str(payload["model_id"])
+                signatures = payload["signatures"].tolist()
+                chunk_ids = payload["chunk_ids"].tolist()
+                fingerprints = payload["fingerprints"].tolist()
+                scores = payload["scores"].tolist()
+        except (OSError, KeyError, ValueError) as exc:
+            logger.warning("Ignoring unreadable rerank score cache %s: %s", path, exc)
+            return
+        if version != _FORMAT_VERSION or model_id != self._model_id:
+            logger.info("Ignoring rerank score cache %s written for '%s'", path, model_id)
+            return
+
+        with self._lock:
+            for signature, chunk_id, fingerprint, score in zip(signatures, chunk_ids, fingerprints, scores):
+                self._entries[(signature, chunk_id)] = (int(fingerprint), float(score))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
@@ -1,36 +1,237 @@
 from __future__ import annotations
 
-from typing import List
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from sentence_transformers import CrossEncoder
+import numpy as np
 
 from ..models import RetrievedChunk
+from .batching import MicroBatcher
+from .model_backends import load_cross_encoder
+from .rerank_cache import RerankScoreCache, query_signature
+
+_Pair = Tuple[str, str]
 
 
 class CrossEncoderReranker:
-    """Cross-encoder reranker that refines FAISS candidates."""
+    """Cross-encoder reranker that refines FAISS candidates.
+
+    When ``batch_max_pairs`` is greater than one, pairs from concurrent
+    ``rerank`` calls are merged by a shared micro-batcher so in-flight requests
+    share forward passes. Each merged batch is sorted by length and fed to the
+    model in buckets of ``bucket_size`` pairs, which keeps padding per forward
+    pass small.
+
+    With a ``score_cache``, pairs already scored for the same query
+    signature and unchanged chunk text are served from it and only the
+    misses reach the model.
+
+    ``pair_cost_ms`` tracks the model's cost per scored pair, timed around
+    the forward passes only, so batcher queueing and cache hits never
+    inflate or dilute it.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_max_pairs: int = 1,
+        batch_max_wait_ms: float = 0.0,
+        bucket_size: int = 16,
+        model_backend: str = "torch",
+        model_export_dir: Optional[Path] = None,
+        model_quantization: str = "avx2",
+        score_cache: Optional[RerankScoreCache] = None,
+    ):
+        self._model = load_cross_encoder(model_name, model_backend, model_export_dir, model_quantization)
+        self._score_cache = score_cache
+        self._bucket_size = max(bucket_size, 1)
+        self._pair_ms: Optional[float] = None
+        self._cost_lock = threading.Lock()
+        self._batcher: Optional[MicroBatcher[List[_Pair], np.ndarray]] = None
+        if batch_max_pairs > 1:
+            self._batcher = MicroBatcher(
+                self._score_requests,
+                max_batch_size=batch_max_pairs,
+                max_wait_ms=batch_max_wait_ms,
+                name="cross-encoder-batcher",
+                weight=len,
+            )
+
+    def rerank(
+        self,
+        query: str,
+        candidates: List[RetrievedChunk],
+        top_k: int,
+        cache_key: Optional[str] = None,
+    ) -> List[RetrievedChunk]:
+        """Score the top ``top_k`` candidates against ``query``, best first.
 
-    def __init__(self, model_name: str):
-        self._model = CrossEncoder(model_name)
+        ``cache_key`` is the canonical form of the query (see
+        ``QueryBuilder.cache_key``) used to share cached pair scores.
+        """
+
+        return self.rerank_counted(query, candidates, top_k, cache_key=cache_key)[0]
+
+    def rerank_counted(
+        self,
+        query: str,
+        candidates: List[RetrievedChunk],
+        top_k: int,
+        cache_key: Optional[str] = None,
+    ) -> Tuple[List[RetrievedChunk], int]:
+        """``rerank`` plus the number of pairs actually sent to the model (cache misses)."""
 
-    def rerank(self, query: str, candidates: List[RetrievedChunk], top_k: int) -> List[RetrievedChunk]:
         if not candidates:
-            return []
-
-        slice_k = min(top_k, len(candidates))
-        pairs = [(query, candidate.chunk.text) for candidate in candidates[:slice_k]]
-        scores = self._model.predict(pairs)
-
-        reranked: List[RetrievedChunk] = []
-        for candidate, score in zip(candidates[:slice_k], scores):
-            reranked.append(
-                RetrievedChunk(
-                    chunk=candidate.chunk,
-                    score=float(score),
-                    rank=candidate.rank,
-                )
+            return [], 0
+
+        pool = candidates[: min(top_k, len(candidates))]
+        signature, scores, missing = self._lookup(query, pool, cache_key)
+        if missing:
+            pairs = [(query, pool[pos].chunk.text) for pos in missing]
+            if self._batcher is not None:
+                fresh = self._batcher.submit(pairs).result()
+            else:
+                fresh = self._score_requests([pairs])[0]
+            self._fill(signature, pool, scores, missing, fresh)
+        return self._apply_scores(pool, scores), len(missing)
+
+    def rerank_many(
+        self,
+        queries: Sequence[str],
+        candidates: Sequence[List[RetrievedChunk]],
+        top_k: int,
+        cache_keys: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[List[RetrievedChunk]]:
+        """Rerank several candidate lists with one length-bucketed scoring pass."""
+
+        return self.rerank_many_counted(queries, candidates, top_k, cache_keys=cache_keys)[0]
+
+    def rerank_many_counted(
+        self,
+        queries: Sequence[str],
+        candidates: Sequence[List[RetrievedChunk]],
+        top_k: int,
+        cache_keys: Optional[Sequence[Optional[str]]] = None,
+        use_cache: bool = True,
+    ) -> Tuple[List[List[RetrievedChunk]], List[int]]:
+        """``rerank_many`` plus, per list, the number of pairs sent to the model.
+
+        With ``use_cache=False`` every pair is scored by the model and the
+        score cache is neither read nor written (nor are its stats touched).
+        """
+
+        keys = cache_keys if cache_keys is not None else [None] * len(queries)
+        pools = [chunks[: min(top_k, len(chunks))] for chunks in candidates]
+        lookups = [
+            self._lookup(query, pool, key, use_cache)
+            for query, pool, key in zip(queries, pools, keys)
+        ]
+        fresh = self._score_requests(
+            [
+                [(query, pool[pos].chunk.text) for pos in missing]
+                for query, pool, (_, _, missing) in zip(queries, pools, lookups)
+            ]
+        )
+        results: List[List[RetrievedChunk]] = []
+        for pool, (signature, scores, missing), request_scores in zip(pools, lookups, fresh):
+            if missing:
+                self._fill(signature, pool, scores, missing, request_scores)
+            results.append(self._apply_scores(pool, scores))
+        return results, [len(missing) for _, _, missing in lookups]
+
+    @property
+    def pair_cost_ms(self) -> Optional[float]:
+        """Moving average of model milliseconds per scored pair; ``None`` until measured."""
+
+        return self._pair_ms
+
+    def batching_stats(self) -> Dict[str, float]:
+        return self._batcher.stats() if self._batcher is not None else {}
+
+    def reset_batching_stats(self) -> None:
+        if self._batcher is not None:
+            self._batcher.reset_stats()
+
+    def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.close()
+
+    def _lookup(
+        self,
+        query: str,
+        pool: List[RetrievedChunk],
+        cache_key: Optional[str],
+        use_cache: bool = True,
+    ) -> Tuple[Optional[str], np.ndarray, List[int]]:
+        """``(signature, scores, missing)``; ``scores`` holds NaN at the ``missing`` positions.
+
+        ``signature`` is ``None`` when the cache is not used, so ``_fill`` stores nothing.
+        """
+
+        if self._score_cache is None or not use_cache:
+            return None, np.full(len(pool), np.nan, dtype=np.float32), list(range(len(pool)))
+        signature = query_signature(query, cache_key)
+        scores, missing = self._score_cache.lookup(
+            signature,
+            [candidate.chunk.chunk_id for candidate in pool],
+            [candidate.chunk.text for candidate in pool],
+        )
+        return signature, scores, missing
+
+    def _fill(
+        self,
+        signature: Optional[str],
+        pool: List[RetrievedChunk],
+        scores: np.ndarray,
+        missing: List[int],
+        fresh: np.ndarray,
+    ) -> None:
+        scores[missing] = fresh
+        if self._score_cache is not None and signature is not None:
+            self._score_cache.store(
+                signature,
+                [pool[pos].chunk.chunk_id for pos in missing],
+                [pool[pos].chunk.text for pos in missing],
+                fresh,
             )
 
+    @staticmethod
+    def _apply_scores(candidates: List[RetrievedChunk], scores: np.ndarray) -> List[RetrievedChunk]:
+        reranked = [
+            RetrievedChunk(chunk=candidate.chunk, score=float(score), rank=candidate.rank)
+            for candidate, score in zip(candidates, scores)
+        ]
         reranked.sort(key=lambda c: c.score, reverse=True)
         return reranked
 
+    def _score_requests(self, requests: Sequence[List[_Pair]]) -> List[np.ndarray]:
+        flat: List[_Pair] = [pair for pairs in requests for pair in pairs]
+        if not flat:
+            return [np.empty(0, dtype=np.float32) for _ in requests]
+
+        # Length-sorted order means each bucket pads to similar sequence lengths.
+        order = sorted(range(len(flat)), key=lambda i: len(flat[i][0]) + len(flat[i][1]))
+        started = time.perf_counter()
+        sorted_scores = np.asarray(
+            self._model.predict([flat[i] for i in order], batch_size=self._bucket_size),
+            dtype=np.float32,
+        )
+        self._observe_cost((time.perf_counter() - started) * 1000.0 / len(flat))
+        scores = np.empty(len(flat), dtype=np.float32)
+        scores[order] = sorted_scores
+
+        results: List[np.ndarray] = []
+        offset = 0
+        for pairs in requests:
+            results.append(scores[offset : offset + len(pairs)])
+            offset += len(pairs)
+        return results
+
+    def _observe_cost(self, per_pair_ms: float) -> None:
+        with self._cost_lock:
+            # Exponential moving average; adapts to load without storing samples.
+            self._pair_ms = (
+                per_pair_ms if self._pair_ms is None else 0.9 * self._pair_ms + 0.1 * per_pair_ms
+            )
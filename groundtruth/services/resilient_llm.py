@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Set
+
+import numpy as np
+
+from .llm_client import LLMBackend
+
+logger = logging.getLogger(__name__)
+
+
+class ResilientLLMClient:
+    """Deadline, retry, hedging and concurrency policy around an ``LLMBackend``.
+
+    Every call gets a deadline (the caller's timeout, capped by
+    ``deadline_s``) that covers all attempts. Failed attempts are retried up
+    to ``max_retries`` times with full-jitter exponential backoff while time
+    remains. With ``hedge_percentile`` set, an async call that is still
+    running after that percentile of recent latencies fires a second,
+    identical request and the first answer wins. Semaphores cap in-flight
+    calls on both the sync and async paths.
+
+    Hedging applies to ``agenerate`` only; streams are retried only until
+    their first fragment, since partial output cannot be replayed.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        max_concurrency: int = 16,
+        deadline_s: float = 30.0,
+        max_retries: int = 2,
+        backoff_base_s: float = 0.2,
+        backoff_max_s: float = 2.0,
+        hedge_percentile: float = 0.0,
+        hedge_min_samples: int = 20,
+        latency_window: int = 256,
+    ):
+        self._backend = backend
+        self._max_concurrency = max(max_concurrency, 1)
+        self._deadline_s = deadline_s
+        self._max_retries = max(max_retries, 0)
+        self._backoff_base_s = backoff_base_s
+        self._backoff_max_s = backoff_max_s
+        self._hedge_percentile = hedge_percentile
+        self._hedge_min_samples = hedge_min_samples
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self._sync_slots = threading.BoundedSemaphore(self._max_concurrency)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {
+            "calls": 0,
+            "retries": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "failures": 0,
+            "in_flight": 0,
+        }
+
+    @property
+    def backend(self) -> LLMBackend:
+        return self._backend
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        deadline = time.monotonic() + self._budget(timeout)
+        with self._sync_slots, _InFlight(self):
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._count("failures")
+                    raise asyncio.TimeoutError("LLM deadline exceeded.")
+                started = time.monotonic()
+                try:
+                    text = self._backend.generate(prompt, timeout=remaining)
+                except Exception as exc:
+                    delay = self._retry_delay(attempt, deadline - time.monotonic(), exc)
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+                self._observe(time.monotonic() - started)
+                return text
+
+    async def agenerate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._budget(timeout)
+        async with self._async_slot(), _InFlight(self):
+            attempt = 0
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self._count("failures")
+                    raise asyncio.TimeoutError("LLM deadline exceeded.")
+                try:
+                    return await asyncio.wait_for(self._hedged(prompt, remaining), timeout=remaining)
+                except asyncio.TimeoutError:
+                    self._count("failures")
+                    raise
+                except Exception as exc:
+                    delay = self._retry_delay(attempt, deadline - loop.time(), exc)
+                    attempt += 1
+                    await asyncio.sleep(delay)
+
+    async def astream(self, prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._budget(timeout)
+        async with self._async_slot(), _InFlight(self):
+            attempt = 0
+            while True:
+                started = loop.time()
+                emitted = False
+                try:
+                    async for fragment in self._backend.astream(
+                        prompt, timeout=max(deadline - loop.time(), 0.0)
+                    ):
+                        emitted = True
+                        yield fragment
+                    self._observe(loop.time() - started)
+                    return
+                except asyncio.TimeoutError:
+                    self._count("failures")
+                    raise
+                except Exception as exc:
+                    if emitted:
+                        self._count("failures")
+                        raise
+                    delay = self._retry_delay(attempt, deadline - loop.time(), exc)
+                    attempt += 1
+                    await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats: Dict[str, float] = dict(self._counts)
+            latencies = list(self._latencies)
+        if latencies:
+            p50, p95 = np.percentile(latencies, [50, 95])
+            stats["latency_p50_ms"] = float(p50) * 1000.0
+            stats["latency_p95_ms"] = float(p95) * 1000.0
+        hedge_after = self._hedge_delay()
+        stats["hedge_after_ms"] = hedge_after * 1000.0 if hedge_after is not None else 0.0
+        return stats
+
+    async def _hedged(self, prompt: str, remaining: float) -> str:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        primary = asyncio.ensure_future(self._backend.agenerate(prompt, timeout=remaining))
+        tasks: Set[asyncio.Future] = {primary}
+        hedge_after = self._hedge_delay()
+        try:
+            if hedge_after is not None and hedge_after < remaining:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done:
+                    self._count("hedges")
+                    tasks.add(
+                        asyncio.ensure_future(
+                            self._backend.agenerate(prompt, timeout=remaining - hedge_after)
+                        )
+                    )
+
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._count("hedge_wins")
+                        self._observe(loop.time() - started)
+                        return task.result()
+                    error = task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _retry_delay(self, attempt: int, remaining: float, exc: Exception) -> float:
+        """Backoff before the next attempt; re-raises when retries or time run out."""
+
+        if attempt >= self._max_retries:
+            self._count("failures")
+            raise exc
+        # Full jitter keeps retries from synchronizing across requests.
+        delay = random.uniform(0.0, min(self._backoff_max_s, self._backoff_base_s * 2 ** attempt))
+        if delay >= remaining:
+            self._count("failures")
+            raise exc
+        self._count("retries")
+        logger.warning("LLM call failed (%s); retry %d in %.0f ms", exc, attempt + 1, delay * 1000)
+        return delay
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self._hedge_percentile <= 0:
+            return None
+        with self._lock:
+            if len(self._latencies) < self._hedge_min_samples:
+                return None
+            latencies = list(self._latencies)
+        return float(np.percentile(latencies, self._hedge_percentile))
+
+    def _budget(self, timeout: Optional[float]) -> float:
+        if timeout is None:
+            return self._deadline_s
+        return min(timeout, self._deadline_s)
+
+    def _observe(self, elapsed_s: float) -> None:
+        with self._lock:
+            self._latencies.append(elapsed_s)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += amount
+
+    def _async_slot(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore binds to the running event loop.
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self._max_concurrency)
+        return self._async_slots
+
+
+class _InFlight:
+    """Counts calls and tracks in-flight calls; usable with ``with`` and ``async with``."""
+
+    def __init__(self, client: ResilientLLMClient):
+        self._client = client
+
+    def __enter__(self) -> None:
+        self._client._count("calls")
+        self._client._count("in_flight")
+
+    def __exit__(self, *exc_info) -> None:
+        self._client._count("in_flight", -1)
+
+    async def __aenter__(self) -> None:
+        self.__enter__()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.__exit__(*exc_info)
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+@dataclass(slots=True)
+class _CachedResponse:
+    embedding: np.ndarray
+    payload: Dict[str, Any]
+    stored_at: float
+
+
+class SemanticResponseCache:
+    """Thread-safe cache of validated LLM responses for near-duplicate events.
+
+    Entries are grouped by an exact context key (customer, store, weather
+    bucket, daypart); within a group, a lookup returns the response whose
+    message embedding is most similar to the new one, provided the cosine
+    similarity reaches ``threshold`` and every cited source still passes
+    ``is_current``. Memory is bounded by ``max_entries`` responses in total
+    and ``max_per_key`` per group, evicting least recently used first.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_s: float,
+        threshold: float = 0.92,
+        max_per_key: int = 8,
+    ):
+        self._max_entries = max_entries
+        self._ttl_s = ttl_s
+        self._threshold = threshold
+        self._max_per_key = max(max_per_key, 1)
+        self._groups: "OrderedDict[str, List[_CachedResponse]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get(
+        self,
+        key: str,
+        embedding: np.ndarray,
+        is_current: Callable[[Sequence[str]], bool],
+    ) -> Optional[Dict[str, Any]]:
+        """Best matching cached payload for ``key``, or ``None``.
+
+        ``embedding`` must be L2-normalized so the dot product is the cosine.
+        Matches citing sources that are no longer current are dropped.
+        """
+
+        with self._lock:
+            entries = self._groups.get(key)
+            if entries:
+                self._drop_expired(key, entries)
+                entries = self._groups.get(key)
+            if not entries:
+                self._misses += 1
+                return None
+
+            scores = np.stack([entry.embedding for entry in entries]) @ embedding
+            match: Optional[_CachedResponse] = None
+            stale: List[_CachedResponse] = []
+            for pos in np.argsort(-scores):
+                if scores[pos] < self._threshold:
+                    break
+                entry = entries[pos]
+                if is_current(entry.payload.get("sources", [])):
+                    match = entry
+                    break
+                stale.append(entry)
+
+            for entry in stale:
+                self._remove(key, entry)
+            self._stale += len(stale)
+            if match is None:
+                self._misses += 1
+                return None
+            if key in self._groups:
+                self._groups.move_to_end(key)
+            self._hits += 1
+            return dict(match.payload)
+
+    def put(self, key: str, embedding: np.ndarray, payload: Dict[str, Any]) -> None:
+        if self._max_entries <= 0:
+            return
+        entry = _CachedResponse(
+            embedding=np.asarray(embedding, dtype=np.float32),
+            payload=dict(payload),
+            stored_at=time.time(),
+        )
+        with self._lock:
+            entries = self._groups.setdefault(key, [])
+            entries.append(entry)
+            self._size += 1
+            self._groups.move_to_end(key)
+            if len(entries) > self._max_per_key:
+                entries.pop(0)
+                self._size -= 1
+            while self._size > self._max_entries:
+                _, evicted = self._groups.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": self._size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "stale": self._stale,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+            self._stale = 0
+
+    def _drop_expired(self, key: str, entries: List[_CachedResponse]) -> None:
+        if self._ttl_s <= 0:
+            return
+        cutoff = time.time() - self._ttl_s
+        live = [entry for entry in entries if entry.stored_at >= cutoff]
+        if len(live) == len(entries):
+            return
+        self._size -= len(entries) - len(live)
+        if live:
+            self._groups[key] = live
+        else:
+            del self._groups[key]
+
+    def _remove(self, key: str, entry: _CachedResponse) -> None:
+        entries = self._groups.get(key)
+        if entries is None:
+            return
+        entries[:] = [other for other in entries if other is not entry]
+        self._size -= 1
+        if not entries:
+            del self._groups[key]
@@ -1,35 +1,281 @@
 from __future__ import annotations
 
-from typing import List
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
-from ..models import RetrievedChunk
+from ..models import RetrievalPartition, RetrievedChunk
+from .batching import MicroBatcher
 from .chunk_store import ChunkStore
+from .embedding_cache import EmbeddingCache
+from .faiss_index import prepare_for_serving, read_index, search_parameters
+from .instrumentation import stage
+from .model_backends import load_encoder
+
+# (query embedding, distances, indices) for one query.
+_SearchHits = Tuple[np.ndarray, np.ndarray, np.ndarray]
+_SearchItem = Tuple[str, int, Optional[str]]
 
 
 class FaissRetriever:
-    """Lightweight FAISS retriever that returns scored chunk candidates."""
+    """Lightweight FAISS retriever that returns scored chunk candidates.
+
+    Any index written by ``Scripts/build_embeddings.py`` can be loaded (flat,
+    IVF-Flat, IVF-PQ or HNSW); ``nprobe`` and ``ef_search`` are the query-time
+    recall/latency knobs for the IVF and HNSW families respectively.
+    ``model_backend`` selects the query encoder runtime (see ``model_backends``).
+    """
 
     def __init__(
         self,
         index_path,
         chunk_store: ChunkStore,
         model_name: str,
+        batch_max_size: int = 1,
+        batch_max_wait_ms: float = 0.0,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        partition_exact_threshold: int = 4096,
+        nprobe: int = 16,
+        ef_search: int = 64,
+        mmap: bool = False,
+        model_backend: str = "torch",
+        model_export_dir: Optional[Path] = None,
+        model_quantization: str = "avx2",
     ):
         self._chunk_store = chunk_store
-        self._index = faiss.read_index(str(index_path))
-        self._encoder = SentenceTransformer(model_name)
+        self._nprobe = nprobe
+        self._ef_search = ef_search
+        self._index = prepare_for_serving(
+            read_index(index_path, mmap=mmap), nprobe=nprobe, ef_search=ef_search
+        )
+        self._encoder = load_encoder(model_name, model_backend, model_export_dir, model_quantization)
+        self._embedding_cache = embedding_cache
+        self._partition_exact_threshold = partition_exact_threshold
+        self._batcher: Optional[MicroBatcher[_SearchItem, _SearchHits]] = None
+        if batch_max_size > 1:
+            self._batcher = MicroBatcher(
+                self._search_batch,
+                max_batch_size=batch_max_size,
+                max_wait_ms=batch_max_wait_ms,
+                name="faiss-retriever-batcher",
+            )
+
+    def __len__(self) -> int:
+        return int(self._index.ntotal)
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        cache_key: Optional[str] = None,
+    ) -> List[RetrievedChunk]:
+        """Return the ``top_k`` nearest chunks for ``query``.
+
+        ``cache_key`` is the canonical form of the query (see
+        ``QueryBuilder.cache_key``); when given, the embedding is served from
+        and stored in the embedding cache.
+        """
+
+        _, distances, indices = self._submit((query, top_k, cache_key))
+        return self._to_chunks(distances, indices)
+
+    def search_partitioned(
+        self,
+        query: str,
+        partitions: Sequence[RetrievalPartition],
+        cache_key: Optional[str] = None,
+    ) -> List[RetrievedChunk]:
+        """Search several metadata partitions with a single query embedding.
+
+        Each partition contributes up to its own ``top_k`` hits (e.g. top 10
+        for the store, top 10 for the customer, top 10 globally). Chunks found
+        by more than one partition are kept once, and the merged list is
+        ordered by similarity.
+        """
+
+        global_k = max((p.top_k for p in partitions if p.is_global), default=0)
+        embedding, distances, indices = self._submit((query, global_k, cache_key))
+        return self._search_partitions(embedding, distances, indices, partitions)
+
+    def search_partitioned_many(
+        self,
+        queries: Sequence[str],
+        partitions: Sequence[Sequence[RetrievalPartition]],
+        cache_keys: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[List[RetrievedChunk]]:
+        """``search_partitioned`` for several queries with one encode and one global search."""
+
+        if not queries:
+            return []
+        keys = cache_keys if cache_keys is not None else [None] * len(queries)
+        items = [
+            (query, max((p.top_k for p in parts if p.is_global), default=0), key)
+            for query, parts, key in zip(queries, partitions, keys)
+        ]
+        return [
+            self._search_partitions(embedding, distances, indices, parts)
+            for (embedding, distances, indices), parts in zip(self._search_batch(items), partitions)
+        ]
+
+    def search_many(
+        self,
+        queries: Sequence[str],
+        top_k: int,
+        cache_keys: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[List[RetrievedChunk]]:
+        """Encode and search several queries in a single batched pass."""
+
+        if not queries:
+            return []
+        keys = cache_keys if cache_keys is not None else [None] * len(queries)
+        hits = self._search_batch(
+            [(query, top_k, key) for query, key in zip(queries, keys)]
+        )
+        return [self._to_chunks(distances, indices) for _, distances, indices in hits]
+
+    def embed(self, text: str, cache_key: Optional[str] = None) -> np.ndarray:
+        """L2-normalized embedding of ``text``, served from the cache when keyed.
+
+        Goes through the micro-batcher like ``search`` (as a zero-hit search),
+        so concurrent embeds and searches share encoder forward passes.
+        """
+
+        return self._submit((text, 0, cache_key))[0]
+
+    def embed_many(
+        self, texts: Sequence[str], cache_keys: Optional[Sequence[Optional[str]]] = None
+    ) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self._index.d), dtype=np.float32)
+        keys = cache_keys if cache_keys is not None else [None] * len(texts)
+        items = [(text, 0, key) for text, key in zip(texts, keys)]
+        if self._batcher is None:
+            return np.stack([embedding for embedding, _, _ in self._search_batch(items)])
+        futures = [self._batcher.submit(item) for item in items]
+        return np.stack([future.result()[0] for future in futures])
 
-    def search(self, query: str, top_k: int) -> List[RetrievedChunk]:
-        embedding = self._encoder.encode([query], convert_to_numpy=True)
+    def batching_stats(self) -> Dict[str, float]:
+        return self._batcher.stats() if self._batcher is not None else {}
+
+    def reset_batching_stats(self) -> None:
+        if self._batcher is not None:
+            self._batcher.reset_stats()
+
+    def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.close()
+
+    def _submit(self, item: _SearchItem) -> _SearchHits:
+        if self._batcher is not None:
+            return self._batcher.submit(item).result()
+        return self._search_batch([item])[0]
+
+    def _encode(self, queries: Sequence[str]) -> np.ndarray:
+        embedding = self._encoder.encode(list(queries), convert_to_numpy=True)
         embedding = embedding / np.linalg.norm(embedding, axis=1, keepdims=True)
+        return embedding.astype("float32")
+
+    def _embed(self, items: Sequence[_SearchItem]) -> np.ndarray:
+        cache = self._embedding_cache
+        vectors: List[Optional[np.ndarray]] = [
+            cache.get(key) if cache is not None and key else None
+            for _, _, key in items
+        ]
+        missing = [row for row, vector in enumerate(vectors) if vector is None]
+        if missing:
+            encoded = self._encode([items[row][0] for row in missing])
+            for row, vector in zip(missing, encoded):
+                vectors[row] = vector
+                key = items[row][2]
+                if cache is not None and key:
+                    cache.put(key, vector)
+        return np.stack(vectors).astype("float32")
+
+    def _search_batch(self, items: List[_SearchItem]) -> List[_SearchHits]:
+        with stage("encode"):
+            embeddings = self._embed(items)
+        max_k = max(top_k for _, top_k, _ in items)
+        if max_k <= 0:
+            no_distances = np.empty(0, dtype=np.float32)
+            no_indices = np.empty(0, dtype=np.int64)
+            return [(embeddings[row], no_distances, no_indices) for row in range(len(items))]
 
-        distances, indices = self._index.search(embedding.astype("float32"), top_k)
+        with stage("faiss"):
+            distances, indices = self._index.search(embeddings, max_k)
+        return [
+            (embeddings[row], distances[row, :top_k], indices[row, :top_k])
+            for row, (_, top_k, _) in enumerate(items)
+        ]
+
+    def _search_rows(
+        self, embedding: np.ndarray, rows: np.ndarray, top_k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k restricted to ``rows``.
+
+        Small partitions are scored exactly against their reconstructed
+        vectors; large ones go through FAISS with an ID selector so only
+        member vectors are compared.
+        """
+
+        k = min(top_k, rows.size)
+        with stage("faiss"):
+            if rows.size <= self._partition_exact_threshold:
+                scores = self._index.reconstruct_batch(rows) @ embedding
+                top = np.argpartition(-scores, k - 1)[:k] if k < rows.size else np.arange(rows.size)
+                top = top[np.argsort(-scores[top])]
+                return scores[top], rows[top]
+
+            params = search_parameters(
+                self._index,
+                nprobe=self._nprobe,
+                ef_search=self._ef_search,
+                selector=faiss.IDSelectorBatch(rows),
+            )
+            distances, indices = self._index.search(embedding[None, :], k, params=params)
+            return distances[0], indices[0]
+
+    def _search_partitions(
+        self,
+        embedding: np.ndarray,
+        distances: np.ndarray,
+        indices: np.ndarray,
+        partitions: Sequence[RetrievalPartition],
+    ) -> List[RetrievedChunk]:
+        best: Dict[int, float] = {}
+        self._merge_hits(best, distances, indices)
+        for partition in partitions:
+            if partition.is_global or partition.top_k <= 0:
+                continue
+            rows = self._chunk_store.rows_for(
+                source=partition.source,
+                store_id=partition.store_id,
+                customer_id=partition.customer_id,
+            )
+            if rows is None or rows.size == 0:
+                continue
+            part_distances, part_indices = self._search_rows(embedding, rows, partition.top_k)
+            self._merge_hits(best, part_distances, part_indices)
+
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        return self._to_chunks(
+            np.array([score for _, score in ranked], dtype=np.float32),
+            np.array([row for row, _ in ranked], dtype=np.int64),
+        )
+
+    @staticmethod
+    def _merge_hits(best: Dict[int, float], distances: np.ndarray, indices: np.ndarray) -> None:
+        for score, idx in zip(distances, indices):
+            idx = int(idx)
+            if idx < 0:
+                continue
+            if idx not in best or score > best[idx]:
+                best[idx] = float(score)
+
+    def _to_chunks(self, distances: np.ndarray, indices: np.ndarray) -> List[RetrievedChunk]:
         results: List[RetrievedChunk] = []
-        for rank, (score, idx) in enumerate(zip(distances[0], indices[0]), start=1):
+        for rank, (score, idx) in enumerate(zip(distances, indices), start=1):
             if idx < 0 or idx >= len(self._chunk_store):
                 continue
             results.append(
@@ -40,4 +286,3 @@ class FaissRetriever:
                 )
             )
         return results
-
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import faiss
+
+from ..models import ChunkRecord
+from .mapped_chunk_store import MappedChunkStore, write_mapped_chunk_store
+from .order_history import OrderHistoryStore, write_order_history
+from .sparse_index import BM25Index, write_bm25_index
+from .store_locator import StoreLocator
+
+FORMAT_NAME = "groundtruth-serving-bundle"
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+INDEX_FILE = "faiss.index"
+CHUNK_STORE_DIR = "chunk_store"
+ORDER_HISTORY_DIR = "order_history"
+SPARSE_INDEX_DIR = "sparse_index"
+CUSTOMERS_FILE = "customers.csv"
+STORES_FILE = "stores.csv"
+
+_HASH_BLOCK = 1 << 20
+
+
+class BundleMismatchError(ValueError):
+    """The serving bundle is incomplete, corrupted or inconsistent with its manifest."""
+
+
+class ServingBundle:
+    """A prebuilt, versioned directory holding everything the service serves from.
+
+    The bundle (written by ``build_serving_bundle``) contains the FAISS index,
+    the memory-mapped chunk store, BM25 postings and order history, the
+    customer and store tables and a manifest with per-file sizes, SHA-256
+    checksums and row counts. Opening it checks every file against the manifest (sizes always,
+    checksums when ``verify_checksums`` is set, since hashing a large index
+    costs seconds); ``check_rows`` then compares the loaded components with
+    the recorded counts, so a pod never serves an index whose rows do not
+    line up with its chunks.
+    """
+
+    def __init__(self, directory: Path, verify_checksums: bool = False):
+        self.directory = directory
+        manifest_path = directory / MANIFEST_FILE
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as exc:
+            raise BundleMismatchError(f"Cannot read bundle manifest {manifest_path}: {exc}") from exc
+        if manifest.get("format") != FORMAT_NAME or manifest.get("version") != FORMAT_VERSION:
+            raise BundleMismatchError(f"Unsupported serving bundle format in {directory}.")
+        self.manifest: Dict[str, Any] = manifest
+        self._verify_files(verify_checksums)
+
+    @classmethod
+    def is_bundle(cls, directory: Optional[Path]) -> bool:
+        return directory is not None and (directory / MANIFEST_FILE).is_file()
+
+    @property
+    def bundle_id(self) -> str:
+        return str(self.manifest["bundle_id"])
+
+    @property
+    def embedding_model(self) -> Optional[str]:
+        return self.manifest.get("embedding_model")
+
+    @property
+    def rows(self) -> Dict[str, int]:
+        return dict(self.manifest["rows"])
+
+    @property
+    def index_path(self) -> Path:
+        return self.directory / INDEX_FILE
+
+    @property
+    def chunk_store_dir(self) -> Path:
+        return self.directory / CHUNK_STORE_DIR
+
+    @property
+    def order_history_dir(self) -> Path:
+        return self.directory / ORDER_HISTORY_DIR
+
+    @property
+    def sparse_index_dir(self) -> Path:
+        return self.directory / SPARSE_INDEX_DIR
+
+    @property
+    def tables_dir(self) -> Path:
+        """Directory holding ``customers.csv`` and ``stores.csv``."""
+
+        return self.directory
+
+    def check_rows(self, **counts: int) -> None:
+        """Raise ``BundleMismatchError`` if a loaded component's size differs from the manifest."""
+
+        expected = self.manifest["rows"]
+        mismatched = [
+            f"{name}: manifest {expected[name]}, loaded {count}"
+            for name, count in counts.items()
+            if name in expected and int(expected[name]) != int(count)
+        ]
+        if mismatched:
+            raise BundleMismatchError(
+                f"Serving bundle {self.directory} does not match its manifest ({'; '.join(mismatched)})."
+            )
+
+    def check_embedding_model(self, model_name: str) -> None:
+        """Raise if the bundle's vectors came from a different query encoder."""
+
+        built_with = self.embedding_model
+        # "sentence-transformers/all-MiniLM-L6-v2" and "all-MiniLM-L6-v2" name the same model.
+        if built_with and built_with.split("/")[-1] != model_name.split("/")[-1]:
+            raise BundleMismatchError(
+                f"Serving bundle {self.bundle_id} was embedded with '{built_with}', "
+                f"but the service encodes queries with '{model_name}'."
+            )
+
+    def _verify_files(self, verify_checksums: bool) -> None:
+        problems = []
+        for relative, expected in self.manifest["files"].items():
+            path = self.directory / relative
+            if not path.is_file():
+                problems.append(f"{relative} is missing")
+            elif path.stat().st_size != expected["bytes"]:
+                problems.append(f"{relative} has {path.stat().st_size} bytes, expected {expected['bytes']}")
+            elif verify_checksums and _sha256(path) != expected["sha256"]:
+                problems.append(f"{relative} checksum differs")
+        if problems:
+            raise BundleMismatchError(
+                f"Serving bundle {self.directory} is inconsistent: {'; '.join(problems)}."
+            )
+
+
+def iter_aligned_chunks(chunks_path: Path, metas_path: Path) -> Iterator[ChunkRecord]:
+    """Join ``chunks.jsonl`` with ``metas.jsonl`` row by row, as the index was built.
+
+    Unlike the lenient JSONL store, any unreadable line or chunk id mismatch
+    raises: skipping a row here would shift every later row against the index.
+    """
+
+    with chunks_path.open("r", encoding="utf-8") as chunks, metas_path.open("r", encoding="utf-8") as metas:
+        for line_no, (chunk_line, meta_line) in enumerate(zip(chunks, metas), start=1):
+            try:
+                chunk = json.loads(chunk_line)
+                meta = json.loads(meta_line)
+            except json.JSONDecodeError as exc:
+                raise BundleMismatchError(f"Malformed JSON at line {line_no}: {exc}") from exc
+            chunk_id = chunk["chunk_id"]
+            if meta.get("chunk_id", chunk_id) != chunk_id:
+                raise BundleMismatchError(
+                    f"Line {line_no}: chunk {chunk_id} paired with metadata of {meta.get('chunk_id')}."
+                )
+            yield ChunkRecord(chunk_id=chunk_id, text=chunk["text"], meta=meta)
+        if chunks.readline() or metas.readline():
+            raise BundleMismatchError(f"{chunks_path.name} and {metas_path.name} differ in length.")
+
+
+def build_serving_bundle(
+    output: Path,
+    index_path: Path,
+    chunks: Iterable[ChunkRecord],
+    history: OrderHistoryStore,
+    customers_path: Path,
+    stores_path: Path,
+    embedding_model: Optional[str] = None,
+) -> ServingBundle:
+    """Write a bundle to ``output`` and return it opened (checksums verified).
+
+    Everything is written to a sibling staging directory and only swapped in
+    once row counts agree, so a failed build never replaces a good bundle.
+    """
+
+    staging = output.with_name(f"{output.name}.staging-{os.getpid()}")
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.mkdir(parents=True)
+    try:
+        index = faiss.read_index(str(index_path))
+        shutil.copyfile(index_path, staging / INDEX_FILE)
+        chunk_rows = write_mapped_chunk_store(chunks, staging / CHUNK_STORE_DIR)
+        written = MappedChunkStore(staging / CHUNK_STORE_DIR)
+        try:
+            write_bm25_index(
+                BM25Index.build(chunk.text for chunk in written.iter()),
+                staging / SPARSE_INDEX_DIR,
+                chunk_ids_digest=written.chunk_ids_digest(),
+            )
+        finally:
+            written.close()
+        order_rows = write_order_history(history, staging / ORDER_HISTORY_DIR)
+        shutil.copyfile(customers_path, staging / CUSTOMERS_FILE)
+        shutil.copyfile(stores_path, staging / STORES_FILE)
+
+        if chunk_rows != index.ntotal:
+            raise BundleMismatchError(
+                f"Index {index_path} has {index.ntotal} vectors but {chunk_rows} chunks were written."
+            )
+        files = {
+            path.relative_to(staging).as_posix(): {"bytes": path.stat().st_size, "sha256": _sha256(path)}
+            for path in sorted(staging.rglob("*"))
+            if path.is_file()
+        }
+        manifest = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            # Content address of the bundle: identical inputs give the same id.
+            "bundle_id": hashlib.sha256(
+                json.dumps(files, sort_keys=True).encode("utf-8")
+            ).hexdigest()[:16],
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "embedding_model": embedding_model,
+            "dimension": int(index.d),
+            "rows": {
+                "index": int(index.ntotal),
+                "chunks": chunk_rows,
+                "orders": order_rows,
+                "customers": _count_csv_rows(customers_path),
+                "stores": len(StoreLocator(stores_path)),
+            },
+            "files": files,
+        }
+        (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        ServingBundle(staging, verify_checksums=True)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    previous = output.with_name(f"{output.name}.previous-{os.getpid()}")
+    if output.exists():
+        output.rename(previous)
+    staging.rename(output)
+    shutil.rmtree(previous, ignore_errors=True)
+    return ServingBundle(output)
+
+
+def open_serving_bundle(directory: Optional[Path], verify_checksums: bool = False) -> Optional[ServingBundle]:
+    """The bundle in ``directory``, or ``None`` when no bundle has been built there."""
+
+    if not ServingBundle.is_bundle(directory):
+        return None
+    return ServingBundle(directory, verify_checksums=verify_checksums)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for block in iter(lambda: handle.read(_HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _count_csv_rows(path: Path) -> int:
+    with path.open("r", encoding="utf-8") as handle:
+        return sum(1 for _ in csv.DictReader(handle))
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..models import RetrievedChunk
+from .chunk_store import ChunkStore
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = "groundtruth-bm25-index"
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over chunk text, stored as CSR postings.
+
+    Term ``t`` owns ``rows[indptr[t]:indptr[t + 1]]`` (ascending chunk rows)
+    and the matching ``impacts``, each the precomputed BM25 contribution of
+    that term to that chunk (idf and length normalization included). A query
+    therefore only gathers the postings of its own terms and sums them with
+    one ``bincount``; nothing proportional to the corpus is allocated.
+    Postings take 8 bytes each (int32 row, float32 impact). ``open`` maps a
+    directory written by ``write_bm25_index``; ``build`` indexes in memory.
+    ``chunk_ids_digest`` names the chunk store the rows refer to (see
+    ``ChunkStore.chunk_ids_digest``); ``None`` when unknown.
+    """
+
+    def __init__(
+        self,
+        terms: Sequence[str],
+        indptr: np.ndarray,
+        rows: np.ndarray,
+        impacts: np.ndarray,
+        documents: int,
+        chunk_ids_digest: Optional[str] = None,
+    ):
+        self.chunk_ids_digest = chunk_ids_digest
+        self._terms = list(terms)
+        self._term_ids: Dict[str, int] = {term: pos for pos, term in enumerate(self._terms)}
+        self._indptr = indptr
+        self._rows = rows
+        self._impacts = impacts
+        self._documents = documents
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        term_ids: Dict[str, int] = {}
+        posting_terms, posting_rows, posting_tf = array("i"), array("i"), array("f")
+        lengths = array("f")
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                posting_terms.append(term_ids.setdefault(term, len(term_ids)))
+                posting_rows.append(row)
+                posting_tf.append(count)
+
+        documents = len(lengths)
+        terms = np.frombuffer(posting_terms, dtype=np.int32)
+        rows = np.frombuffer(posting_rows, dtype=np.int32)
+        tf = np.frombuffer(posting_tf, dtype=np.float32)
+        doc_len = np.frombuffer(lengths, dtype=np.float32)
+        average = float(doc_len.mean()) if documents else 0.0
+
+        # Group postings by term; the stable sort keeps rows ascending.
+        order = np.argsort(terms, kind="stable")
+        terms, rows, tf = terms[order], rows[order], tf[order]
+        df = np.bincount(terms, minlength=len(term_ids))
+        indptr = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+        df = df.astype(np.float64)
+        idf = np.log1p((documents - df + 0.5) / (df + 0.5))
+        norm = k1 * (1.0 - b + b * doc_len[rows] / average) if average else np.full(rows.shape, k1)
+        impacts = (idf[terms] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+        return cls(sorted(term_ids, key=term_ids.get), indptr, rows, impacts, documents)
+
+    @classmethod
+    def open(cls, directory: Path) -> "BM25Index":
+        manifest = json.loads((directory / MANIFEST_FILE).read_text(encoding="utf-8"))
+        if manifest.get("format") != FORMAT_NAME or manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index format in {directory}: {manifest.get('format')}")
+        terms = json.loads((directory / "terms.json").read_text(encoding="utf-8"))
+        arrays = {
+            name: np.load(directory / f"{name}.npy", mmap_mode="r")
+            for name in ("indptr", "rows", "impacts")
+        }
+        return cls(
+            terms,
+            arrays["indptr"],
+            arrays["rows"],
+            arrays["impacts"],
+            int(manifest["documents"]),
+            chunk_ids_digest=manifest.get("chunk_ids_digest"),
+        )
+
+    @classmethod
+    def is_index(cls, directory: Optional[Path]) -> bool:
+        return directory is not None and (directory / MANIFEST_FILE).is_file()
+
+    def __len__(self) -> int:
+        return self._documents
+
+    def search(self, query: str, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """``(rows, scores)`` of the ``top_k`` best chunks, best first; ties go to the lower row."""
+
+        spans = [
+            (int(self._indptr[term]), int(self._indptr[term + 1]))
+            for term in {self._term_ids.get(token) for token in tokenize(query)}
+            if term is not None
+        ]
+        if not spans or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate([self._rows[lo:hi] for lo, hi in spans])
+        impacts = np.concatenate([self._impacts[lo:hi] for lo, hi in spans])
+        candidates, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=impacts).astype(np.float32)
+        if scores.shape[0] > top_k:
+            keep = np.argpartition(-scores, top_k - 1)[:top_k]
+            candidates, scores = candidates[keep], scores[keep]
+        order = np.lexsort((candidates, -scores))
+        return candidates[order].astype(np.int64), scores[order]
+
+
+def write_bm25_index(index: BM25Index, directory: Path, chunk_ids_digest: Optional[str] = None) -> int:
+    """Write ``index`` in the ``BM25Index.open`` layout; returns the posting count.
+
+    ``chunk_ids_digest`` of the chunk store the index was built from is
+    recorded so ``open_bm25_index`` can refuse postings for another store.
+    """
+
+    directory.mkdir(parents=True, exist_ok=True)
+    np.save(directory / "indptr.npy", np.asarray(index._indptr, dtype=np.int64))
+    np.save(directory / "rows.npy", np.asarray(index._rows, dtype=np.int32))
+    np.save(directory / "impacts.npy", np.asarray(index._impacts, dtype=np.float32))
+    (directory / "terms.json").write_text(json.dumps(index._terms), encoding="utf-8")
+    manifest = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "documents": len(index),
+        "terms": len(index._terms),
+        "postings": int(index._rows.shape[0]),
+        "chunk_ids_digest": chunk_ids_digest or index.chunk_ids_digest,
+    }
+    (directory / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest["postings"]
+
+
+def open_bm25_index(chunk_store: ChunkStore, mapped_dir: Optional[Path] = None) -> BM25Index:
+    """Prefer the prebuilt index when it matches the chunk store, else build one from its text.
+
+    A prebuilt index matches when it was written for the same chunk ids in
+    the same rows; an index without a recorded digest is rebuilt.
+    """
+
+    digest = chunk_store.chunk_ids_digest()
+    if BM25Index.is_index(mapped_dir):
+        index = BM25Index.open(mapped_dir)
+        if len(index) == len(chunk_store) and index.chunk_ids_digest == digest:
+            return index
+        logger.warning(
+            "BM25 index in %s (%d chunks, ids %s) does not match the chunk store (%d chunks, ids %s); "
+            "rebuilding in memory.",
+            mapped_dir, len(index), index.chunk_ids_digest, len(chunk_store), digest,
+        )
+    index = BM25Index.build(chunk.text for chunk in chunk_store.iter())
+    index.chunk_ids_digest = digest
+    return index
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[RetrievedChunk]],
+    limit: int,
+    k: int = 60,
+    calibrate_to: Optional[Sequence[RetrievedChunk]] = None,
+) -> List[RetrievedChunk]:
+    """Merge ranked lists by reciprocal rank, ``sum(1 / (k + rank))`` per chunk.
+
+    Only ranks matter, so cosine and BM25 scores never need calibrating
+    against each other. Fused scores are rescaled so a chunk ranked first in
+    every list scores 1.0.
+
+    Raw fused scores sit about ``0.5 / k`` apart per rank, far tighter than
+    cosine scores, so margins and boosts tuned on cosine would swamp them.
+    With ``calibrate_to`` (normally the dense hits) the chunk at fused
+    position ``i`` takes that list's ``i``-th best score instead, extended
+    past its end by its mean gap: the fused order is kept, the score spacing
+    is the dense one.
+    """
+
+    fused: Dict[str, float] = {}
+    chunks: Dict[str, RetrievedChunk] = {}
+    for ranking in rankings:
+        for rank, candidate in enumerate(ranking, start=1):
+            chunk_id = candidate.chunk.chunk_id
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+            chunks.setdefault(chunk_id, candidate)
+    scale = (k + 1) / max(len(rankings), 1)
+    # Ties keep first-seen order, i.e. the earlier list wins.
+    ordered = sorted(fused, key=fused.get, reverse=True)[:limit]
+    scores = [fused[chunk_id] * scale for chunk_id in ordered]
+    if calibrate_to:
+        reference = sorted((candidate.score for candidate in calibrate_to), reverse=True)
+        step = (reference[0] - reference[-1]) / max(len(reference) - 1, 1)
+        scores = [
+            reference[i] if i < len(reference) else reference[-1] - step * (i - len(reference) + 1)
+            for i in range(len(ordered))
+        ]
+    return [
+        RetrievedChunk(chunk=chunks[chunk_id].chunk, score=score, rank=rank)
+        for rank, (chunk_id, score) in enumerate(zip(ordered, scores), start=1)
+    ]
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import csv
+import math
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..models import NearbyStore
+
+EARTH_RADIUS_M = 6_371_008.8
+_METERS_PER_DEG_LAT = math.pi * EARTH_RADIUS_M / 180.0
+_MAX_SCAN_RINGS = 64
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres; broadcasts over NumPy arrays."""
+
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2.0) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    )
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _minutes(value: Optional[str]) -> int:
+    try:
+        hours, minutes = str(value).split(":", 1)
+        return int(hours) * 60 + int(minutes)
+    except (TypeError, ValueError):
+        return -1
+
+
+class StoreLocator:
+    """Geo index over ``stores.csv`` resolving the nearest open stores.
+
+    Stores are bucketed into a ``cell_deg`` lat/lon grid. A single lookup
+    scans rings of cells outwards from the query cell and stops as soon as the
+    k-th best distance is closer than anything an unscanned ring could hold,
+    so only a handful of stores are compared per event. ``nearest_many`` is
+    the vectorized path for scoring many events at once.
+    """
+
+    def __init__(self, stores_path: Path, cell_deg: float = 0.02):
+        self._cell_deg = cell_deg
+        ids: List[int] = []
+        names: List[str] = []
+        lats: List[float] = []
+        lons: List[float] = []
+        is_open: List[bool] = []
+        opens: List[int] = []
+        closes: List[int] = []
+        with stores_path.open("r", encoding="utf-8") as handle:
+            for row in csv.DictReader(handle):
+                try:
+                    lat, lon = float(row["latitude"]), float(row["longitude"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                ids.append(int(row["store_id"]))
+                names.append(row.get("store_name", ""))
+                lats.append(lat)
+                lons.append(lon)
+                is_open.append(str(row.get("is_open", "Yes")).strip().lower() in ("yes", "true", "1"))
+                opens.append(_minutes(row.get("open_time")))
+                closes.append(_minutes(row.get("close_time")))
+
+        self._ids = np.asarray(ids, dtype=np.int64)
+        self._names = names
+        self._lats = np.asarray(lats, dtype=np.float64)
+        self._lons = np.asarray(lons, dtype=np.float64)
+        self._is_open = np.asarray(is_open, dtype=bool)
+        self._opens = np.asarray(opens, dtype=np.int32)
+        self._closes = np.asarray(closes, dtype=np.int32)
+        self._positions = {int(store_id): pos for pos, store_id in enumerate(self._ids)}
+
+        cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for pos, (lat, lon) in enumerate(zip(self._lats, self._lons)):
+            cells[self._cell(lat, lon)].append(pos)
+        self._cells = {key: np.asarray(rows, dtype=np.int64) for key, rows in cells.items()}
+        keys = np.asarray(list(self._cells) or [(0, 0)])
+        self._cell_min = keys.min(axis=0)
+        self._cell_max = keys.max(axis=0)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def store_ids(self) -> np.ndarray:
+        return self._ids
+
+    def coordinates(self, store_id: int) -> Optional[Tuple[float, float]]:
+        pos = self._positions.get(store_id)
+        if pos is None:
+            return None
+        return float(self._lats[pos]), float(self._lons[pos])
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = 3,
+        max_distance_m: Optional[float] = None,
+        open_only: bool = True,
+        at: Optional[datetime] = None,
+    ) -> List[NearbyStore]:
+        """Up to ``k`` stores closest to the point, nearest first.
+
+        ``open_only`` drops stores flagged closed; when ``at`` is also given,
+        its wall-clock time must fall inside the store's opening hours.
+        """
+
+        if k <= 0 or not len(self._ids):
+            return []
+
+        base = self._cell(latitude, longitude)
+        # Rings needed to reach every occupied cell from the query cell.
+        max_ring = int(max(np.abs(self._cell_min - base).max(), np.abs(self._cell_max - base).max()))
+        if max_ring > _MAX_SCAN_RINGS:
+            # Far outside the covered area: one flat scan beats walking rings.
+            max_ring = 0
+            rings: Iterable[np.ndarray] = [np.arange(len(self._ids))]
+        else:
+            rings = (self._ring(base[0], base[1], ring) for ring in range(max_ring + 1))
+
+        best_pos = np.empty(0, dtype=np.int64)
+        best_dist = np.empty(0, dtype=np.float64)
+        for ring, candidates in enumerate(rings):
+            if candidates.size:
+                candidates = candidates[self._eligible(candidates, open_only, at)]
+            if candidates.size:
+                dist = haversine_m(latitude, longitude, self._lats[candidates], self._lons[candidates])
+                best_pos = np.concatenate([best_pos, candidates])
+                best_dist = np.concatenate([best_dist, dist])
+                order = np.argsort(best_dist, kind="stable")[:k]
+                best_pos, best_dist = best_pos[order], best_dist[order]
+
+            if ring == max_ring:
+                break
+            # Anything in ring + 1 or beyond is at least this far away.
+            horizon = self._ring_lower_bound_m(latitude, ring)
+            if len(best_dist) >= k and best_dist[-1] <= horizon:
+                break
+            if max_distance_m is not None and horizon > max_distance_m:
+                break
+
+        results: List[NearbyStore] = []
+        for pos, dist in zip(best_pos, best_dist):
+            if max_distance_m is not None and dist > max_distance_m:
+                break
+            results.append(
+                NearbyStore(store_id=int(self._ids[pos]), name=self._names[pos], distance_m=float(dist))
+            )
+        return results
+
+    def nearest_many(
+        self,
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        k: int = 3,
+        open_only: bool = True,
+        block_size: int = 1024,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized nearest-``k`` lookup for many events.
+
+        Returns ``(store_ids, distances_m)``, both shaped ``(n_events, k)``
+        and sorted nearest first. Slots beyond the number of eligible stores
+        hold ``-1`` and ``inf``.
+        """
+
+        lats = np.asarray(latitudes, dtype=np.float64)
+        lons = np.asarray(longitudes, dtype=np.float64)
+        eligible = np.flatnonzero(self._is_open) if open_only else np.arange(len(self._ids))
+        store_ids = np.full((lats.size, k), -1, dtype=np.int64)
+        distances = np.full((lats.size, k), np.inf, dtype=np.float64)
+        take = min(k, eligible.size)
+        if take == 0:
+            return store_ids, distances
+
+        store_lats, store_lons = self._lats[eligible], self._lons[eligible]
+        for start in range(0, lats.size, block_size):
+            stop = min(start + block_size, lats.size)
+            dist = haversine_m(
+                lats[start:stop, None], lons[start:stop, None], store_lats[None, :], store_lons[None, :]
+            )
+            top = np.argpartition(dist, take - 1, axis=1)[:, :take] if take < eligible.size else (
+                np.broadcast_to(np.arange(eligible.size), dist.shape)
+            )
+            top_dist = np.take_along_axis(dist, top, axis=1)
+            order = np.argsort(top_dist, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            store_ids[start:stop, :take] = self._ids[eligible][top]
+            distances[start:stop, :take] = np.take_along_axis(top_dist, order, axis=1)
+        return store_ids, distances
+
+    def nearby_many(
+        self,
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        k: int = 3,
+        max_distance_m: Optional[float] = None,
+    ) -> List[List[NearbyStore]]:
+        """``nearest`` for many events (open stores only, no opening-hours check)."""
+
+        store_ids, distances = self.nearest_many(latitudes, longitudes, k=k)
+        results: List[List[NearbyStore]] = []
+        for row_ids, row_dist in zip(store_ids, distances):
+            stores: List[NearbyStore] = []
+            for store_id, dist in zip(row_ids, row_dist):
+                if store_id < 0 or (max_distance_m is not None and dist > max_distance_m):
+                    break
+                pos = self._positions[int(store_id)]
+                stores.append(NearbyStore(store_id=int(store_id), name=self._names[pos], distance_m=float(dist)))
+            results.append(stores)
+        return results
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return math.floor(latitude / self._cell_deg), math.floor(longitude / self._cell_deg)
+
+    def _ring(self, base_lat: int, base_lon: int, ring: int) -> np.ndarray:
+        if ring == 0:
+            return self._cells.get((base_lat, base_lon), np.empty(0, dtype=np.int64))
+        found = []
+        for d_lat in range(-ring, ring + 1):
+            step = 1 if abs(d_lat) == ring else 2 * ring
+            for d_lon in range(-ring, ring + 1, step):
+                rows = self._cells.get((base_lat + d_lat, base_lon + d_lon))
+                if rows is not None:
+                    found.append(rows)
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def _ring_lower_bound_m(self, latitude: float, ring: int) -> float:
+        reach_deg = ring * self._cell_deg
+        # Longitude degrees shrink towards the poles; use the narrowest latitude in reach.
+        widest_lat = min(abs(latitude) + reach_deg + self._cell_deg, 89.9)
+        return reach_deg * _METERS_PER_DEG_LAT * math.cos(math.radians(widest_lat))
+
+    def _eligible(self, positions: np.ndarray, open_only: bool, at: Optional[datetime]) -> np.ndarray:
+        mask = np.ones(positions.size, dtype=bool)
+        if not open_only:
+            return mask
+        mask &= self._is_open[positions]
+        if at is not None:
+            minute = at.hour * 60 + at.minute
+            opens, closes = self._opens[positions], self._closes[positions]
+            known = (opens >= 0) & (closes >= 0)
+            same_day = (opens <= minute) & (minute <= closes)
+            overnight = (closes < opens) & ((minute >= opens) | (minute <= closes))
+            mask &= ~known | same_day | overnight
+        return mask
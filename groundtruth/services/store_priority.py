@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-from typing import Iterable, List, Optional
+import math
+from typing import Dict, Iterable, List, Optional, Sequence
 
-from ..models import RetrievedChunk
+from ..models import NearbyStore, RetrievedChunk
 
 
 class StorePriorityBooster:
@@ -12,15 +13,30 @@ class StorePriorityBooster:
         self,
         store_match_boost: float = 0.08,
         store_keyword_boost: float = 0.05,
+        proximity_boost: float = 0.06,
+        proximity_decay_m: float = 1000.0,
     ):
         self._store_match_boost = store_match_boost
         self._store_keyword_boost = store_keyword_boost
+        self._proximity_boost = proximity_boost
+        self._proximity_decay_m = proximity_decay_m
 
     def boost(
         self,
         candidates: Iterable[RetrievedChunk],
         detected_store_id: Optional[int],
+        nearby_stores: Optional[Sequence[NearbyStore]] = None,
     ) -> List[RetrievedChunk]:
+        """Re-score candidates by store relevance.
+
+        Chunks of the detected store get the full match boost. Chunks of other
+        stores near the customer get a boost that decays with real distance;
+        any remaining store chunk is penalized.
+        """
+
+        distances: Dict[int, float] = {
+            store.store_id: store.distance_m for store in nearby_stores or ()
+        }
         boosted: List[RetrievedChunk] = []
         for candidate in candidates:
             score = candidate.score
@@ -30,6 +46,10 @@ class StorePriorityBooster:
 
             if detected_store_id and store_id == detected_store_id:
                 score += self._store_match_boost
+            elif store_id in distances:
+                score += self._proximity_boost * math.exp(
+                    -distances[store_id] / self._proximity_decay_m
+                )
             elif detected_store_id and store_id and store_id != detected_store_id:
                 score -= self._store_match_boost / 2
 
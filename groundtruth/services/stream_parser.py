@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class IncrementalJSONParser:
+    """Scans a streamed LLM reply for its top-level JSON object.
+
+    ``feed`` returns the newly decoded characters of the ``stream_field``
+    string value, so the recommendation text can be forwarded while the rest
+    of the object is still being generated. Text before the object (markdown
+    fences, stray prose) is skipped; once the object closes, ``closed`` is set
+    and ``raw`` holds everything received for the final, full validation.
+    """
+
+    def __init__(self, stream_field: str = "message"):
+        self._stream_field = stream_field
+        self._chunks: List[str] = []
+        self._depth = 0
+        self._closed = False
+        self._in_string = False
+        self._escape = False
+        self._unicode: Optional[str] = None
+        self._high_surrogate: Optional[int] = None
+        self._expecting_key = False
+        self._reading_key = False
+        self._key: List[str] = []
+        self._current_key: Optional[str] = None
+        self._streaming = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def raw(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, text: str) -> str:
+        self._chunks.append(text)
+        delta: List[str] = []
+        for ch in text:
+            if self._closed:
+                break
+            if self._in_string:
+                decoded = self._string_char(ch)
+                if decoded:
+                    if self._reading_key:
+                        self._key.append(decoded)
+                    elif self._streaming:
+                        delta.append(decoded)
+            elif self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._expecting_key = True
+            else:
+                self._structural_char(ch)
+        return "".join(delta)
+
+    def _string_char(self, ch: str) -> str:
+        if self._unicode is not None:
+            self._unicode += ch
+            if len(self._unicode) < 4:
+                return ""
+            code = int(self._unicode, 16)
+            self._unicode = None
+            return self._code_point(code)
+        if self._escape:
+            self._escape = False
+            if ch == "u":
+                self._unicode = ""
+                return ""
+            return _ESCAPES.get(ch, ch)
+        if ch == "\\":
+            self._escape = True
+            return ""
+        if ch == '"':
+            self._in_string = False
+            if self._reading_key:
+                self._reading_key = False
+                self._current_key = "".join(self._key)
+            self._streaming = False
+            return ""
+        return ch
+
+    def _code_point(self, code: int) -> str:
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return ""
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code)
+
+    def _structural_char(self, ch: str) -> None:
+        if ch == '"':
+            self._in_string = True
+            if self._depth == 1 and self._expecting_key:
+                self._reading_key = True
+                self._key = []
+            elif self._depth == 1 and self._current_key == self._stream_field:
+                self._streaming = True
+        elif ch == ":" and self._depth == 1:
+            self._expecting_key = False
+        elif ch == "," and self._depth == 1:
+            self._expecting_key = True
+            self._current_key = None
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self._closed = True